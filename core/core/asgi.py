@@ -5,18 +5,22 @@ from channels.auth import AuthMiddlewareStack
 from channels.security.websocket import AllowedHostsOriginValidator
 from real_time.routing import websocket_urlpatterns
 from real_time.middleware import WebSocketJWTAuthMiddleware
+from real_time.admission import ConnectAdmissionMiddleware
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
 
-application = ProtocolTypeRouter({
-    "http": get_asgi_application(),
-    "websocket": AllowedHostsOriginValidator(
-        AuthMiddlewareStack(
-            WebSocketJWTAuthMiddleware(
-                URLRouter(
-                    websocket_urlpatterns
-                )
+# The WebSocket stack behind the origin check, which tests connect to directly
+websocket_application = ConnectAdmissionMiddleware(
+    AuthMiddlewareStack(
+        WebSocketJWTAuthMiddleware(
+            URLRouter(
+                websocket_urlpatterns
             )
         )
-    ),
+    )
+)
+
+application = ProtocolTypeRouter({
+    "http": get_asgi_application(),
+    "websocket": AllowedHostsOriginValidator(websocket_application),
 })
\ No newline at end of file
@@ -15,8 +15,18 @@ app.autodiscover_tasks()
 
 # Add periodic tasks
 app.conf.beat_schedule = {
-    'cleanup-old-reports': {
-        'task': 'reports.tasks.cleanup_old_reports',
+    # Old sessions are archived rather than deleted; cleanup_old_reports
+    # remains available for explicit purges
+    'archive-cold-sessions': {
+        'task': 'reports.tasks.archive_cold_sessions',
         'schedule': 86400,  # Run daily (24 hours * 60 minutes * 60 seconds)
     },
+    'rollup-old-focus-samples': {
+        'task': 'performance.tasks.rollup_old_focus_samples',
+        'schedule': 86400,
+    },
+    'evict-idle-report-charts': {
+        'task': 'reports.tasks.evict_idle_report_charts',
+        'schedule': 86400,
+    },
 }
\ No newline at end of file
@@ -12,8 +12,8 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 from datetime import timedelta
-import matplotlib
 import os
+import sys
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -45,8 +45,96 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = 'UTC'
 
-# Matplotlib configuration (for headless environments)
-matplotlib.use('Agg')  # Use non-interactive backend
+# Shared by the web, ASGI and Celery processes: report cache versions and
+# pipeline stage counters are written by workers and read by web requests,
+# so a per-process backend such as LocMemCache would never see them.
+# Deployments set REDIS_URL (e.g. redis://localhost:6379/1); without it, and
+# under the test runner, each process gets its own LocMemCache and the
+# reports.W001 check warns about it
+REDIS_URL = os.environ.get('REDIS_URL')
+if REDIS_URL and sys.argv[1:2] != ['test']:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+            'KEY_PREFIX': 'edufocus',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'KEY_PREFIX': 'edufocus',
+        }
+    }
+
+# Focus sample retention: raw 1 Hz samples are kept for this many days after
+# a session ends, then rolled up to one averaged sample per student per minute
+FOCUS_SAMPLE_RAW_RETENTION_DAYS = 7
+
+# WebSocket focus update persistence. 'write_behind' acks as soon as an update
+# is buffered and writes batches on a size-or-time trigger; 'write_through'
+# flushes before acking so the ack implies the update is committed.
+FOCUS_WRITE_MODE = 'write_behind'
+FOCUS_BUFFER_MAX_SIZE = 500  # Pending samples that trigger an immediate flush
+FOCUS_BUFFER_FLUSH_INTERVAL = 1.0  # Seconds
+# A session whose samples fail this many flushes in a row is dropped, and at
+# most FOCUS_BUFFER_MAX_PENDING samples are held while writes keep failing
+FOCUS_BUFFER_MAX_RETRIES = 3
+FOCUS_BUFFER_MAX_PENDING = 10000
+
+# Instructor focus feed. 'snapshot' sends one aggregated focus_snapshot frame
+# per FOCUS_SNAPSHOT_INTERVAL; 'raw' forwards every student's focus_update.
+# Clients can opt into raw frames per connection with ?focus_feed=raw.
+FOCUS_FEED_MODE = 'snapshot'
+FOCUS_SNAPSHOT_INTERVAL = 2.0  # Seconds
+
+# Validated WebSocket token -> user snapshot cache (per process), so reconnect
+# storms don't hit the users table. Entries never outlive the token itself.
+WEBSOCKET_AUTH_CACHE_TTL = 60  # Seconds, 0 disables the cache
+WEBSOCKET_AUTH_CACHE_MAX_ENTRIES = 10000
+
+# WebSocket connect admission control (per worker). At most
+# WEBSOCKET_MAX_CONCURRENT_CONNECTS handshakes run at once; others wait up to
+# WEBSOCKET_CONNECT_QUEUE_TIMEOUT seconds, then are closed with code 4029 and
+# a retry hint of WEBSOCKET_RETRY_AFTER_MS plus up to 100% jitter.
+WEBSOCKET_MAX_CONCURRENT_CONNECTS = 100
+WEBSOCKET_CONNECT_QUEUE_TIMEOUT = 2.0  # Seconds
+WEBSOCKET_RETRY_AFTER_MS = 1000
+# A student who reconnects within this many seconds keeps their attendance
+# without any database write or user_left/user_joined broadcast
+WEBSOCKET_RECONNECT_GRACE = 5.0  # Seconds, 0 disables coalescing
+
+# Report chart rendering: classes with at least REPORT_CHART_PARALLEL_THRESHOLD
+# attendees render student charts on a process pool of REPORT_CHART_WORKERS
+REPORT_CHART_WORKERS = None  # None uses one worker per CPU available to the Celery worker
+REPORT_CHART_PARALLEL_THRESHOLD = 20
+# Charts are rendered on the first request to a report's chart URL unless
+# REPORT_CHART_EAGER is set; rendered charts nobody has requested for
+# REPORT_CHART_CACHE_DAYS are deleted and re-rendered on their next request.
+REPORT_CHART_EAGER = False
+REPORT_CHART_CACHE_DAYS = 14
+# Chart files are shared by content hash and only deleted once no report
+# references them and they haven't been rendered or reused for this long
+REPORT_CHART_ARTIFACT_GRACE_SECONDS = 3600
+# Serialized report responses are cached per user and version; regeneration
+# bumps the version, the timeout bounds how long joined fields such as the
+# classroom name can lag behind
+REPORT_CACHE_TIMEOUT = 300  # Seconds
+# cleanup_old_reports deletes this many reports per transaction and sleeps
+# between batches to keep lock time and I/O bursts short
+REPORT_CLEANUP_BATCH_SIZE = 500
+REPORT_CLEANUP_BATCH_PAUSE = 0.5  # Seconds
+
+# Finished sessions older than FOCUS_ARCHIVE_AFTER_DAYS have their focus data
+# and report blobs moved to compressed per-classroom, per-month files here
+FOCUS_ARCHIVE_ROOT = os.path.join(BASE_DIR, 'archive')
+FOCUS_ARCHIVE_AFTER_DAYS = 30
+
+# Report analytics: a sample at or above this score counts as focused, and
+# best/worst windows and the class rolling average span this many minutes
+REPORT_FOCUS_THRESHOLD = 0.6
+REPORT_ROLLING_WINDOW_MINUTES = 5
 
 
 #ASGI Configuration
@@ -0,0 +1,65 @@
+import json
+import os
+import subprocess
+import sys
+from django.conf import settings
+from django.test import SimpleTestCase
+
+# Web entry points must not load the plotting/analytics stack; only the
+# report rendering path in the Celery workers imports it
+HEAVY_MODULES = ('matplotlib', 'pandas', 'seaborn', 'PIL')
+# Budgets for setup plus importing an entry point and the URLconf. Generous
+# against ~1.5s / ~105 MB measured, but well under the ~2.1s / ~156 MB it
+# cost while matplotlib and pandas were imported at startup
+STARTUP_SECONDS_BUDGET = 4.0
+STARTUP_RSS_MB_BUDGET = 135
+
+PROBE = """
+import json, resource, sys, time
+started = time.perf_counter()
+import django
+django.setup()
+import importlib
+importlib.import_module(sys.argv[1])
+import core.urls
+seconds = time.perf_counter() - started
+try:
+    # Peak RSS of this process alone; ru_maxrss on Linux carries over the
+    # parent's peak across fork, which would count the test runner's memory
+    with open('/proc/self/status') as status:
+        rss_mb = next(int(line.split()[1]) for line in status if line.startswith('VmHWM')) / 1024
+except OSError:
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    rss_mb = rss / 1024 / 1024 if sys.platform == 'darwin' else rss / 1024
+print(json.dumps({'seconds': seconds, 'rss_mb': rss_mb, 'modules': sorted(sys.modules)}))
+"""
+
+
+class EntryPointStartupTest(SimpleTestCase):
+    def probe(self, module):
+        """Import an entry point in a fresh interpreter and report its cost"""
+        env = {
+            **os.environ,
+            'DJANGO_SETTINGS_MODULE': settings.SETTINGS_MODULE,
+            'PYTHONPATH': os.pathsep.join(path for path in sys.path if path),
+        }
+        result = subprocess.run(
+            [sys.executable, '-c', PROBE, module],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True, timeout=60,
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+        return json.loads(result.stdout.strip().splitlines()[-1])
+
+    def assert_lean_startup(self, module):
+        stats = self.probe(module)
+        loaded = {name.split('.')[0] for name in stats['modules']}
+        self.assertEqual(sorted(loaded.intersection(HEAVY_MODULES)), [])
+        self.assertLess(stats['seconds'], STARTUP_SECONDS_BUDGET)
+        self.assertLess(stats['rss_mb'], STARTUP_RSS_MB_BUDGET)
+
+    def test_wsgi_startup(self):
+        self.assert_lean_startup('core.wsgi')
+
+    def test_asgi_startup(self):
+        self.assert_lean_startup('core.asgi')
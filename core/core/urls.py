@@ -37,4 +37,5 @@ urlpatterns = [
     path('api/', include(session_router.urls)),
     path('api/', include('reports.urls')),
     path('api/', include('notifications.urls')),
+    path('api/', include('real_time.urls')),
 ]
\ No newline at end of file
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.5 on 2026-10-18 06:17
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('performance', '0002_initial'),
+        ('session', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FocusSample',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('timestamp', models.DateTimeField()),
+                ('focus_score', models.FloatField()),
+                ('resolution', models.PositiveSmallIntegerField(default=1)),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='focus_samples', to='session.session')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='focus_samples', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['session', 'timestamp'], name='focus_sample_session_ts_idx')],
+            },
+        ),
+    ]
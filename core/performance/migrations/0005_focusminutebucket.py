@@ -0,0 +1,51 @@
+# Generated by Django 5.2.5 on 2026-10-18 08:06
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.utils.dateparse import parse_datetime
+
+
+def split_minute_buckets(apps, schema_editor):
+    FocusAccumulator = apps.get_model('performance', 'FocusAccumulator')
+    FocusMinuteBucket = apps.get_model('performance', 'FocusMinuteBucket')
+    buckets = [
+        FocusMinuteBucket(
+            session_id=accumulator.session_id, student_id=accumulator.student_id,
+            minute=parse_datetime(minute), sample_count=count, score_sum=total
+        )
+        for accumulator in FocusAccumulator.objects.iterator()
+        for minute, (count, total) in accumulator.minute_buckets.items()
+    ]
+    FocusMinuteBucket.objects.bulk_create(buckets, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('performance', '0004_focusaccumulator'),
+        ('session', '0003_session_archived_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FocusMinuteBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('minute', models.DateTimeField()),
+                ('sample_count', models.PositiveIntegerField(default=0)),
+                ('score_sum', models.FloatField(default=0.0)),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='focus_minute_buckets', to='session.session')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='focus_minute_buckets', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('session', 'student', 'minute')},
+            },
+        ),
+        migrations.RunPython(split_minute_buckets, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='focusaccumulator',
+            name='minute_buckets',
+        ),
+    ]
@@ -13,4 +13,80 @@ class Performance(models.Model):
         unique_together = ['session', 'student']
 
     def __str__(self):
-        return f"{self.student} - {self.session}"
\ No newline at end of file
+        return f"{self.student} - {self.session}"
+
+class FocusSample(models.Model):
+    """
+    Append-only focus time-series point. Rows are only ever bulk inserted
+    (see performance.utils.record_focus_samples) and later rolled up to
+    one row per student per minute once the session is old enough.
+    """
+    RAW_RESOLUTION = 1
+    MINUTE_RESOLUTION = 60
+
+    session = models.ForeignKey(Session, on_delete=models.CASCADE, related_name='focus_samples')
+    student = models.ForeignKey(User, on_delete=models.CASCADE, related_name='focus_samples')
+    timestamp = models.DateTimeField()
+    focus_score = models.FloatField()
+    resolution = models.PositiveSmallIntegerField(default=RAW_RESOLUTION)  # Seconds covered by the point
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['session', 'timestamp'], name='focus_sample_session_ts_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.student} - {self.session} @ {self.timestamp}"
+
+class FocusAccumulator(models.Model):
+    """
+    Running focus aggregates for one student in one session, folded in by
+    performance.utils.accumulate_focus_samples as buffered updates are
+    written. Session-level figures are merged from these rows at read time
+    so concurrent flushes never contend on a single per-session row.
+    Per-minute figures live in FocusMinuteBucket.
+    """
+    session = models.ForeignKey(Session, on_delete=models.CASCADE, related_name='focus_accumulators')
+    student = models.ForeignKey(User, on_delete=models.CASCADE, related_name='focus_accumulators')
+    sample_count = models.PositiveIntegerField(default=0)
+    score_sum = models.FloatField(default=0.0)
+    score_sumsq = models.FloatField(default=0.0)
+    score_min = models.FloatField(null=True, blank=True)
+    score_max = models.FloatField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['session', 'student']
+
+    def __str__(self):
+        return f"{self.student} - {self.session} ({self.sample_count} samples)"
+
+    def add(self, focus_score):
+        """Fold one sample into the running totals"""
+        self.sample_count += 1
+        self.score_sum += focus_score
+        self.score_sumsq += focus_score * focus_score
+        self.score_min = focus_score if self.score_min is None else min(self.score_min, focus_score)
+        self.score_max = focus_score if self.score_max is None else max(self.score_max, focus_score)
+
+    @property
+    def avg_focus(self):
+        return self.score_sum / self.sample_count if self.sample_count else 0
+
+class FocusMinuteBucket(models.Model):
+    """
+    One student's samples within one minute of a session. Kept as rows
+    rather than a JSON map on the accumulator so a flush only writes the
+    minutes it touched, however long the session runs.
+    """
+    session = models.ForeignKey(Session, on_delete=models.CASCADE, related_name='focus_minute_buckets')
+    student = models.ForeignKey(User, on_delete=models.CASCADE, related_name='focus_minute_buckets')
+    minute = models.DateTimeField()
+    sample_count = models.PositiveIntegerField(default=0)
+    score_sum = models.FloatField(default=0.0)
+
+    class Meta:
+        unique_together = ['session', 'student', 'minute']
+
+    def __str__(self):
+        return f"{self.student} - {self.session} @ {self.minute}"
@@ -0,0 +1,32 @@
+from celery import shared_task
+from celery.utils.log import get_task_logger
+from django.conf import settings
+from django.utils import timezone
+from datetime import timedelta
+from .models import FocusSample
+from .utils import rollup_focus_samples
+
+logger = get_task_logger(__name__)
+
+@shared_task
+def rollup_old_focus_samples(days=None):
+    """
+    Celery task to roll up raw focus samples of sessions that ended more than
+    FOCUS_SAMPLE_RAW_RETENTION_DAYS ago into per-minute averages
+    """
+    if days is None:
+        days = settings.FOCUS_SAMPLE_RAW_RETENTION_DAYS
+
+    cutoff_date = timezone.now() - timedelta(days=days)
+    session_ids = FocusSample.objects.filter(
+        resolution=FocusSample.RAW_RESOLUTION,
+        session__end_time__lt=cutoff_date
+    ).values_list('session_id', flat=True).distinct()
+
+    count = 0
+    for session_id in list(session_ids):
+        rollup_focus_samples(session_id)
+        count += 1
+
+    logger.info(f"Rolled up focus samples for {count} sessions older than {days} days")
+    return count
@@ -2,7 +2,8 @@ from django.test import TestCase
 from django.contrib.auth import get_user_model
 from rest_framework.test import APIClient, APITestCase
 from rest_framework import status
-from .models import Performance
+from .models import Performance, FocusSample, FocusAccumulator, FocusMinuteBucket
+from .utils import record_focus_samples, rollup_focus_samples, write_focus_batch, summarize_focus_accumulators
 from session.models import Session
 from classrooms.models import Classroom
 from django.utils import timezone
@@ -45,6 +46,64 @@ class PerformanceModelsTest(TestCase):
         self.assertEqual(performance.student, self.student)
         self.assertEqual(performance.focus_score, 0.8)
 
+    def test_focus_samples_roll_up_to_minutes(self):
+        start = timezone.now().replace(second=0, microsecond=0)
+        record_focus_samples([
+            (self.session.id, self.student.id, start + timezone.timedelta(seconds=offset), score)
+            for offset, score in [(0, 0.2), (30, 0.4), (60, 0.9), (90, 0.7)]
+        ])
+        self.assertEqual(FocusSample.objects.filter(session=self.session).count(), 4)
+
+        rollup_focus_samples(self.session.id)
+        rolled = FocusSample.objects.filter(session=self.session).order_by('timestamp')
+        self.assertEqual([round(sample.focus_score, 2) for sample in rolled], [0.3, 0.8])
+        self.assertTrue(all(sample.resolution == FocusSample.MINUTE_RESOLUTION for sample in rolled))
+
+        # Rolling up again is a no-op
+        rollup_focus_samples(self.session.id)
+        self.assertEqual(FocusSample.objects.filter(session=self.session).count(), 2)
+
+    def test_accumulators_match_sample_aggregates(self):
+        other = User.objects.create_user(
+            email='other@example.com', password='password123', full_name='Other', role='student')
+        start = timezone.now().replace(second=0, microsecond=0)
+        batches = [
+            [(self.session.id, self.student.id, start, 0.2), (self.session.id, other.id, start, 0.6)],
+            [(self.session.id, self.student.id, start + timezone.timedelta(seconds=30), 0.4),
+             (self.session.id, self.student.id, start + timezone.timedelta(seconds=70), 1.0)],
+        ]
+        for samples in batches:
+            latest = {(session_id, student_id): score for session_id, student_id, _, score in samples}
+            write_focus_batch(latest, samples)
+
+        accumulator = FocusAccumulator.objects.get(session=self.session, student=self.student)
+        self.assertEqual(accumulator.sample_count, 3)
+        self.assertEqual((accumulator.score_min, accumulator.score_max), (0.2, 1.0))
+
+        # One row per student per minute, added to by later flushes
+        buckets = FocusMinuteBucket.objects.filter(session=self.session).order_by('student_id', 'minute')
+        self.assertEqual(
+            [(bucket.student_id, bucket.minute, bucket.sample_count) for bucket in buckets],
+            [(self.student.id, start, 2), (self.student.id, start + timezone.timedelta(minutes=1), 1),
+             (other.id, start, 1)]
+        )
+
+        summary = summarize_focus_accumulators(
+            FocusAccumulator.objects.filter(session=self.session),
+            buckets.values_list('student_id', 'minute', 'sample_count', 'score_sum')
+        )
+        self.assertEqual(summary['sample_count'], 4)
+        self.assertAlmostEqual(summary['avg_focus'], 0.55)
+        self.assertAlmostEqual(summary['std_focus'], 0.2958, places=4)
+        self.assertEqual(
+            [(point['avg_focus'], point['student_count']) for point in summary['time_series']],
+            [(0.4, 2), (1.0, 1)]
+        )
+        self.assertEqual(
+            [point['avg_focus'] for point in summary['students'][self.student.id]['time_series']],
+            [0.3, 1.0]
+        )
+
 class PerformanceViewSetTest(APITestCase):
     def setUp(self):
         self.client = APIClient()
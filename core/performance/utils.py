@@ -0,0 +1,234 @@
+import logging
+import math
+from collections import defaultdict
+from django.db import transaction
+from django.db.models import Avg
+from django.db.models.functions import TruncMinute
+from .models import Performance, FocusSample, FocusAccumulator, FocusMinuteBucket
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_BATCH_SIZE = 1000
+
+def record_focus_samples(samples):
+    """
+    Append focus samples in bulk.
+
+    `samples` is an iterable of (session_id, student_id, timestamp, focus_score)
+    tuples. Rows are never updated afterwards, so writers never contend on
+    the same row the way they do on Performance.
+    """
+    rows = [
+        FocusSample(
+            session_id=session_id,
+            student_id=student_id,
+            timestamp=timestamp,
+            focus_score=focus_score
+        )
+        for session_id, student_id, timestamp, focus_score in samples
+    ]
+    if rows:
+        FocusSample.objects.bulk_create(rows, batch_size=SAMPLE_BATCH_SIZE)
+    return len(rows)
+
+def write_focus_batch(latest_scores, samples):
+    """
+    Persist a batch of buffered focus updates in one transaction.
+
+    `latest_scores` maps (session_id, student_id) to the most recent focus
+    score and is upserted into Performance with a single statement; `samples`
+    is appended to the FocusSample series.
+    """
+    performances = [
+        Performance(
+            session_id=session_id,
+            student_id=student_id,
+            focus_score=focus_score,
+            attended=True
+        )
+        for (session_id, student_id), focus_score in latest_scores.items()
+    ]
+
+    with transaction.atomic():
+        if performances:
+            Performance.objects.bulk_create(
+                performances,
+                update_conflicts=True,
+                unique_fields=['session', 'student'],
+                update_fields=['focus_score', 'attended']
+            )
+        record_focus_samples(samples)
+        accumulate_focus_samples(samples)
+
+    return len(performances), len(samples)
+
+def accumulate_focus_samples(samples):
+    """
+    Fold a batch of (session_id, student_id, timestamp, focus_score) samples
+    into the per-student FocusAccumulator rows and the FocusMinuteBucket rows
+    of the minutes they fall in. Must run inside a transaction; the touched
+    accumulators are locked while they are merged and written back.
+    """
+    points = defaultdict(list)
+    for session_id, student_id, timestamp, focus_score in samples:
+        points[(session_id, student_id)].append((timestamp, focus_score))
+    if not points:
+        return 0
+    session_ids = {session_id for session_id, _ in points}
+    student_ids = {student_id for _, student_id in points}
+
+    # Create missing rows first so the lock below covers every row in the
+    # batch. Otherwise two flushes can both insert the same new row and the
+    # later upsert overwrites the earlier one's totals.
+    FocusAccumulator.objects.bulk_create(
+        [FocusAccumulator(session_id=session_id, student_id=student_id) for session_id, student_id in points],
+        ignore_conflicts=True
+    )
+    accumulators = {
+        (accumulator.session_id, accumulator.student_id): accumulator
+        for accumulator in FocusAccumulator.objects.select_for_update().filter(
+            session_id__in=session_ids, student_id__in=student_ids
+        ).order_by('id')
+    }
+
+    minutes = defaultdict(lambda: [0, 0.0])
+    for key, student_points in points.items():
+        accumulator = accumulators[key]
+        for timestamp, focus_score in student_points:
+            accumulator.add(focus_score)
+            bucket = minutes[(*key, timestamp.replace(second=0, microsecond=0))]
+            bucket[0] += 1
+            bucket[1] += focus_score
+
+    FocusAccumulator.objects.bulk_create(
+        [accumulators[key] for key in points],
+        update_conflicts=True,
+        unique_fields=['session', 'student'],
+        update_fields=['sample_count', 'score_sum', 'score_sumsq', 'score_min', 'score_max', 'updated_at']
+    )
+
+    # Bucket rows of a student are only written while their accumulator
+    # is locked, so reading and adding to them here can't race
+    for bucket in FocusMinuteBucket.objects.filter(
+        session_id__in=session_ids, student_id__in=student_ids,
+        minute__in={minute for _, _, minute in minutes}
+    ):
+        key = (bucket.session_id, bucket.student_id, bucket.minute)
+        if key in minutes:
+            minutes[key][0] += bucket.sample_count
+            minutes[key][1] += bucket.score_sum
+    FocusMinuteBucket.objects.bulk_create(
+        [
+            FocusMinuteBucket(
+                session_id=session_id, student_id=student_id, minute=minute,
+                sample_count=count, score_sum=total
+            )
+            for (session_id, student_id, minute), (count, total) in minutes.items()
+        ],
+        update_conflicts=True,
+        unique_fields=['session', 'student', 'minute'],
+        update_fields=['sample_count', 'score_sum']
+    )
+    return len(points)
+
+def _std(count, total, total_sq):
+    if not count:
+        return 0
+    mean = total / count
+    return math.sqrt(max(total_sq / count - mean * mean, 0))
+
+def summarize_focus_accumulators(accumulators, buckets):
+    """
+    Merge per-student accumulators and their (student_id, minute,
+    sample_count, score_sum) minute buckets into session-level figures
+    without touching FocusSample. Returns overall statistics, the class
+    per-minute series and per-student statistics and series keyed by
+    student id.
+    """
+    count, total, total_sq = 0, 0.0, 0.0
+    minimum, maximum = None, None
+    minutes = defaultdict(lambda: [0, 0.0, 0])
+    students = {}
+
+    student_buckets = defaultdict(list)
+    for student_id, minute, minute_count, minute_sum in buckets:
+        student_buckets[student_id].append((minute.isoformat(), minute_count, minute_sum))
+
+    for accumulator in accumulators:
+        if not accumulator.sample_count:
+            continue
+        count += accumulator.sample_count
+        total += accumulator.score_sum
+        total_sq += accumulator.score_sumsq
+        minimum = accumulator.score_min if minimum is None else min(minimum, accumulator.score_min)
+        maximum = accumulator.score_max if maximum is None else max(maximum, accumulator.score_max)
+
+        student_series = []
+        for minute, minute_count, minute_sum in sorted(student_buckets[accumulator.student_id]):
+            bucket = minutes[minute]
+            bucket[0] += minute_count
+            bucket[1] += minute_sum
+            bucket[2] += 1
+            student_series.append({
+                'timestamp': minute,
+                'avg_focus': round(minute_sum / minute_count, 2) if minute_count else 0
+            })
+
+        students[accumulator.student_id] = {
+            'avg_focus': accumulator.avg_focus,
+            'focus_count': accumulator.sample_count,
+            'std_focus': _std(accumulator.sample_count, accumulator.score_sum, accumulator.score_sumsq),
+            'min_focus': accumulator.score_min,
+            'max_focus': accumulator.score_max,
+            'time_series': student_series,
+        }
+
+    return {
+        'sample_count': count,
+        'avg_focus': total / count if count else 0,
+        'std_focus': _std(count, total, total_sq),
+        'min_focus': minimum,
+        'max_focus': maximum,
+        'time_series': [
+            {
+                'timestamp': minute,
+                'avg_focus': round(minute_sum / minute_count, 2) if minute_count else 0,
+                'student_count': student_count
+            }
+            for minute, (minute_count, minute_sum, student_count) in sorted(minutes.items())
+        ],
+        'students': students,
+    }
+
+def rollup_focus_samples(session_id):
+    """
+    Replace a session's raw samples with one averaged sample per student per minute
+    """
+    raw_samples = FocusSample.objects.filter(
+        session_id=session_id,
+        resolution=FocusSample.RAW_RESOLUTION
+    )
+
+    minutes = raw_samples.annotate(
+        minute=TruncMinute('timestamp')
+    ).values('student_id', 'minute').annotate(
+        avg_focus=Avg('focus_score')
+    ).order_by()
+
+    rollups = [
+        FocusSample(
+            session_id=session_id,
+            student_id=entry['student_id'],
+            timestamp=entry['minute'],
+            focus_score=entry['avg_focus'],
+            resolution=FocusSample.MINUTE_RESOLUTION
+        )
+        for entry in minutes
+    ]
+
+    with transaction.atomic():
+        deleted, _ = raw_samples.delete()
+        FocusSample.objects.bulk_create(rollups, batch_size=SAMPLE_BATCH_SIZE)
+
+    logger.info(f"Rolled up {deleted} focus samples into {len(rollups)} for session {session_id}")
+    return deleted, len(rollups)
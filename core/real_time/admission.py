@@ -0,0 +1,117 @@
+import asyncio
+import json
+import logging
+import random
+import weakref
+from django.conf import settings
+from channels.middleware import BaseMiddleware
+
+logger = logging.getLogger(__name__)
+
+# Close code telling clients to back off and retry after the hinted delay
+RETRY_LATER_CLOSE_CODE = 4029
+
+class ConnectAdmissionController:
+    """
+    Bounds the number of WebSocket connects a worker processes at once.
+
+    A connect holds a slot from the handshake until the consumer accepts or
+    closes it. When all slots are taken a connect waits up to
+    `queue_timeout` seconds (deferred); if no slot frees up it is turned
+    away with a jittered retry hint (rejected).
+    """
+    def __init__(self, max_in_flight=None, queue_timeout=None, retry_after_ms=None):
+        self.max_in_flight = max_in_flight or settings.WEBSOCKET_MAX_CONCURRENT_CONNECTS
+        self.queue_timeout = settings.WEBSOCKET_CONNECT_QUEUE_TIMEOUT if queue_timeout is None else queue_timeout
+        self.retry_after_ms = retry_after_ms or settings.WEBSOCKET_RETRY_AFTER_MS
+        self.in_flight = 0
+        self.stats = {'admitted': 0, 'deferred': 0, 'rejected': 0}
+        # asyncio primitives are bound to an event loop
+        self._semaphores = weakref.WeakKeyDictionary()
+
+    def _semaphore(self):
+        loop = asyncio.get_running_loop()
+        if loop not in self._semaphores:
+            self._semaphores[loop] = asyncio.Semaphore(self.max_in_flight)
+        return self._semaphores[loop]
+
+    async def acquire(self):
+        """Wait for a connect slot; returns False if the connect should be rejected"""
+        semaphore = self._semaphore()
+        if semaphore.locked():
+            try:
+                await asyncio.wait_for(semaphore.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                self.stats['rejected'] += 1
+                return False
+            self.stats['deferred'] += 1
+        else:
+            await semaphore.acquire()
+        self.in_flight += 1
+        self.stats['admitted'] += 1
+        return True
+
+    def release(self):
+        self.in_flight -= 1
+        self._semaphore().release()
+
+    def retry_hint(self):
+        """Milliseconds a rejected client should wait, jittered so retries spread out"""
+        return int(self.retry_after_ms * (1 + random.random()))
+
+    def snapshot(self):
+        return {**self.stats, 'in_flight': self.in_flight, 'max_in_flight': self.max_in_flight}
+
+# Global controller instance for this worker
+admission_controller = ConnectAdmissionController()
+
+class ConnectAdmissionMiddleware(BaseMiddleware):
+    """
+    Runs every WebSocket connect through the admission controller before
+    any authentication or database work happens
+    """
+    def __init__(self, inner, controller=None):
+        super().__init__(inner)
+        self.controller = controller or admission_controller
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'websocket':
+            return await super().__call__(scope, receive, send)
+
+        if not await self.controller.acquire():
+            return await self.reject(receive, send)
+
+        released = False
+
+        def release():
+            nonlocal released
+            if not released:
+                released = True
+                self.controller.release()
+
+        async def send_wrapper(message):
+            # The slot only covers the handshake, not the connection lifetime
+            if message['type'] in ('websocket.accept', 'websocket.close'):
+                release()
+            await send(message)
+
+        try:
+            return await super().__call__(scope, receive, send_wrapper)
+        finally:
+            release()
+
+    async def reject(self, receive, send):
+        # Close codes are only delivered on an accepted socket, so accept first
+        await receive()  # websocket.connect
+        retry_after_ms = self.controller.retry_hint()
+        await send({'type': 'websocket.accept'})
+        await send({
+            'type': 'websocket.send',
+            'text': json.dumps({'type': 'connection_deferred', 'retry_after_ms': retry_after_ms})
+        })
+        await send({
+            'type': 'websocket.close',
+            'code': RETRY_LATER_CLOSE_CODE,
+            'reason': json.dumps({'retry_after_ms': retry_after_ms})
+        })
+        logger.warning(f"Rejected WebSocket connect, retry after {retry_after_ms}ms")
@@ -0,0 +1,58 @@
+class FocusAggregator:
+    """
+    Accumulates the latest focus score per student for one instructor
+    connection and turns it into compact `focus_snapshot` frames.
+    """
+    def __init__(self, bins=10):
+        self.bins = bins
+        self.latest = {}
+        self.names = {}
+        self.last_sent = {}
+        self.dirty = False
+
+    def update(self, user_id, user_name, focus_score):
+        self.latest[user_id] = focus_score
+        self.names[user_id] = user_name
+        self.dirty = True
+
+    def remove(self, user_id):
+        if self.latest.pop(user_id, None) is not None:
+            self.dirty = True
+        self.names.pop(user_id, None)
+        self.last_sent.pop(user_id, None)
+
+    def snapshot(self, timestamp):
+        """Build a snapshot frame, or return None if nothing changed since the last one"""
+        if not self.dirty:
+            return None
+
+        scores = list(self.latest.values())
+        histogram = [0] * self.bins
+        for score in scores:
+            # Scores are in [0, 1]; 1.0 belongs in the top bin
+            index = min(max(int(score * self.bins), 0), self.bins - 1)
+            histogram[index] += 1
+
+        deltas = []
+        for user_id, score in self.latest.items():
+            previous = self.last_sent.get(user_id)
+            if previous == score:
+                continue
+            deltas.append({
+                'user_id': user_id,
+                'user_name': self.names[user_id],
+                'focus_score': score,
+                'delta': None if previous is None else round(score - previous, 4)
+            })
+
+        self.last_sent = dict(self.latest)
+        self.dirty = False
+
+        return {
+            'type': 'focus_snapshot',
+            'student_count': len(scores),
+            'class_avg_focus': round(sum(scores) / len(scores), 4) if scores else None,
+            'histogram': histogram,
+            'students': deltas,
+            'timestamp': timestamp
+        }
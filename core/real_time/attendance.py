@@ -0,0 +1,44 @@
+import asyncio
+import logging
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+class AttendanceCoalescer:
+    """
+    Holds a student's "left" transition for a short grace period so that a
+    disconnect followed quickly by a reconnect (a network blip) costs no
+    attendance writes and no user_left/user_joined broadcasts.
+    """
+    def __init__(self, grace=None):
+        self.grace = settings.WEBSOCKET_RECONNECT_GRACE if grace is None else grace
+        self._pending = {}
+        self.coalesced = 0
+
+    async def schedule_leave(self, key, on_leave):
+        """Run `on_leave()` after the grace period unless `key` reconnects first"""
+        if self.grace <= 0:
+            await on_leave()
+            return
+        self.cancel_leave(key)
+        self._pending[key] = asyncio.create_task(self._leave_later(key, on_leave))
+
+    def cancel_leave(self, key):
+        """Cancel a pending leave for `key`; returns True if this is a reconnect"""
+        task = self._pending.pop(key, None)
+        if task is None or task.done() or task.get_loop().is_closed():
+            return False
+        task.cancel()
+        self.coalesced += 1
+        return True
+
+    async def _leave_later(self, key, on_leave):
+        await asyncio.sleep(self.grace)
+        self._pending.pop(key, None)
+        try:
+            await on_leave()
+        except Exception as e:
+            logger.error(f"Error recording leave for {key}: {str(e)}")
+
+# Global coalescer instance for this worker
+attendance_coalescer = AttendanceCoalescer()
@@ -0,0 +1,147 @@
+import asyncio
+import logging
+from django.conf import settings
+from channels.db import database_sync_to_async
+from performance.utils import write_focus_batch
+
+logger = logging.getLogger(__name__)
+
+WRITE_BEHIND = 'write_behind'
+WRITE_THROUGH = 'write_through'
+
+class FocusWriteBuffer:
+    """
+    Per-process write-behind buffer for WebSocket focus updates.
+
+    Updates are coalesced per (session, student) for the Performance row and
+    appended to a pending sample list, then written in one batch when the
+    buffer reaches `max_size` entries or `flush_interval` seconds have
+    passed, whichever comes first.
+
+    A failed batch is retried one session at a time so a single bad session
+    can't hold up the rest. A session whose samples fail `max_retries`
+    flushes in a row is dropped, and the oldest samples are dropped once
+    more than `max_pending` are waiting.
+    """
+    def __init__(self, max_size=None, flush_interval=None, max_retries=None, max_pending=None):
+        self.max_size = max_size or settings.FOCUS_BUFFER_MAX_SIZE
+        self.flush_interval = flush_interval or settings.FOCUS_BUFFER_FLUSH_INTERVAL
+        self.max_retries = settings.FOCUS_BUFFER_MAX_RETRIES if max_retries is None else max_retries
+        self.max_pending = max_pending or settings.FOCUS_BUFFER_MAX_PENDING
+        self.dropped = 0
+        self._latest = {}
+        self._samples = []
+        self._failures = {}
+        self._flusher = None
+        self._flusher_loop = None
+
+    def __len__(self):
+        return len(self._samples)
+
+    async def add(self, session_id, student_id, focus_score, timestamp):
+        """Queue a focus update; flushes inline once the size trigger is hit"""
+        self._latest[(session_id, student_id)] = focus_score
+        self._samples.append((session_id, student_id, timestamp, focus_score))
+        self._trim()
+
+        if len(self._samples) >= self.max_size:
+            await self.flush()
+        else:
+            self._ensure_flusher()
+
+    async def flush(self):
+        """Write everything pending; re-queues what failed and raises the last error"""
+        if not self._samples:
+            return 0
+
+        latest, samples = self._latest, self._samples
+        self._latest, self._samples = {}, []
+
+        try:
+            await database_sync_to_async(write_focus_batch)(latest, samples)
+        except Exception as e:
+            written, error = await self._flush_by_session(latest, samples, e)
+        else:
+            written, error = len(samples), None
+            for session_id in {sample[0] for sample in samples}:
+                self._failures.pop(session_id, None)
+
+        # Nothing left for the timer to do once an explicit flush drained us
+        if not self._samples and self._flusher and self._flusher is not asyncio.current_task():
+            self._flusher.cancel()
+            self._flusher = None
+
+        if error is not None:
+            raise error
+        return written
+
+    async def _flush_by_session(self, latest, samples, error):
+        """Retry a failed batch per session; returns (samples written, last error)"""
+        groups = {}
+        for sample in samples:
+            groups.setdefault(sample[0], ({}, []))[1].append(sample)
+        for (session_id, student_id), focus_score in latest.items():
+            groups.setdefault(session_id, ({}, []))[0][(session_id, student_id)] = focus_score
+
+        written, failed = 0, []
+        for session_id, (group_latest, group_samples) in groups.items():
+            # A single-session batch has already failed on its own
+            if len(groups) > 1:
+                try:
+                    await database_sync_to_async(write_focus_batch)(group_latest, group_samples)
+                except Exception as e:
+                    error = e
+                else:
+                    written += len(group_samples)
+                    self._failures.pop(session_id, None)
+                    continue
+
+            failures = self._failures.get(session_id, 0) + 1
+            if failures > self.max_retries:
+                self._failures.pop(session_id, None)
+                self.dropped += len(group_samples)
+                logger.error(
+                    f"Dropping {len(group_samples)} focus samples for session {session_id} "
+                    f"after {failures} failed writes: {str(error)}"
+                )
+                continue
+            self._failures[session_id] = failures
+            failed.append((group_latest, group_samples))
+
+        # Keep anything newer that arrived while the writes were in flight
+        for group_latest, group_samples in reversed(failed):
+            for key, focus_score in group_latest.items():
+                self._latest.setdefault(key, focus_score)
+            self._samples[:0] = group_samples
+        self._trim()
+        return written, error
+
+    def _trim(self):
+        """Drop the oldest samples beyond max_pending, e.g. while the database is down"""
+        overflow = len(self._samples) - self.max_pending
+        if overflow > 0:
+            del self._samples[:overflow]
+            self.dropped += overflow
+            logger.error(f"Focus buffer full, dropped the {overflow} oldest samples")
+
+    def _ensure_flusher(self):
+        loop = asyncio.get_running_loop()
+        if self._flusher and not self._flusher.done() and self._flusher_loop is loop:
+            return
+        self._flusher_loop = loop
+        self._flusher = loop.create_task(self._run_flusher())
+
+    async def _run_flusher(self):
+        # Runs only while there is something to write so idle workers don't spin
+        while self._samples:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Error flushing focus updates: {str(e)}")
+
+def is_write_through():
+    return settings.FOCUS_WRITE_MODE == WRITE_THROUGH
+
+# Global buffer instance shared by all consumers in this process
+focus_write_buffer = FocusWriteBuffer()
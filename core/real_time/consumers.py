@@ -1,49 +1,53 @@
+import asyncio
 import json
 import logging
+from dataclasses import replace
+from urllib.parse import parse_qs
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
-from django.contrib.auth import get_user_model
-from rest_framework_simplejwt.tokens import AccessToken
-from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
-from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils import timezone
 from session.models import Session
 from performance.models import Performance
+from .buffers import focus_write_buffer, is_write_through
 from classrooms.models import Enrollment
+from .aggregation import FocusAggregator
+from .attendance import attendance_coalescer
+from .context import load_session_context
+from .middleware import UserSnapshot
+from .schemas import EVENT_AUDIENCES
+from .utils import session_group_name
 
 logger = logging.getLogger(__name__)
-User = get_user_model()
 
 class SessionConsumer(AsyncWebsocketConsumer):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.session_id = None
         self.session_group_name = None
+        self.role_group_name = None
         self.user = None
         self.user_role = None
+        self.session_context = None
+        self.focus_aggregator = None
+        self.snapshot_task = None
 
     async def connect(self):
         try:
             self.session_id = self.scope['url_route']['kwargs']['session_id']
-            self.session_group_name = f'session_{self.session_id}'
+            self.session_group_name = session_group_name(self.session_id)
             logger.info(f'Connecting to session {self.session_id}')
             
-            # Extract token from query parameters
-            query_string = self.scope.get('query_string', b'').decode()
-            token = None
-            for param in query_string.split('&'):
-                if param.startswith('token='):
-                    token = param.split('=')[1]
-                    break
-            
-            logger.info(f'Token: {token}')
-            if not token:
+            # The user was resolved from the token by WebSocketJWTAuthMiddleware
+            auth_error = self.scope.get('auth_error')
+            if auth_error == 'missing_token':
                 await self.close(code=4001)  # Custom code for missing token
                 return
                 
-            # Authenticate user
-            self.user = await self.authenticate_user(token)
+            self.user = self.scope.get('user')
             logger.info(f'User: {self.user}')
-            if not self.user:
+            if auth_error or not isinstance(self.user, UserSnapshot):
+                self.user = None
                 await self.close(code=4002)  # Custom code for invalid token
                 return
                 
@@ -53,13 +57,17 @@ class SessionConsumer(AsyncWebsocketConsumer):
                 await self.close(code=4003)  # Custom code for access denied
                 return
                 
-            # Join session group
-            await self.channel_layer.group_add(
-                self.session_group_name,
-                self.channel_name
-            )
+            # Join the session group and the group for this user's role
+            self.role_group_name = session_group_name(self.session_id, self.user.role)
+            for group_name in (self.session_group_name, self.role_group_name):
+                await self.channel_layer.group_add(group_name, self.channel_name)
             
             await self.accept()
+
+            # Instructors get aggregated focus snapshots unless they opt into raw frames
+            if self.user.role == 'instructor' and self.get_focus_feed_mode() == 'snapshot':
+                self.focus_aggregator = FocusAggregator()
+                self.snapshot_task = asyncio.create_task(self.run_focus_snapshots())
             
             # Send connection confirmation
             await self.send(text_data=json.dumps({
@@ -70,16 +78,18 @@ class SessionConsumer(AsyncWebsocketConsumer):
                 'user_role': self.user.role
             }))
             
-            # Notify group about user joining (only for students)
-            if self.user.role == 'student':
+            # Notify group about user joining (only for students). A reconnect
+            # within the grace period cancels the pending leave instead, so
+            # attendance never flipped and instructors never saw user_left.
+            reconnected = attendance_coalescer.cancel_leave(self.attendance_key())
+            if self.user.role == 'student' and not reconnected:
                 await self.update_attendance(True)
-                await self.channel_layer.group_send(
-                    self.session_group_name,
+                await self.send_to_audience(
                     {
                         'type': 'user_joined',
                         'user_id': self.user.id,
                         'user_name': self.user.full_name,
-                        'timestamp': await sync_to_async(self.get_current_time)()
+                        'timestamp': self.get_current_time()
                     }
                 )
                 
@@ -91,25 +101,18 @@ class SessionConsumer(AsyncWebsocketConsumer):
 
     async def disconnect(self, close_code):
         try:
-            # Leave session group
-            if self.session_group_name:
-                await self.channel_layer.group_discard(
-                    self.session_group_name,
-                    self.channel_name
-                )
+            if self.snapshot_task:
+                self.snapshot_task.cancel()
+
+            # Leave session and role groups
+            for group_name in (self.session_group_name, self.role_group_name):
+                if group_name:
+                    await self.channel_layer.group_discard(group_name, self.channel_name)
             
             # Notify group about user leaving (only for students)
-            if self.user and self.user.role == 'student':
-                await self.update_attendance(False)
-                await self.channel_layer.group_send(
-                    self.session_group_name,
-                    {
-                        'type': 'user_left',
-                        'user_id': self.user.id,
-                        'user_name': self.user.full_name,
-                        'timestamp': await sync_to_async(self.get_current_time)()
-                    }
-                )
+            if self.user and self.user.role == 'student' and self.session_context:
+                await self.flush_focus_updates()
+                await attendance_coalescer.schedule_leave(self.attendance_key(), self.record_leave)
                 
             logger.info(f"User {getattr(self.user, 'id', 'unknown')} disconnected from session {self.session_id}")
             
@@ -169,6 +172,13 @@ class SessionConsumer(AsyncWebsocketConsumer):
                 'message': 'Invalid focus score'
             }))
             return
+
+        if not self.session_context.is_active:
+            await self.send(text_data=json.dumps({
+                'type': 'error',
+                'message': 'Session is not active'
+            }))
+            return
             
         # Update the focus score in the database
         success = await self.update_focus_score(focus_score)
@@ -180,20 +190,20 @@ class SessionConsumer(AsyncWebsocketConsumer):
             return
             
         # Broadcast focus update to teacher
-        await self.channel_layer.group_send(
-            self.session_group_name,
+        await self.send_to_audience(
             {
                 'type': 'focus_update',
                 'user_id': self.user.id,
                 'user_name': self.user.full_name,
                 'focus_score': focus_score,
-                'timestamp': await sync_to_async(self.get_current_time)()
+                'timestamp': self.get_current_time()
             }
         )
         
         await self.send(text_data=json.dumps({
             'type': 'focus_update_ack',
-            'message': 'Focus score updated successfully'
+            'message': 'Focus score updated successfully',
+            'durable': is_write_through()
         }))
 
     async def handle_timer_update(self, data):
@@ -214,13 +224,12 @@ class SessionConsumer(AsyncWebsocketConsumer):
             return
             
         # Broadcast timer to all participants
-        await self.channel_layer.group_send(
-            self.session_group_name,
+        await self.send_to_audience(
             {
                 'type': 'timer_update',
                 'elapsed_time': elapsed_time,
                 'sent_by': self.user.id,
-                'timestamp': await sync_to_async(self.get_current_time)()
+                'timestamp': self.get_current_time()
             }
         )
 
@@ -243,6 +252,7 @@ class SessionConsumer(AsyncWebsocketConsumer):
             
         # Handle session end
         if control_type == 'end':
+            await self.flush_focus_updates()
             success = await self.end_session()
             if not success:
                 await self.send(text_data=json.dumps({
@@ -250,15 +260,19 @@ class SessionConsumer(AsyncWebsocketConsumer):
                     'message': 'Failed to end session'
                 }))
                 return
+
+            # Let every other connection drop its pinned context
+            await self.send_to_audience(
+                {'type': 'session_context_changed'}
+            )
                 
         # Broadcast control command to all participants
-        await self.channel_layer.group_send(
-            self.session_group_name,
+        await self.send_to_audience(
             {
                 'type': 'session_control',
                 'control_type': control_type,
                 'sent_by': self.user.id,
-                'timestamp': await sync_to_async(self.get_current_time)()
+                'timestamp': self.get_current_time()
             }
         )
 
@@ -273,18 +287,51 @@ class SessionConsumer(AsyncWebsocketConsumer):
             return
             
         # Broadcast chat message to all participants
-        await self.channel_layer.group_send(
-            self.session_group_name,
+        await self.send_to_audience(
             {
                 'type': 'chat_message',
                 'user_id': self.user.id,
                 'user_name': self.user.full_name,
                 'user_role': self.user.role,
                 'message': message,
-                'timestamp': await sync_to_async(self.get_current_time)()
+                'timestamp': self.get_current_time()
+            }
+        )
+
+    def attendance_key(self):
+        return (self.session_context.session_id, self.user.id)
+
+    async def record_leave(self):
+        await self.update_attendance(False)
+        await self.send_to_audience(
+            {
+                'type': 'user_left',
+                'user_id': self.user.id,
+                'user_name': self.user.full_name,
+                'timestamp': self.get_current_time()
             }
         )
 
+    def get_focus_feed_mode(self):
+        query = parse_qs(self.scope.get('query_string', b'').decode())
+        return query.get('focus_feed', [settings.FOCUS_FEED_MODE])[0]
+
+    async def run_focus_snapshots(self):
+        """Send one focus_snapshot per tick while anything changed"""
+        while True:
+            await asyncio.sleep(settings.FOCUS_SNAPSHOT_INTERVAL)
+            frame = self.focus_aggregator.snapshot(self.get_current_time())
+            if frame:
+                await self.send(text_data=json.dumps(frame))
+
+    async def send_to_audience(self, event):
+        """Send a group event only to the connections that consume it"""
+        role = EVENT_AUDIENCES.get(event['type'])
+        await self.channel_layer.group_send(
+            session_group_name(self.session_id, role),
+            event
+        )
+
     # Handler methods for different message types
     async def user_joined(self, event):
         await self.send(text_data=json.dumps({
@@ -295,6 +342,8 @@ class SessionConsumer(AsyncWebsocketConsumer):
         }))
 
     async def user_left(self, event):
+        if self.focus_aggregator:
+            self.focus_aggregator.remove(event['user_id'])
         await self.send(text_data=json.dumps({
             'type': 'user_left',
             'user_id': event['user_id'],
@@ -303,15 +352,17 @@ class SessionConsumer(AsyncWebsocketConsumer):
         }))
 
     async def focus_update(self, event):
-        # Only send to instructor
-        if self.user.role == 'instructor':
-            await self.send(text_data=json.dumps({
-                'type': 'focus_update',
-                'user_id': event['user_id'],
-                'user_name': event['user_name'],
-                'focus_score': event['focus_score'],
-                'timestamp': event['timestamp']
-            }))
+        # Only delivered to the instructors group, see EVENT_AUDIENCES
+        if self.focus_aggregator:
+            self.focus_aggregator.update(event['user_id'], event['user_name'], event['focus_score'])
+            return
+        await self.send(text_data=json.dumps({
+            'type': 'focus_update',
+            'user_id': event['user_id'],
+            'user_name': event['user_name'],
+            'focus_score': event['focus_score'],
+            'timestamp': event['timestamp']
+        }))
 
     async def timer_update(self, event):
         await self.send(text_data=json.dumps({
@@ -339,44 +390,54 @@ class SessionConsumer(AsyncWebsocketConsumer):
             'timestamp': event['timestamp']
         }))
 
-    # Database operations
-    @database_sync_to_async
-    def authenticate_user(self, token):
-        try:
-            access_token = AccessToken(token)
-            user_id = access_token['user_id']
-            return User.objects.get(id=user_id)
-        except (InvalidToken, TokenError, User.DoesNotExist):
-            return None
+    async def session_context_changed(self, event):
+        context = await self.reload_session_context()
+        if context is None:
+            await self.close(code=4004)  # Session was deleted
+            return
+        if not context.is_active:
+            await self.flush_focus_updates()
+
+    async def broadcast_message(self, event):
+        # Sent by Session.broadcast_to_session and send_to_session_group with a pre-serialized payload
+        await self.send(text_data=event['message'])
 
+    # Database operations
     @database_sync_to_async
     def check_session_access(self):
         logger.info(f'Checking access for user {self.user.id} in session {self.session_id}')
-        try:
-            session = Session.objects.get(id=self.session_id)
-            if self.user.role == 'instructor':
-                has_access = session.classroom.instructor == self.user
-                logger.info(f'Instructor access: {has_access}\r\n')
-                return has_access
-            else:
-                has_access = Enrollment.objects.filter(
-                    classroom=session.classroom, 
-                    student=self.user
-                ).exists()
-                logger.info(f'Student access: {has_access}\r\n')
-                return has_access
-        except Session.DoesNotExist:
+        context = load_session_context(self.session_id)
+        if context is None:
             logger.error(f'Session {self.session_id} does not exist')
             return False
 
+        if self.user.role == 'instructor':
+            has_access = context.instructor_id == self.user.id
+            logger.info(f'Instructor access: {has_access}\r\n')
+        else:
+            has_access = Enrollment.objects.filter(
+                classroom_id=context.classroom_id,
+                student_id=self.user.id
+            ).exists()
+            logger.info(f'Student access: {has_access}\r\n')
+
+        if has_access:
+            # Pin the context for the lifetime of the connection
+            self.session_context = context
+        return has_access
+
+    @database_sync_to_async
+    def reload_session_context(self):
+        self.session_context = load_session_context(self.session_id)
+        return self.session_context
+
     @database_sync_to_async
     def update_attendance(self, attended):
         try:
-            session = Session.objects.get(id=self.session_id)
             performance, created = Performance.objects.get_or_create(
-                session=session,
-                student=self.user,
-                defaults={'attended': attended}
+                session_id=self.session_context.session_id,
+                student_id=self.user.id,
+                defaults={'attended': attended, 'focus_score': 0.0}
             )
             if not created:
                 performance.attended = attended
@@ -385,33 +446,34 @@ class SessionConsumer(AsyncWebsocketConsumer):
         except Exception:
             return False
 
-    @database_sync_to_async
-    def update_focus_score(self, focus_score):
+    async def update_focus_score(self, focus_score):
         try:
-            session = Session.objects.get(id=self.session_id)
-            performance, created = Performance.objects.get_or_create(
-                session=session,
-                student=self.user,
-                defaults={'focus_score': focus_score, 'attended': True}
+            await focus_write_buffer.add(
+                self.session_context.session_id, self.user.id, focus_score, timezone.now()
             )
-            if not created:
-                performance.focus_score = focus_score
-                performance.save()
+            if is_write_through():
+                await focus_write_buffer.flush()
             return True
-        except Exception:
+        except Exception as e:
+            logger.error(f"Error buffering focus update: {str(e)}")
             return False
 
+    async def flush_focus_updates(self):
+        try:
+            await focus_write_buffer.flush()
+        except Exception as e:
+            logger.error(f"Error flushing focus updates: {str(e)}")
+
     @database_sync_to_async
     def end_session(self):
         try:
-            session = Session.objects.get(id=self.session_id)
+            session = Session.objects.get(id=self.session_context.session_id)
             session.is_active = False
             session.save()
+            self.session_context = replace(self.session_context, is_active=False)
             return True
         except Exception:
             return False
 
-    @database_sync_to_async
     def get_current_time(self):
-        from django.utils import timezone
         return timezone.now().isoformat()
\ No newline at end of file
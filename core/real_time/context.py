@@ -0,0 +1,34 @@
+from dataclasses import dataclass
+from session.models import Session
+
+@dataclass(frozen=True)
+class SessionContext:
+    """
+    Immutable snapshot of the session a WebSocket connection is bound to.
+
+    Resolved once at connect time and reused by every handler; consumers
+    reload it when they receive a `session_context_changed` group event.
+    """
+    session_id: int
+    classroom_id: int
+    instructor_id: int
+    is_active: bool
+
+    @classmethod
+    def from_session(cls, session):
+        return cls(
+            session_id=session.id,
+            classroom_id=session.classroom_id,
+            instructor_id=session.classroom.instructor_id,
+            is_active=session.is_active
+        )
+
+def load_session_context(session_id):
+    """Fetch the session context with a single query, or None if it doesn't exist"""
+    try:
+        session = Session.objects.select_related('classroom').only(
+            'id', 'is_active', 'classroom_id', 'classroom__instructor_id'
+        ).get(id=session_id)
+    except (Session.DoesNotExist, ValueError):
+        return None
+    return SessionContext.from_session(session)
@@ -0,0 +1,97 @@
+import asyncio
+import logging
+import time
+from django.core.management.base import BaseCommand
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.utils import timezone
+from channels.layers import DEFAULT_CHANNEL_LAYER, InMemoryChannelLayer, channel_layers
+from channels.testing import WebsocketCommunicator
+from rest_framework_simplejwt.tokens import AccessToken
+from classrooms.models import Classroom, Enrollment
+from core.asgi import websocket_application
+from session.models import Session
+from real_time.middleware import token_user_cache
+
+User = get_user_model()
+
+# Seconds a single handshake may take before it counts as failed
+CONNECT_TIMEOUT = 30
+
+class Command(BaseCommand):
+    help = (
+        'Measure N simultaneous WebSocket connects through the full consumer stack, cold and warm '
+        'token cache. Runs against a throwaway test database and an in-memory channel layer'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--connects', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        connects = options['connects']
+        # Consumers query the database from worker threads, which would not see
+        # rows from a transaction kept open here, so the users go into a
+        # database that is dropped afterwards instead
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        previous_layer = channel_layers.set(DEFAULT_CHANNEL_LAYER, InMemoryChannelLayer())
+        try:
+            session, tokens = self.create_session(connects)
+            token_user_cache.clear()
+
+            # Connects turned away by admission control are counted, not logged one by one
+            logging.getLogger('real_time.admission').setLevel(logging.ERROR)
+
+            self.stdout.write(
+                f"{'run':>8} {'connects':>9} {'established':>12} {'deferred':>9} {'seconds':>9} "
+                f"{'per_sec':>9} {'db_lookups':>11}"
+            )
+            for label in ('cold', 'warm'):
+                misses_before = token_user_cache.misses
+                elapsed, outcomes = asyncio.run(self.connect_all(session.id, tokens))
+                self.stdout.write(
+                    f"{label:>8} {connects:>9} {outcomes.count('connection_established'):>12} "
+                    f"{outcomes.count('connection_deferred'):>9} {elapsed:>9.3f} {connects / elapsed:>9.0f} "
+                    f"{token_user_cache.misses - misses_before:>11}"
+                )
+        finally:
+            if previous_layer is None:
+                channel_layers.backends.pop(DEFAULT_CHANNEL_LAYER, None)
+            else:
+                channel_layers.set(DEFAULT_CHANNEL_LAYER, previous_layer)
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def create_session(self, connects):
+        """An active session with `connects` enrolled students, and an access token for each"""
+        instructor = User.objects.create(
+            email='bench_connect_instructor@example.com', full_name='Bench Instructor', role='instructor', password='!')
+        classroom = Classroom.objects.create(name='Bench Connect', instructor=instructor, join_code='bench_conn')
+        session = Session.objects.create(classroom=classroom, is_active=True, start_time=timezone.now())
+        students = User.objects.bulk_create([
+            User(email=f'bench_connect_{i}@example.com', full_name=f'Bench {i}', role='student', password='!')
+            for i in range(connects)
+        ])
+        Enrollment.objects.bulk_create([Enrollment(student=student, classroom=classroom) for student in students])
+        return session, [str(AccessToken.for_user(student)) for student in students]
+
+    async def connect_all(self, session_id, tokens):
+        """
+        Open every connection at once and time each handshake up to the
+        server's first message, then close them. Returns the elapsed seconds
+        and the type of each first message
+        """
+        async def connect(token):
+            communicator = WebsocketCommunicator(websocket_application, f'/ws/session/{session_id}/?token={token}')
+            connected, _ = await communicator.connect(timeout=CONNECT_TIMEOUT)
+            if not connected:
+                return communicator, 'closed'
+            message = await communicator.receive_json_from(timeout=CONNECT_TIMEOUT)
+            return communicator, message['type']
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*[connect(token) for token in tokens])
+        elapsed = time.perf_counter() - started
+        await asyncio.gather(*[
+            communicator.disconnect() for communicator, outcome in results if outcome == 'connection_established'
+        ])
+        return elapsed, [outcome for _, outcome in results]
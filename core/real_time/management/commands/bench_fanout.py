@@ -0,0 +1,60 @@
+import asyncio
+import time
+from django.core.management.base import BaseCommand
+from channels.layers import InMemoryChannelLayer
+from real_time.schemas import EVENT_AUDIENCES
+from real_time.utils import session_group_name
+
+class CountingChannelLayer(InMemoryChannelLayer):
+    """In-memory layer that counts deliveries instead of queueing them"""
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.deliveries = 0
+
+    async def send(self, channel, message):
+        self.deliveries += 1
+
+class Command(BaseCommand):
+    help = 'Compare channel-layer deliveries for focus_update fan-out: session broadcast vs role-scoped groups'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, nargs='+', default=[50, 200, 500])
+        parser.add_argument('--instructors', type=int, default=1)
+        parser.add_argument('--rounds', type=int, default=10, help='Focus updates sent per student')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'students':>8} {'broadcast':>12} {'targeted':>12} {'reduction':>10} {'broadcast_s':>12} {'targeted_s':>12}")
+        for students in options['students']:
+            broadcast, broadcast_time = asyncio.run(
+                self.run(students, options['instructors'], options['rounds'], targeted=False)
+            )
+            targeted, targeted_time = asyncio.run(
+                self.run(students, options['instructors'], options['rounds'], targeted=True)
+            )
+            self.stdout.write(
+                f"{students:>8} {broadcast:>12} {targeted:>12} {broadcast / targeted:>9.0f}x "
+                f"{broadcast_time:>12.3f} {targeted_time:>12.3f}"
+            )
+
+    async def run(self, students, instructors, rounds, targeted):
+        layer = CountingChannelLayer()
+        session_id = 1
+
+        # Join groups the same way SessionConsumer.connect does
+        members = [('instructor', i) for i in range(instructors)] + [('student', i) for i in range(students)]
+        for role, index in members:
+            channel = f'{role}.{index}'
+            await layer.group_add(session_group_name(session_id), channel)
+            await layer.group_add(session_group_name(session_id, role), channel)
+
+        event = {'type': 'focus_update', 'user_id': 0, 'user_name': '', 'focus_score': 0.5, 'timestamp': ''}
+        if targeted:
+            group = session_group_name(session_id, EVENT_AUDIENCES[event['type']])
+        else:
+            group = session_group_name(session_id)
+
+        started = time.perf_counter()
+        for _ in range(rounds):
+            for _ in range(students):
+                await layer.group_send(group, event)
+        return layer.deliveries, time.perf_counter() - started
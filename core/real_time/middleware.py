@@ -1,3 +1,8 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from django.conf import settings
 from channels.middleware import BaseMiddleware
 from channels.db import database_sync_to_async
 from django.contrib.auth import get_user_model
@@ -6,7 +11,80 @@ from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
 
 User = get_user_model()
 
+@dataclass(frozen=True)
+class UserSnapshot:
+    """
+    The user fields WebSocket consumers need, detached from the ORM so it
+    can be cached and shared between connections
+    """
+    id: int
+    role: str
+    full_name: str
+
+    is_authenticated = True
+    is_anonymous = False
+
+    @property
+    def pk(self):
+        return self.id
+
+    def __str__(self):
+        return f"{self.full_name} ({self.id})"
+
+class TokenUserCache:
+    """
+    Short-lived in-process cache of validated access token -> UserSnapshot.
+
+    Entries never outlive the token's own expiry. Keyed by the raw token
+    string, so a hit means this exact signed token was validated before.
+    Reads happen on the event loop and writes on database_sync_to_async
+    threads, so every access holds a lock.
+    """
+    def __init__(self, ttl=None, max_entries=None):
+        self.ttl = settings.WEBSOCKET_AUTH_CACHE_TTL if ttl is None else ttl
+        self.max_entries = max_entries or settings.WEBSOCKET_AUTH_CACHE_MAX_ENTRIES
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token):
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, snapshot = entry
+            if expires_at <= time.time():
+                del self._entries[token]
+                self.misses += 1
+                return None
+            self.hits += 1
+            return snapshot
+
+    def set(self, token, snapshot, token_exp):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[token] = (min(time.time() + self.ttl, token_exp), snapshot)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+# Global cache instance shared by all connections in this process
+token_user_cache = TokenUserCache()
+
 class WebSocketJWTAuthMiddleware(BaseMiddleware):
+    """
+    Resolves `?token=` into `scope['user']` (a UserSnapshot). When that fails
+    `scope['auth_error']` is set to 'missing_token' or 'invalid_token' so
+    consumers don't have to parse or decode the token again.
+    """
     async def __call__(self, scope, receive, send):
         # Extract token from query string
         query_string = scope.get('query_string', b'').decode()
@@ -16,13 +94,18 @@ class WebSocketJWTAuthMiddleware(BaseMiddleware):
                 token = param.split('=')[1]
                 break
         
-        if token:
-            try:
-                user = await self.get_user_from_token(token)
-                scope['user'] = user
-            except (InvalidToken, TokenError):
-                # Close connection if token is invalid
-                return await super().__call__(scope, receive, send)
+        if not token:
+            scope['auth_error'] = 'missing_token'
+            return await super().__call__(scope, receive, send)
+
+        user = token_user_cache.get(token)
+        if user is None:
+            user = await self.get_user_from_token(token)
+
+        if user:
+            scope['user'] = user
+        else:
+            scope['auth_error'] = 'invalid_token'
         
         return await super().__call__(scope, receive, send)
 
@@ -30,7 +113,9 @@ class WebSocketJWTAuthMiddleware(BaseMiddleware):
     def get_user_from_token(self, token):
         try:
             access_token = AccessToken(token)
-            user_id = access_token['user_id']
-            return User.objects.get(id=user_id)
+            user = User.objects.only('id', 'role', 'full_name').get(id=access_token['user_id'])
         except (InvalidToken, TokenError, User.DoesNotExist):
-            return None
\ No newline at end of file
+            return None
+        snapshot = UserSnapshot(id=user.id, role=user.role, full_name=user.full_name)
+        token_user_cache.set(token, snapshot, access_token['exp'])
+        return snapshot
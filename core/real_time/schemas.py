@@ -6,6 +6,7 @@ WebSocket message schemas for EduFocus
 MESSAGE_TYPES = {
     'CONNECTION_ESTABLISHED': 'connection_established',
     'FOCUS_UPDATE': 'focus_update',
+    'FOCUS_SNAPSHOT': 'focus_snapshot',
     'TIMER_UPDATE': 'timer_update',
     'SESSION_CONTROL': 'session_control',
     'CHAT_MESSAGE': 'chat_message',
@@ -14,6 +15,14 @@ MESSAGE_TYPES = {
     'ERROR': 'error'
 }
 
+# Role-scoped group each server-side event is delivered to. Events not listed
+# here go to the whole session group.
+EVENT_AUDIENCES = {
+    MESSAGE_TYPES['FOCUS_UPDATE']: 'instructor',
+    MESSAGE_TYPES['USER_JOINED']: 'instructor',
+    MESSAGE_TYPES['USER_LEFT']: 'instructor',
+}
+
 # Focus update schema
 FOCUS_UPDATE_SCHEMA = {
     'type': 'object',
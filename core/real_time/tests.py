@@ -1,17 +1,30 @@
 """
 Test suite for real_time app: SessionConsumer, WebSocket authentication, and real-time events.
 """
+import asyncio
 import json
+import threading
 from django.utils import timezone
 from channels.testing import WebsocketCommunicator
-from django.test import TransactionTestCase
+from channels.security.websocket import AllowedHostsOriginValidator
+from django.test import TransactionTestCase, override_settings
 from django.contrib.auth import get_user_model
-from core.asgi import application
+# The origin validator reads ALLOWED_HOSTS once at import, so tests connect
+# to the stack behind it; its own check is covered below
+from core.asgi import websocket_application as application
 print(f"Type of application: {type(application)}")
 print(f"Application object: {application}")
 from rest_framework_simplejwt.tokens import RefreshToken
 from classrooms.models import Classroom, Enrollment
 from session.models import Session
+from performance.models import Performance, FocusSample
+from channels.db import database_sync_to_async
+from .buffers import FocusWriteBuffer
+from .context import load_session_context
+from .middleware import WebSocketJWTAuthMiddleware, UserSnapshot, TokenUserCache, token_user_cache
+from .admission import ConnectAdmissionController, ConnectAdmissionMiddleware, RETRY_LATER_CLOSE_CODE
+from .attendance import attendance_coalescer
+from .utils import send_to_session_group
 
 User = get_user_model()
 
@@ -44,6 +57,19 @@ class RealTimeWebSocketTests(TransactionTestCase):
         self.assertTrue(connected)
         await communicator.disconnect()
 
+    @override_settings(ALLOWED_HOSTS=['localhost'])
+    async def test_origin_validator_requires_allowed_origin(self):
+        # Built like core.asgi does, under the overridden ALLOWED_HOSTS
+        validated = AllowedHostsOriginValidator(application)
+        url = f"/ws/session/{self.session.id}/?token={self.student_token}"
+        connected, _ = await WebsocketCommunicator(validated, url).connect()
+        self.assertFalse(connected)
+
+        communicator = WebsocketCommunicator(validated, url, headers=[(b'origin', b'http://localhost')])
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        await communicator.disconnect()
+
     async def test_connection_fails_with_invalid_token(self):
         communicator = WebsocketCommunicator(application, f"/ws/session/{self.session.id}/?token=invalidtoken")
         connected, close_code = await communicator.connect()
@@ -108,6 +134,257 @@ class RealTimeWebSocketTests(TransactionTestCase):
         self.assertEqual(response['type'], 'session_control')
         self.assertEqual(response['control_type'], 'end')
 
-        self.session.refresh_from_db()
+        await database_sync_to_async(self.session.refresh_from_db)()
         self.assertFalse(self.session.is_active)
-        await communicator.disconnect()
\ No newline at end of file
+        await communicator.disconnect()
+
+    async def test_focus_update_only_reaches_instructors(self):
+        instructor = WebsocketCommunicator(application, f"/ws/session/{self.session.id}/?token={self.instructor_token}&focus_feed=raw")
+        student = WebsocketCommunicator(application, f"/ws/session/{self.session.id}/?token={self.student_token}")
+        await instructor.connect()
+        await instructor.receive_json_from()  # connection_established
+        await student.connect()
+        await student.receive_json_from()  # connection_established
+        self.assertEqual((await instructor.receive_json_from())['type'], 'user_joined')
+
+        await student.send_json_to({'type': 'focus_update', 'focus_score': 0.7})
+        self.assertEqual((await student.receive_json_from())['type'], 'focus_update_ack')
+        response = await instructor.receive_json_from()
+        self.assertEqual(response['type'], 'focus_update')
+        self.assertEqual(response['focus_score'], 0.7)
+        self.assertTrue(await student.receive_nothing())
+
+        await student.disconnect()
+        await instructor.disconnect()
+
+    @override_settings(FOCUS_SNAPSHOT_INTERVAL=0.1)
+    async def test_instructor_receives_focus_snapshots(self):
+        instructor = WebsocketCommunicator(application, f"/ws/session/{self.session.id}/?token={self.instructor_token}")
+        student = WebsocketCommunicator(application, f"/ws/session/{self.session.id}/?token={self.student_token}")
+        await instructor.connect()
+        await instructor.receive_json_from()  # connection_established
+        await student.connect()
+        await student.receive_json_from()  # connection_established
+        await instructor.receive_json_from()  # user_joined
+
+        for score in (0.2, 0.95):
+            await student.send_json_to({'type': 'focus_update', 'focus_score': score})
+            await student.receive_json_from()  # focus_update_ack
+
+        # The two updates may straddle a tick; the latest score wins eventually
+        snapshot = await instructor.receive_json_from(timeout=2)
+        if snapshot['class_avg_focus'] != 0.95:
+            snapshot = await instructor.receive_json_from(timeout=2)
+        self.assertEqual(snapshot['type'], 'focus_snapshot')
+        self.assertEqual(snapshot['student_count'], 1)
+        self.assertEqual(snapshot['class_avg_focus'], 0.95)
+        self.assertEqual(snapshot['histogram'][-1], 1)
+        self.assertEqual(snapshot['students'][0]['user_id'], self.student.id)
+
+        await student.disconnect()
+        await instructor.disconnect()
+
+    async def test_quick_reconnect_is_coalesced(self):
+        instructor = WebsocketCommunicator(application, f"/ws/session/{self.session.id}/?token={self.instructor_token}")
+        await instructor.connect()
+        await instructor.receive_json_from()  # connection_established
+
+        student = WebsocketCommunicator(application, f"/ws/session/{self.session.id}/?token={self.student_token}")
+        await student.connect()
+        self.assertEqual((await instructor.receive_json_from())['type'], 'user_joined')
+        await student.disconnect()
+
+        coalesced = attendance_coalescer.coalesced
+        student = WebsocketCommunicator(application, f"/ws/session/{self.session.id}/?token={self.student_token}")
+        connected, _ = await student.connect()
+        self.assertTrue(connected)
+        self.assertEqual(attendance_coalescer.coalesced, coalesced + 1)
+        # Neither user_left nor a second user_joined reached the instructor
+        self.assertTrue(await instructor.receive_nothing())
+
+        await student.disconnect()
+        await instructor.disconnect()
+
+    async def test_report_available_reaches_instructors(self):
+        instructor = WebsocketCommunicator(application, f"/ws/session/{self.session.id}/?token={self.instructor_token}")
+        student = WebsocketCommunicator(application, f"/ws/session/{self.session.id}/?token={self.student_token}")
+        await instructor.connect()
+        await instructor.receive_json_from()  # connection_established
+        await student.connect()
+        await student.receive_json_from()  # connection_established
+        await instructor.receive_json_from()  # user_joined
+
+        await send_to_session_group(self.session.id, {
+            'type': 'report_available',
+            'report_type': 'instructor',
+            'session_id': self.session.id,
+        }, role='instructor')
+        response = await instructor.receive_json_from()
+        self.assertEqual(response['type'], 'report_available')
+        self.assertEqual(response['session_id'], self.session.id)
+        self.assertTrue(await student.receive_nothing())
+
+        await student.disconnect()
+        await instructor.disconnect()
+
+    def test_session_context_loads_in_one_query(self):
+        with self.assertNumQueries(1):
+            context = load_session_context(self.session.id)
+        self.assertEqual(context.classroom_id, self.classroom.id)
+        self.assertEqual(context.instructor_id, self.instructor.id)
+        self.assertTrue(context.is_active)
+        self.assertIsNone(load_session_context(self.session.id + 1))
+
+    async def test_focus_update_rejected_after_context_invalidated(self):
+        communicator = WebsocketCommunicator(application, f"/ws/session/{self.session.id}/?token={self.student_token}")
+        await communicator.connect()
+        await communicator.receive_json_from()  # connection_established
+
+        await database_sync_to_async(Session.objects.filter(id=self.session.id).update)(is_active=False)
+        await database_sync_to_async(self.session.notify_context_changed)()
+
+        await communicator.send_json_to({'type': 'focus_update', 'focus_score': 0.5})
+        response = await communicator.receive_json_from()
+        self.assertEqual(response['type'], 'error')
+        self.assertEqual(response['message'], 'Session is not active')
+        await communicator.disconnect()
+
+
+class FocusWriteBufferTests(TransactionTestCase):
+    def setUp(self):
+        self.instructor = User.objects.create_user(email='instructor@test.com', password='password', role='instructor', full_name='Instructor')
+        self.student = User.objects.create_user(email='student@test.com', password='password', role='student', full_name='Student')
+        self.classroom = Classroom.objects.create(name='Test Class', instructor=self.instructor, join_code='TEST')
+        self.session = Session.objects.create(classroom=self.classroom, is_active=True, start_time=timezone.now())
+
+    async def test_updates_are_coalesced_until_flush(self):
+        buffer = FocusWriteBuffer(max_size=100, flush_interval=60)
+        for score in (0.2, 0.4, 0.6):
+            await buffer.add(self.session.id, self.student.id, score, timezone.now())
+
+        self.assertFalse(await database_sync_to_async(Performance.objects.exists)())
+
+        self.assertEqual(await buffer.flush(), 3)
+        performance = await database_sync_to_async(Performance.objects.get)(session=self.session, student=self.student)
+        self.assertEqual(performance.focus_score, 0.6)
+        self.assertEqual(await database_sync_to_async(FocusSample.objects.count)(), 3)
+
+    async def test_size_trigger_flushes_inline(self):
+        buffer = FocusWriteBuffer(max_size=2, flush_interval=60)
+        await buffer.add(self.session.id, self.student.id, 0.5, timezone.now())
+        await buffer.add(self.session.id, self.student.id, 0.7, timezone.now())
+
+        self.assertEqual(len(buffer), 0)
+        self.assertEqual(await database_sync_to_async(FocusSample.objects.count)(), 2)
+
+    async def test_failing_session_is_retried_alone_then_dropped(self):
+        buffer = FocusWriteBuffer(max_size=100, flush_interval=60, max_retries=1)
+        missing_session_id = self.session.id + 1000
+        await buffer.add(self.session.id, self.student.id, 0.5, timezone.now())
+        await buffer.add(missing_session_id, self.student.id, 0.5, timezone.now())
+
+        # The healthy session is written; only the bad one is re-queued
+        with self.assertRaises(Exception):
+            await buffer.flush()
+        self.assertEqual(await database_sync_to_async(FocusSample.objects.count)(), 1)
+        self.assertEqual(len(buffer), 1)
+
+        with self.assertRaises(Exception):
+            await buffer.flush()
+        self.assertEqual((len(buffer), buffer.dropped), (0, 1))
+
+        await buffer.add(self.session.id, self.student.id, 0.7, timezone.now())
+        self.assertEqual(await buffer.flush(), 1)
+
+    async def test_pending_samples_are_capped(self):
+        buffer = FocusWriteBuffer(max_size=100, flush_interval=60, max_pending=3)
+        for score in (0.1, 0.2, 0.3, 0.4, 0.5):
+            await buffer.add(self.session.id, self.student.id, score, timezone.now())
+
+        self.assertEqual((len(buffer), buffer.dropped), (3, 2))
+        self.assertEqual(await buffer.flush(), 3)
+        scores = await database_sync_to_async(list)(FocusSample.objects.values_list('focus_score', flat=True))
+        self.assertEqual(sorted(scores), [0.3, 0.4, 0.5])
+
+
+class WebSocketAuthCacheTests(TransactionTestCase):
+    def setUp(self):
+        self.student = User.objects.create_user(email='student@test.com', password='password', role='student', full_name='Student')
+        self.token = str(RefreshToken.for_user(self.student).access_token)
+        token_user_cache.clear()
+
+    async def test_reconnect_uses_cached_user_snapshot(self):
+        scopes = []
+
+        async def inner(scope, receive, send):
+            scopes.append(scope)
+
+        middleware = WebSocketJWTAuthMiddleware(inner)
+        for _ in range(2):
+            await middleware({'type': 'websocket', 'query_string': f'token={self.token}'.encode()}, None, None)
+
+        self.assertEqual((token_user_cache.misses, token_user_cache.hits), (1, 1))
+        self.assertEqual(scopes[1]['user'], UserSnapshot(id=self.student.id, role='student', full_name='Student'))
+
+    async def test_missing_and_invalid_tokens_are_flagged(self):
+        scopes = []
+
+        async def inner(scope, receive, send):
+            scopes.append(scope)
+
+        middleware = WebSocketJWTAuthMiddleware(inner)
+        await middleware({'type': 'websocket', 'query_string': b''}, None, None)
+        await middleware({'type': 'websocket', 'query_string': b'token=invalid'}, None, None)
+
+        self.assertEqual([scope['auth_error'] for scope in scopes], ['missing_token', 'invalid_token'])
+
+    def test_concurrent_eviction_and_expiry(self):
+        # Expired reads delete entries while writers on other threads evict
+        cache = TokenUserCache(ttl=60, max_entries=4)
+        snapshot = UserSnapshot(id=1, role='student', full_name='Student')
+        errors = []
+
+        def churn(offset):
+            try:
+                for index in range(2000):
+                    token = f'token-{(index + offset) % 16}'
+                    cache.set(token, snapshot, token_exp=0)
+                    cache.get(token)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=churn, args=(offset,)) for offset in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertLessEqual(len(cache._entries), 4)
+
+
+class ConnectAdmissionTests(TransactionTestCase):
+    async def test_connects_beyond_limit_are_deferred_or_rejected(self):
+        controller = ConnectAdmissionController(max_in_flight=1, queue_timeout=0.05, retry_after_ms=100)
+        self.assertTrue(await controller.acquire())
+        self.assertFalse(await controller.acquire())
+
+        asyncio.get_running_loop().call_later(0.01, controller.release)
+        self.assertTrue(await controller.acquire())
+        self.assertEqual(controller.stats, {'admitted': 2, 'deferred': 1, 'rejected': 1})
+
+    async def test_rejected_connect_gets_retry_hint(self):
+        controller = ConnectAdmissionController(max_in_flight=1, queue_timeout=0.01, retry_after_ms=100)
+        await controller.acquire()
+
+        async def inner(scope, receive, send):
+            raise AssertionError('Rejected connects must not reach the application')
+
+        communicator = WebsocketCommunicator(ConnectAdmissionMiddleware(inner, controller=controller), '/ws/session/1/')
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        response = await communicator.receive_json_from()
+        self.assertEqual(response['type'], 'connection_deferred')
+        self.assertTrue(100 <= response['retry_after_ms'] <= 200)
+        close = await communicator.receive_output()
+        self.assertEqual(close['code'], RETRY_LATER_CLOSE_CODE)
@@ -0,0 +1,6 @@
+from django.urls import path
+from .views import RealTimeStatsView
+
+urlpatterns = [
+    path('realtime/stats/', RealTimeStatsView.as_view(), name='realtime-stats'),
+]
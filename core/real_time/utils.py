@@ -1,18 +1,30 @@
+import json
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
 
-async def send_to_session_group(session_id, message):
+def session_group_name(session_id, role=None):
     """
-    Send a message to a specific session group
+    Name of the channel-layer group for a session, or for one role within
+    it (e.g. `session_5_instructors`) when `role` is given
+    """
+    if role:
+        return f'session_{session_id}_{role}s'
+    return f'session_{session_id}'
+
+async def send_to_session_group(session_id, message, role=None):
+    """
+    Send a message to a specific session group, or only to its members with
+    `role`. The message is serialized here, as SessionConsumer.broadcast_message
+    forwards it as is
     """
     channel_layer = get_channel_layer()
-    group_name = f'session_{session_id}'
+    group_name = session_group_name(session_id, role)
     
     await channel_layer.group_send(
         group_name,
         {
             'type': 'broadcast_message',
-            'message': message
+            'message': json.dumps(message)
         }
     )
 
@@ -21,7 +33,7 @@ async def get_session_participants(session_id):
     Get list of participants in a session (for debugging/monitoring)
     """
     channel_layer = get_channel_layer()
-    group_name = f'session_{session_id}'
+    group_name = session_group_name(session_id)
     
     # This is a simplified implementation - in production you might want
     # to track participants in a more robust way (e.g., Redis)
@@ -0,0 +1,26 @@
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework.permissions import IsAdminUser
+from .admission import admission_controller
+from .attendance import attendance_coalescer
+from .buffers import focus_write_buffer
+from .middleware import token_user_cache
+
+class RealTimeStatsView(APIView):
+    """
+    In-process counters for this worker's WebSocket stack. Served by the same
+    ASGI worker that handles the WebSocket traffic.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response({
+            'connects': admission_controller.snapshot(),
+            'coalesced_reconnects': attendance_coalescer.coalesced,
+            'token_cache': {
+                'hits': token_user_cache.hits,
+                'misses': token_user_cache.misses
+            },
+            'pending_focus_samples': len(focus_write_buffer),
+            'dropped_focus_samples': focus_write_buffer.dropped
+        })
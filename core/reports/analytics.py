@@ -0,0 +1,276 @@
+from datetime import datetime, timezone
+import numpy as np
+from django.conf import settings
+from django.db import connections
+from django.db.models import FloatField, Func
+from performance.models import FocusSample
+
+PERCENTILES = (10, 25, 50, 75, 90)
+# Consecutive samples further apart than this many of their own durations
+# are treated as a disconnect, which ends a focus streak
+GAP_TOLERANCE = 1.5
+# Rows fetched and converted to arrays at a time when loading samples
+LOAD_CHUNK_ROWS = 50000
+
+
+class EpochSeconds(Func):
+    """
+    Seconds since the Unix epoch of a datetime column, computed by the
+    database. SQLite's julianday() keeps millisecond precision.
+    """
+    template = "date_part('epoch', %(expressions)s)"
+    output_field = FloatField()
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler, connection, template='((julianday(%(expressions)s) - 2440587.5) * 86400.0)', **extra_context
+        )
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, template='UNIX_TIMESTAMP(%(expressions)s)', **extra_context)
+
+
+def load_session_samples(session):
+    """
+    Fetch a session's samples in one query as column arrays:
+    (student_ids, seconds since epoch, focus scores, seconds covered per sample).
+    Timestamps come back from the database as plain numbers, so no datetime
+    objects are built; archived sessions are read from their archive columns.
+    """
+    if session.archived_at:
+        from .archive import read_session_archive
+        arrays = read_session_archive(session)
+        if not len(arrays['samples_student']):
+            return None
+        order = np.argsort(arrays['samples_timestamp'], kind='stable')
+        return (
+            arrays['samples_student'][order],
+            arrays['samples_timestamp'][order] / 1e6,
+            arrays['samples_focus_score'][order],
+            arrays['samples_resolution'][order].astype(np.float64),
+        )
+
+    queryset = FocusSample.objects.filter(session_id=session.id).order_by('timestamp').values_list(
+        'student_id', EpochSeconds('timestamp'), 'focus_score', 'resolution'
+    )
+    sql, params = queryset.query.sql_with_params()
+    chunks = []
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(sql, params)
+        # Converted a chunk at a time so only one chunk of row tuples is alive at once
+        while rows := cursor.fetchmany(LOAD_CHUNK_ROWS):
+            chunks.append(np.array(rows, dtype=np.float64))
+    if not chunks:
+        return None
+    columns = np.concatenate(chunks)
+    return columns[:, 0].astype(np.int64), columns[:, 1], columns[:, 2], columns[:, 3]
+
+
+def _factorize(values):
+    """
+    Sorted unique ids and each value's index among them. Student ids are
+    dense primary keys, so a lookup table indexed by id replaces the sort
+    np.unique would do; sparse ids fall back to it.
+    """
+    size = int(values.max()) + 1
+    if size > 4 * len(values):
+        uniques, codes = np.unique(values, return_inverse=True)
+        return codes, uniques
+    present = np.zeros(size, dtype=bool)
+    present[values] = True
+    lookup = np.cumsum(present) - 1
+    return lookup[values], np.flatnonzero(present)
+
+
+def _isoformat(epoch_seconds):
+    return datetime.fromtimestamp(epoch_seconds, tz=timezone.utc).isoformat()
+
+
+def _code_dtype(groups):
+    return np.int16 if groups <= np.iinfo(np.int16).max else np.int64
+
+
+def _round(values, digits=3):
+    return [None if np.isnan(value) else round(float(value), digits) for value in values]
+
+
+def _group_percentiles(sorted_values, starts, counts, q):
+    """Linear-interpolated percentile of every group in one pass over sorted values"""
+    position = starts + (q / 100) * (counts - 1)
+    low = np.floor(position).astype(np.int64)
+    high = np.ceil(position).astype(np.int64)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (position - low)
+
+
+def _rolling_mean(sums, counts, window):
+    """Trailing rolling mean along the last axis from per-bucket sums and counts"""
+    def window_total(values):
+        total = np.cumsum(values, axis=-1)
+        shifted = np.zeros_like(total)
+        shifted[..., window:] = total[..., :-window]
+        return total - shifted
+
+    window_counts = window_total(counts)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(window_counts > 0, window_total(sums) / window_counts, np.nan)
+
+
+def _dips(minute_avg, start_seconds):
+    """Runs of minutes where the class average sits more than one deviation below its mean"""
+    valid = ~np.isnan(minute_avg)
+    if valid.sum() < 2:
+        return []
+    limit = np.nanmean(minute_avg) - np.nanstd(minute_avg)
+    below = np.where(valid, minute_avg < limit, False).astype(np.int8)
+    edges = np.diff(np.concatenate([[0], below, [0]]))
+    starts, ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+    return [
+        {
+            'start': _isoformat(start_seconds + start * 60),
+            'minutes': int(end - start),
+            'min_avg_focus': round(float(np.nanmin(minute_avg[start:end])), 3),
+        }
+        for start, end in zip(starts, ends)
+    ]
+
+
+def compute_focus_analytics(student_ids, seconds, scores, resolutions, threshold=None, window_minutes=None):
+    """
+    Per-student and class focus statistics from flat sample arrays, all
+    vectorized: percentiles, standard deviation, time above the focus
+    threshold, longest focus streak, focus drops, rolling per-minute
+    windows and class-wide engagement dips. Each student's samples must be
+    in time order, as load_session_samples returns them.
+    """
+    threshold = settings.REPORT_FOCUS_THRESHOLD if threshold is None else threshold
+    window = window_minutes or settings.REPORT_ROLLING_WINDOW_MINUTES
+
+    codes, students = _factorize(student_ids)
+    groups = len(students)
+    counts = np.bincount(codes, minlength=groups)
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+
+    # Order by student, keeping each student's samples in time order: rows
+    # come ordered by timestamp from load_session_samples, so one stable
+    # pass over the small integer codes (numpy's radix sort) is enough
+    order = np.argsort(codes.astype(_code_dtype(groups)), kind='stable')
+    c = np.repeat(np.arange(groups), counts)
+    # np.take skips fancy indexing's overhead on these large gathers
+    t, v, r = (np.take(column, order) for column in (seconds, scores, resolutions))
+
+    # Every student's samples are contiguous now, so per-student totals are
+    # sequential reductions over slices rather than scattered bincounts
+    sums = np.add.reduceat(v, starts)
+    means = sums / counts
+    variances = np.add.reduceat(v * v, starts) / counts - means * means
+    stds = np.sqrt(np.maximum(variances, 0))
+
+    # Percentiles over scores sorted within each student: offsetting every
+    # student into its own value band lets one flat sort do the grouping
+    low = v.min()
+    band = v.max() - low + 1
+    offsets = c * band
+    by_value = v - low
+    by_value += offsets
+    by_value.sort()
+    by_value -= offsets
+    by_value += low
+    percentiles = {q: _group_percentiles(by_value, starts, counts, q) for q in PERCENTILES}
+
+    above = v >= threshold
+    focused_seconds = r * above
+    time_above = np.add.reduceat(focused_seconds, starts)
+    time_total = np.add.reduceat(r, starts)
+
+    new_student = np.zeros(len(c), dtype=bool)
+    new_student[starts] = True
+    gap = np.zeros(len(c), dtype=bool)
+    gap[1:] = (t[1:] - t[:-1]) > r[:-1] * GAP_TOLERANCE
+
+    # A streak is a run of above-threshold samples without a disconnect;
+    # each student's first run starts at its first sample
+    run_breaks = ~above | new_student | gap
+    run_starts = np.flatnonzero(run_breaks)
+    run_seconds = np.add.reduceat(focused_seconds, run_starts)
+    first_runs = np.searchsorted(run_starts, starts)
+    longest_streak = np.maximum.reduceat(run_seconds, first_runs)
+
+    drops = np.zeros(len(c), dtype=bool)
+    drops[1:] = above[:-1] & ~above[1:] & ~new_student[1:]
+    focus_drops = np.add.reduceat(drops, starts, dtype=np.int64)
+
+    # Per-minute buckets for rolling windows. Cells only grow along each
+    # student's time-ordered samples, so each bucket is one contiguous slice
+    start_seconds = np.floor(t.min() / 60) * 60
+    # Truncating a non-negative offset is a floor, and much cheaper than `//` on floats
+    minutes = ((t - start_seconds) / 60).astype(np.int64)
+    span = int(minutes.max()) + 1
+    cells = c * span + minutes
+    new_cell = np.ones(len(cells), dtype=bool)
+    new_cell[1:] = cells[1:] != cells[:-1]
+    cell_starts = np.flatnonzero(new_cell)
+    minute_sums = np.zeros(groups * span)
+    minute_sums[cells[cell_starts]] = np.add.reduceat(v, cell_starts)
+    minute_sums = minute_sums.reshape(groups, span)
+    minute_counts = np.zeros(groups * span, dtype=np.int64)
+    minute_counts[cells[cell_starts]] = np.diff(np.append(cell_starts, len(cells)))
+    minute_counts = minute_counts.reshape(groups, span)
+    student_rolling = _rolling_mean(minute_sums, minute_counts, window)
+    # Every student has at least one sample, so no row is all NaN
+    best_window = np.nanmax(student_rolling, axis=1)
+    worst_window = np.nanmin(student_rolling, axis=1)
+
+    class_sums, class_counts = minute_sums.sum(axis=0), minute_counts.sum(axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        class_minute_avg = np.where(class_counts > 0, class_sums / class_counts, np.nan)
+    class_rolling = _rolling_mean(class_sums, class_counts, window)
+
+    student_stats = {}
+    rounded = {
+        'mean': _round(means), 'std': _round(stds),
+        **{f'p{q}': _round(values) for q, values in percentiles.items()},
+        'best_window_avg': _round(best_window), 'worst_window_avg': _round(worst_window),
+    }
+    for index, student_id in enumerate(students.tolist()):
+        student_stats[str(student_id)] = {
+            'samples': int(counts[index]),
+            **{key: values[index] for key, values in rounded.items()},
+            'time_above_threshold_s': round(float(time_above[index]), 1),
+            'time_above_threshold_pct': round(float(time_above[index] / time_total[index] * 100), 1),
+            'longest_streak_s': round(float(longest_streak[index]), 1),
+            'focus_drops': int(focus_drops[index]),
+        }
+
+    # A plain sort beats np.percentile's partition over all samples, and
+    # reuses the interpolation above
+    class_sorted = np.sort(scores)
+    class_percentiles = [
+        _group_percentiles(class_sorted, np.zeros(1, dtype=np.int64), np.array([len(scores)]), q)[0]
+        for q in PERCENTILES
+    ]
+    return {
+        'threshold': threshold,
+        'window_minutes': window,
+        'class': {
+            'samples': int(len(scores)),
+            'mean': round(float(scores.mean()), 3),
+            'std': round(float(scores.std()), 3),
+            **{f'p{q}': round(float(value), 3) for q, value in zip(PERCENTILES, class_percentiles)},
+            'time_above_threshold_pct': round(float(time_above.sum() / time_total.sum() * 100), 1),
+            'rolling': [
+                {'timestamp': _isoformat(start_seconds + minute * 60), 'avg_focus': value}
+                for minute, value in enumerate(_round(class_rolling))
+                if value is not None
+            ],
+            'dips': _dips(class_minute_avg, start_seconds),
+        },
+        'students': student_stats,
+    }
+
+
+def session_focus_analytics(session):
+    """Analytics for a session from a single bulk fetch of its samples, or None without samples"""
+    samples = load_session_samples(session)
+    if samples is None:
+        return None
+    return compute_focus_analytics(*samples)
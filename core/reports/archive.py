@@ -0,0 +1,361 @@
+import json
+import logging
+import os
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone as dt_timezone
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from performance.models import Performance, FocusSample, FocusAccumulator, FocusMinuteBucket
+from session.models import Session
+from .cache import invalidate_on_commit
+from .models import Report, ReportJob
+
+logger = logging.getLogger(__name__)
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+# A report job that has been running longer than this is assumed dead and
+# no longer holds its session's data in the hot tables
+RUNNING_JOB_TIMEOUT = timedelta(hours=1)
+
+# table -> [(column, dtype)]. Each session's columns are stored as their
+# own members, '<session id>/<table>_<column>', so reading one session only
+# decompresses that session's arrays.
+TABLES = {
+    'samples': [
+        ('session', np.int64), ('student', np.int64), ('timestamp', np.int64),
+        ('focus_score', np.float64), ('resolution', np.int16),
+    ],
+    'performances': [
+        ('session', np.int64), ('student', np.int64), ('timestamp', np.int64),
+        ('focus_score', np.float64), ('attended', np.bool_),
+    ],
+    'accumulators': [
+        ('session', np.int64), ('student', np.int64), ('sample_count', np.int64),
+        ('score_sum', np.float64), ('score_sumsq', np.float64), ('score_min', np.float64),
+        ('score_max', np.float64),
+    ],
+    'minute_buckets': [
+        ('session', np.int64), ('student', np.int64), ('minute', np.int64),
+        ('sample_count', np.int64), ('score_sum', np.float64),
+    ],
+    'reports': [
+        ('session', np.int64), ('report', np.int64), ('focus_data_json', np.str_), ('metadata', np.str_),
+    ],
+}
+
+
+def archive_path(classroom_id, month):
+    """One compressed columnar file per classroom per month"""
+    return os.path.join(
+        str(settings.FOCUS_ARCHIVE_ROOT), f'classroom_{classroom_id}', f'{month:%Y-%m}.npz'
+    )
+
+
+def session_archive_path(session):
+    return archive_path(session.classroom_id, session.start_time)
+
+
+def _to_micros(value):
+    return (value - EPOCH) // timedelta(microseconds=1)
+
+
+def _from_micros(value):
+    return EPOCH + timedelta(microseconds=int(value))
+
+
+def _columns(table, rows):
+    """Transpose row tuples into typed column arrays"""
+    spec = TABLES[table]
+    columns = list(zip(*rows)) if rows else [()] * len(spec)
+    return {
+        f'{table}_{name}': np.array(values, dtype=dtype)
+        for (name, dtype), values in zip(spec, columns)
+    }
+
+
+def _member(session_id, column):
+    return f'{session_id}/{column}'
+
+
+def _member_session(member):
+    return int(member.split('/', 1)[0])
+
+
+def _lock_file(handle):
+    """Block until this process holds an exclusive lock on an open file"""
+    if os.name == 'nt':
+        import msvcrt
+        handle.seek(0)
+        while True:
+            try:
+                # Locks the first byte; LK_LOCK gives up after ten one-second tries
+                msvcrt.locking(handle.fileno(), msvcrt.LK_LOCK, 1)
+                return
+            except OSError:
+                continue
+    import fcntl
+    fcntl.flock(handle, fcntl.LOCK_EX)
+
+
+def _unlock_file(handle):
+    if os.name == 'nt':
+        import msvcrt
+        handle.seek(0)
+        msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+        return
+    import fcntl
+    fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+@contextmanager
+def archive_lock(path):
+    """
+    Exclusive lock on an archive file, shared by every process on the host.
+    Held while the file is read, merged and replaced, and while a session is
+    restored from it, so concurrent runs can't drop each other's sessions.
+    Uses flock on POSIX and msvcrt byte locks on Windows; neither reliably
+    excludes processes on other hosts sharing FOCUS_ARCHIVE_ROOT over NFS.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(f'{path}.lock', 'a') as handle:
+        _lock_file(handle)
+        try:
+            yield
+        finally:
+            _unlock_file(handle)
+
+
+def read_archive(path):
+    """Load every member of an archive file, or {} if it doesn't exist"""
+    if not os.path.exists(path):
+        return {}
+    with np.load(path) as data:
+        return {name: data[name] for name in data.files}
+
+
+def archived_session_ids(path):
+    """Ids of the sessions stored in an archive file, read from its index only"""
+    if not os.path.exists(path):
+        return set()
+    with np.load(path) as data:
+        return {_member_session(name) for name in data.files}
+
+
+def write_archive(path, arrays):
+    """Write atomically so a crash never leaves a truncated archive behind"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as handle:
+            np.savez_compressed(handle, **arrays)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def collect_session_data(session_ids):
+    """Archive members for everything archived about the given sessions"""
+    rows = {
+        'samples': [
+            (session_id, student_id, _to_micros(timestamp), focus_score, resolution)
+            for session_id, student_id, timestamp, focus_score, resolution in FocusSample.objects.filter(
+                session_id__in=session_ids
+            ).values_list('session_id', 'student_id', 'timestamp', 'focus_score', 'resolution').order_by('id')
+        ],
+        'performances': [
+            (session_id, student_id, _to_micros(timestamp), focus_score, attended)
+            for session_id, student_id, timestamp, focus_score, attended in Performance.objects.filter(
+                session_id__in=session_ids
+            ).values_list('session_id', 'student_id', 'timestamp', 'focus_score', 'attended').order_by('id')
+        ],
+        'accumulators': [
+            (session_id, student_id, count, total, total_sq,
+             np.nan if minimum is None else minimum, np.nan if maximum is None else maximum)
+            for session_id, student_id, count, total, total_sq, minimum, maximum
+            in FocusAccumulator.objects.filter(session_id__in=session_ids).values_list(
+                'session_id', 'student_id', 'sample_count', 'score_sum', 'score_sumsq',
+                'score_min', 'score_max'
+            ).order_by('id')
+        ],
+        'minute_buckets': [
+            (session_id, student_id, _to_micros(minute), count, total)
+            for session_id, student_id, minute, count, total in FocusMinuteBucket.objects.filter(
+                session_id__in=session_ids
+            ).values_list('session_id', 'student_id', 'minute', 'sample_count', 'score_sum').order_by('id')
+        ],
+        'reports': [
+            (session_id, report_id, json.dumps(focus_data), json.dumps(metadata))
+            for session_id, report_id, focus_data, metadata in Report.objects.filter(
+                session_id__in=session_ids
+            ).values_list('session_id', 'id', 'focus_data_json', 'metadata').order_by('id')
+        ],
+    }
+    arrays = {}
+    for table, table_rows in rows.items():
+        arrays.update(_columns(table, table_rows))
+
+    members = {}
+    for session_id in session_ids:
+        for table, spec in TABLES.items():
+            mask = arrays[f'{table}_session'] == session_id
+            for name, _ in spec:
+                members[_member(session_id, f'{table}_{name}')] = arrays[f'{table}_{name}'][mask]
+    return members
+
+
+def merge_archive(existing, new, session_ids):
+    """Replace the given sessions' members in `existing` with `new`, so re-archiving is idempotent"""
+    session_ids = set(session_ids)
+    merged = {name: array for name, array in existing.items() if _member_session(name) not in session_ids}
+    merged.update(new)
+    return merged
+
+
+def archive_sessions(sessions):
+    """
+    Move the focus data and report blobs of finished sessions that share a
+    classroom and month into their archive file, then drop them from the
+    hot tables. Report rows stay, with their focus series emptied and
+    'archived' merged into their metadata.
+    """
+    if not sessions:
+        return 0
+    path = session_archive_path(sessions[0])
+
+    with archive_lock(path):
+        # Another run may have archived some of these since they were picked,
+        # and a running report job keeps reading its session's hot rows.
+        # Queued jobs are fine: they rehydrate the session when they start.
+        session_ids = list(Session.objects.filter(
+            id__in=[session.id for session in sessions], archived_at__isnull=True
+        ).exclude(
+            report_jobs__status=ReportJob.RUNNING,
+            report_jobs__started_at__gte=datetime.now(dt_timezone.utc) - RUNNING_JOB_TIMEOUT
+        ).values_list('id', flat=True))
+        if not session_ids:
+            return 0
+
+        # The file is written before anything is deleted; a failure in between
+        # only leaves rows that the next run archives again
+        write_archive(path, merge_archive(read_archive(path), collect_session_data(session_ids), session_ids))
+
+        with transaction.atomic():
+            FocusSample.objects.filter(session_id__in=session_ids).delete()
+            FocusAccumulator.objects.filter(session_id__in=session_ids).delete()
+            FocusMinuteBucket.objects.filter(session_id__in=session_ids).delete()
+            Performance.objects.filter(session_id__in=session_ids).delete()
+            reports = list(Report.objects.filter(session_id__in=session_ids).only('id', 'user_id', 'metadata'))
+            for report in reports:
+                report.focus_data_json = []
+                report.metadata = {**report.metadata, 'archived': True}
+            Report.objects.bulk_update(reports, ['focus_data_json', 'metadata'], batch_size=500)
+            invalidate_on_commit(report.user_id for report in reports)
+            Session.objects.filter(id__in=session_ids).update(archived_at=datetime.now(dt_timezone.utc))
+
+    logger.info(f"Archived {len(session_ids)} sessions to {path}")
+    return len(session_ids)
+
+
+def read_session_archive(session):
+    """Column arrays holding just this session's archived rows"""
+    path = session_archive_path(session)
+    arrays = {}
+    for table in TABLES:
+        arrays.update(_columns(table, []))
+    if not os.path.exists(path):
+        return arrays
+    with np.load(path) as data:
+        # NpzFile decompresses members on access, so the rest of the month stays untouched
+        members = set(data.files)
+        for column in arrays:
+            member = _member(session.id, column)
+            if member in members:
+                arrays[column] = data[member]
+    return arrays
+
+
+def _rows(arrays, table):
+    names = [name for name, _ in TABLES[table]]
+    return zip(*(arrays[f'{table}_{name}'].tolist() for name in names))
+
+
+def read_archived_report_blobs(report):
+    """(focus_data_json, metadata) of an archived report, or None if it isn't in the archive"""
+    arrays = read_session_archive(report.session)
+    for _, report_id, focus_data, metadata in _rows(arrays, 'reports'):
+        if report_id == report.id:
+            return json.loads(focus_data), json.loads(metadata)
+    return None
+
+
+def rehydrate_session(session):
+    """
+    Restore an archived session's focus data and report blobs to the hot
+    tables so it can be re-rendered like any other session. The archive
+    copy is kept; archiving the session again replaces it.
+    """
+    with archive_lock(session_archive_path(session)):
+        return _rehydrate_session(session)
+
+
+def _rehydrate_session(session):
+    # Another process may have restored it while we waited for the lock
+    if not Session.objects.filter(id=session.id, archived_at__isnull=False).exists():
+        session.archived_at = None
+        return session
+    arrays = read_session_archive(session)
+
+    samples = [
+        FocusSample(session_id=session_id, student_id=student_id, timestamp=_from_micros(timestamp),
+                    focus_score=focus_score, resolution=resolution)
+        for session_id, student_id, timestamp, focus_score, resolution in _rows(arrays, 'samples')
+    ]
+    performance_timestamps = {}
+    performances = []
+    for session_id, student_id, timestamp, focus_score, attended in _rows(arrays, 'performances'):
+        performance_timestamps[(session_id, student_id)] = _from_micros(timestamp)
+        performances.append(Performance(
+            session_id=session_id, student_id=student_id, focus_score=focus_score, attended=attended
+        ))
+    accumulators = [
+        FocusAccumulator(
+            session_id=session_id, student_id=student_id, sample_count=count, score_sum=total,
+            score_sumsq=total_sq, score_min=None if np.isnan(minimum) else minimum,
+            score_max=None if np.isnan(maximum) else maximum
+        )
+        for session_id, student_id, count, total, total_sq, minimum, maximum in _rows(arrays, 'accumulators')
+    ]
+    buckets = [
+        FocusMinuteBucket(session_id=session_id, student_id=student_id, minute=_from_micros(minute),
+                          sample_count=count, score_sum=total)
+        for session_id, student_id, minute, count, total in _rows(arrays, 'minute_buckets')
+    ]
+    report_blobs = {
+        report_id: (json.loads(focus_data), json.loads(metadata))
+        for _, report_id, focus_data, metadata in _rows(arrays, 'reports')
+    }
+
+    with transaction.atomic():
+        FocusSample.objects.bulk_create(samples, batch_size=1000)
+        FocusAccumulator.objects.bulk_create(accumulators, batch_size=1000)
+        FocusMinuteBucket.objects.bulk_create(buckets, batch_size=1000)
+        created = Performance.objects.bulk_create(performances, batch_size=1000)
+        # auto_now_add overwrote the original timestamps on insert
+        for performance in created:
+            performance.timestamp = performance_timestamps[(performance.session_id, performance.student_id)]
+        Performance.objects.bulk_update(created, ['timestamp'], batch_size=1000)
+
+        reports = list(Report.objects.filter(id__in=list(report_blobs)))
+        for report in reports:
+            report.focus_data_json, report.metadata = report_blobs[report.id]
+        Report.objects.bulk_update(reports, ['focus_data_json', 'metadata'], batch_size=500)
+        invalidate_on_commit(report.user_id for report in reports)
+
+        Session.objects.filter(id=session.id).update(archived_at=None)
+    session.archived_at = None
+
+    logger.info(f"Rehydrated session {session.id} with {len(samples)} samples and {len(performances)} performances")
+    return session
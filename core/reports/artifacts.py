@@ -0,0 +1,117 @@
+import hashlib
+import json
+import logging
+from datetime import timedelta
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.utils import timezone
+from .instrumentation import stage
+from .models import ChartArtifact
+from .series import encode_series
+
+logger = logging.getLogger(__name__)
+
+# Bump when chart styling changes so existing artifacts stop matching
+CHART_RENDER_VERSION = 1
+
+
+def chart_storage():
+    return ChartArtifact._meta.get_field('image').storage
+
+
+def chart_input_hash(kind, session_id, focus_data, student_name=None):
+    """
+    Hash of everything a chart's pixels depend on. The series is hashed in
+    its stored encoding so eager and lazy renders of the same data agree.
+    """
+    payload = json.dumps(
+        [CHART_RENDER_VERSION, kind, session_id, student_name, encode_series(focus_data)],
+        sort_keys=True, separators=(',', ':'),
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def find_artifacts(input_hashes):
+    """Artifacts whose file is still in storage, by input hash; marks them used"""
+    storage = chart_storage()
+    artifacts = {
+        artifact.input_hash: artifact
+        for artifact in ChartArtifact.objects.filter(input_hash__in=list(input_hashes))
+        if storage.exists(artifact.image.name)
+    }
+    if artifacts:
+        ChartArtifact.objects.filter(pk__in=[a.pk for a in artifacts.values()]).update(last_used_at=timezone.now())
+    return artifacts
+
+
+def store_artifact(input_hash, chart_image):
+    """Write PNG bytes under their content hash, once, and record the artifact for these inputs"""
+    content_hash = hashlib.sha256(chart_image).hexdigest()
+    field = ChartArtifact._meta.get_field('image')
+    name = field.generate_filename(None, f'{content_hash}.png')
+    with stage('chart_save') as counts:
+        if not field.storage.exists(name):
+            name = field.storage.save(name, ContentFile(chart_image))
+            counts['rows'] = 1
+    artifact, _ = ChartArtifact.objects.update_or_create(
+        input_hash=input_hash,
+        defaults={'content_hash': content_hash, 'image': name, 'size': len(chart_image),
+                  'last_used_at': timezone.now()},
+    )
+    return artifact
+
+
+def get_or_render_artifact(input_hash, render):
+    """The artifact for these inputs, calling `render` for PNG bytes only when none exists"""
+    artifact = find_artifacts([input_hash]).get(input_hash)
+    if artifact is None:
+        with stage('chart_render') as counts:
+            chart_image = render()
+            counts['rows'] = 1
+        if not chart_image:
+            return None
+        artifact = store_artifact(input_hash, chart_image)
+    return artifact
+
+
+def attach_artifact(report, artifact):
+    """Point an unsaved report at a chart artifact"""
+    report.chart_artifact = artifact
+    report.chart_image = artifact.image.name if artifact else None
+
+
+def delete_chart_files(names):
+    """
+    Remove chart files from storage, returning how many existed
+    """
+    storage = chart_storage()
+    deleted = 0
+    for name in names:
+        if name and storage.exists(name):
+            storage.delete(name)
+            deleted += 1
+    return deleted
+
+
+def collect_chart_artifacts(grace_seconds=None):
+    """
+    Delete artifacts no report references that haven't been used within
+    REPORT_CHART_ARTIFACT_GRACE_SECONDS, and their files once no other
+    artifact shares them. Returns how many files were deleted.
+    """
+    if grace_seconds is None:
+        grace_seconds = settings.REPORT_CHART_ARTIFACT_GRACE_SECONDS
+    cutoff = timezone.now() - timedelta(seconds=grace_seconds)
+    
+    # The grace period covers an artifact rendered but not yet attached
+    unused = ChartArtifact.objects.filter(reports__isnull=True, last_used_at__lte=cutoff)
+    candidates = dict(unused.values_list('id', 'image'))
+    if not candidates:
+        return 0
+    ChartArtifact.objects.filter(id__in=list(candidates), reports__isnull=True).delete()
+    
+    names = set(candidates.values())
+    shared = set(ChartArtifact.objects.filter(image__in=names).values_list('image', flat=True))
+    deleted = delete_chart_files(names - shared)
+    logger.info(f"Collected {len(candidates)} unreferenced chart artifacts, {deleted} files deleted")
+    return deleted
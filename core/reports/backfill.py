@@ -0,0 +1,64 @@
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Outcomes of regenerating one session
+DONE = 'done'
+FAILED = 'failed'
+SUPERSEDED = 'superseded'
+
+
+def init_worker():
+    """
+    Process pool initializer for the backfill. Nothing here imports models
+    at module level, so spawned workers can load it before Django is set up.
+    """
+    import django
+    from django.apps import apps
+    from django.db import connections
+
+    if not apps.ready:
+        # Spawned workers start from a fresh interpreter
+        django.setup()
+    # Connections inherited from the parent must not be shared; each worker
+    # opens its own on first use and keeps it for every session it handles
+    connections.close_all()
+
+
+def backfill_session(session_id, chart_workers=None):
+    """
+    Regenerate one session's reports as a new report version, returning
+    (session_id, outcome, version, seconds, stage timings). The version is
+    claimed and run like one queued for Celery, so its ReportJob records the
+    outcome and a newer request from the app supersedes it.
+    `chart_workers` caps the chart pool inside this process.
+    """
+    from django.utils import timezone
+    from .charts import limit_chart_workers
+    from .dispatch import claim_report_version, get_report_job
+    from .models import ReportJob
+    from .tasks import run_report_version, update_job
+    from .utils import update_session_analytics
+
+    timings = {}
+    started = time.perf_counter()
+    version = job = None
+    try:
+        version = claim_report_version(session_id, force=True)
+        job = get_report_job(session_id, version)
+        with limit_chart_workers(chart_workers):
+            result = run_report_version(session_id, version, job, timings)
+        if result is False:
+            outcome = SUPERSEDED
+        elif result:
+            update_session_analytics(session_id)
+            outcome = DONE
+        else:
+            outcome = FAILED
+    except Exception as e:
+        logger.error(f"Backfill failed for session {session_id}: {str(e)}")
+        update_job(job, status=ReportJob.FAILED, stage_timings=timings, error=f'{type(e).__name__}: {e}',
+                   finished_at=timezone.now())
+        outcome = FAILED
+    return session_id, outcome, version, time.perf_counter() - started, timings
@@ -0,0 +1,74 @@
+import hashlib
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+VERSION_KEY = 'reports:version:{user_id}'
+PAYLOAD_KEY = 'reports:payload:{user_id}:{version}:{digest}'
+
+
+def get_reports_version(user_id):
+    """
+    The user's report version: the time their reports last changed.
+    Every cached payload and ETag is derived from it, so bumping it
+    invalidates them all at once.
+    """
+    key = VERSION_KEY.format(user_id=user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time(), None)
+        version = cache.get(key) or time.time()
+    return version
+
+
+def invalidate_user_reports(user_ids):
+    """Bump the report version of every given user"""
+    now = time.time()
+    cache.set_many({VERSION_KEY.format(user_id=user_id): now for user_id in set(user_ids)}, None)
+
+
+def invalidate_on_commit(user_ids):
+    """Invalidate once the surrounding transaction commits so readers never re-cache old rows"""
+    user_ids = set(user_ids)
+    if user_ids:
+        transaction.on_commit(lambda: invalidate_user_reports(user_ids))
+
+
+def cached_report_response(request, build):
+    """
+    Serve a report payload with ETag/Last-Modified validators and a
+    versioned server-side cache. `build` produces the payload on a miss.
+    Answers conditional requests for unchanged reports with 304 without
+    touching the database.
+    The validators come from the user's report version rather than from the
+    rows (say, max(generated_at) and a count): analytics, chart renders and
+    evictions change reports without touching generated_at, and reading the
+    rows would cost the query a 304 saves. Last-Modified is therefore when
+    any of the user's reports last changed; a lost version key only costs
+    clients one full response.
+    """
+    version = get_reports_version(request.user.id)
+    digest = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    etag = f'"{hashlib.md5(f"{version}:{digest}".encode()).hexdigest()}"'
+    last_modified = int(version)
+
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        response = Response(status=not_modified.status_code)
+    else:
+        key = PAYLOAD_KEY.format(user_id=request.user.id, version=version, digest=digest)
+        payload = cache.get(key)
+        if payload is None:
+            payload = build()
+            cache.set(key, payload, settings.REPORT_CACHE_TIMEOUT)
+        response = Response(payload)
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    # Clients must revalidate, which is cheap; shared caches must not store per-user data
+    response['Cache-Control'] = 'private, no-cache'
+    return response
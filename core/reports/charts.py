@@ -0,0 +1,183 @@
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from io import BytesIO
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_chart_workers = ContextVar('chart_workers', default=None)
+
+FIGURE_SIZE = (10, 6)
+FIGURE_DPI = 100
+GRID_COLOR = '#cccccc'
+
+
+class ChartTemplate:
+    """
+    A figure built once per process and redrawn for every chart.
+    Uses the object-oriented API only, so nothing touches pyplot's global state
+    and no backend needs selecting. matplotlib is imported here rather than at
+    module level so web processes that never render pay nothing for it.
+    """
+
+    def __init__(self, xlabel, ylabel, color, secondary_label=None):
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+
+        self.figure = Figure(figsize=FIGURE_SIZE, dpi=FIGURE_DPI)
+        self.canvas = FigureCanvasAgg(self.figure)
+        self.ax = self.figure.add_subplot()
+        self.line, = self.ax.plot([], [], marker='o', linewidth=2, markersize=4, color=color)
+        self._style(self.ax)
+        self.ax.set_xlabel(xlabel)
+        self.ax.set_ylabel(ylabel)
+        self.ax.xaxis_date()
+        self.ax.tick_params(axis='x', labelrotation=45)
+
+        self.ax2 = None
+        self.secondary_line = None
+        if secondary_label:
+            self.ax2 = self.ax.twinx()
+            self.secondary_line, = self.ax2.plot([], [], 'r--', alpha=0.5, linewidth=1)
+            self.ax2.set_ylabel(secondary_label, color='r')
+            self.ax2.tick_params(axis='y', labelcolor='r')
+
+        # Fixed margins instead of tight_layout, which re-measures text on every draw
+        self.figure.subplots_adjust(left=0.08, right=0.92 if secondary_label else 0.97, bottom=0.22, top=0.92)
+
+    @staticmethod
+    def _style(ax):
+        """Equivalent of seaborn's whitegrid style, applied to this axes only"""
+        ax.set_facecolor('white')
+        ax.set_axisbelow(True)
+        ax.grid(True, color=GRID_COLOR, linewidth=0.8)
+        for spine in ax.spines.values():
+            spine.set_color(GRID_COLOR)
+
+    def render(self, title, timestamps, values, secondary_values=None):
+        """Draw one series onto the template and return PNG bytes"""
+        from matplotlib.dates import date2num
+
+        x = date2num(timestamps)
+        self.line.set_data(x, values)
+        self.ax.set_title(title)
+        self.ax.relim()
+        self.ax.autoscale_view()
+        if self.secondary_line is not None:
+            self.secondary_line.set_data(x, secondary_values)
+            self.ax2.relim()
+            self.ax2.autoscale_view()
+
+        buffer = BytesIO()
+        self.canvas.print_png(buffer)
+        return buffer.getvalue()
+
+
+# Templates are mutated by every render, so each thread builds its own on
+# first use; request threads rendering lazily never draw onto each other's
+# figure. Pool workers are single threaded and keep one set per process
+_local = threading.local()
+
+
+def get_template(kind):
+    templates = getattr(_local, 'templates', None)
+    if templates is None:
+        templates = _local.templates = {}
+    if kind not in templates:
+        if kind == 'class':
+            templates[kind] = ChartTemplate(
+                'Time', 'Average Focus Score', color=None, secondary_label='Number of Students'
+            )
+        else:
+            templates[kind] = ChartTemplate('Time', 'Focus Score', color='green')
+    return templates[kind]
+
+
+def _parse_timestamps(series):
+    return [datetime.fromisoformat(entry['timestamp']) for entry in series]
+
+
+def render_class_chart(time_series_data, session_id):
+    """Render the class-wide focus chart with the student count on a secondary axis"""
+    if not time_series_data:
+        return None
+    return get_template('class').render(
+        f'Class Focus Over Time - Session {session_id}',
+        _parse_timestamps(time_series_data),
+        [entry['avg_focus'] for entry in time_series_data],
+        [entry['student_count'] for entry in time_series_data],
+    )
+
+
+def render_student_chart(time_series_data, session_id, student_name):
+    """Render a single student's focus chart"""
+    if not time_series_data:
+        return None
+    return get_template('student').render(
+        f'Focus Over Time - {student_name} - Session {session_id}',
+        _parse_timestamps(time_series_data),
+        [entry['avg_focus'] for entry in time_series_data],
+    )
+
+
+def _render_student_job(job):
+    session_id, student_id, student_name, time_series_data = job
+    try:
+        return student_id, render_student_chart(time_series_data, session_id, student_name)
+    except Exception as e:
+        logger.error(f"Error generating student focus chart: {str(e)}")
+        return student_id, None
+
+
+@contextmanager
+def limit_chart_workers(workers):
+    """Render charts on at most `workers` processes inside the block, whatever the settings say"""
+    token = _chart_workers.set(workers)
+    try:
+        yield
+    finally:
+        _chart_workers.reset(token)
+
+
+def get_chart_workers():
+    """
+    Pool size: a chart_workers() cap in effect, then the configured value,
+    otherwise one worker per CPU available to this process
+    """
+    workers = _chart_workers.get() or getattr(settings, 'REPORT_CHART_WORKERS', None)
+    if workers:
+        return workers
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def render_student_charts_parallel(chart_jobs, session_id, workers=None):
+    """
+    Render student charts across a process pool.
+    chart_jobs is a list of (student_id, student_name, time_series_data).
+    Returns {student_id: png_bytes}, or None when a pool can't be used and
+    the caller should render serially.
+    """
+    workers = min(workers or get_chart_workers(), len(chart_jobs))
+    if workers <= 1:
+        return None
+    # Daemonic processes are not allowed to have children
+    if multiprocessing.current_process().daemon:
+        return None
+
+    jobs = [(session_id, student_id, name, series) for student_id, name, series in chart_jobs]
+    chunksize = max(1, len(jobs) // (workers * 4))
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            return dict(executor.map(_render_student_job, jobs, chunksize=chunksize))
+    except (BrokenProcessPool, OSError) as e:
+        logger.warning(f"Chart pool unavailable, rendering serially: {str(e)}")
+        return None
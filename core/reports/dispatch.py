@@ -0,0 +1,91 @@
+import logging
+from django.db import transaction
+from django.db.models import F
+from session.models import Session
+from .models import ReportJob
+
+logger = logging.getLogger(__name__)
+
+
+def request_session_report(session_id, force=False, requested_by=None):
+    """
+    Enqueue report generation for an ended session exactly once.
+
+    The conditional UPDATE on `report_generated` is the per-session dedup key:
+    of any number of concurrent callers only the one that flips the flag
+    enqueues work. `force` skips the check for explicit regeneration. Every
+    accepted request bumps `report_version`, and the task is only sent once
+    the surrounding transaction commits, so a rolled back session end never
+    produces a report and older queued versions become no-ops. A ReportJob
+    row tracks each version through the queue.
+
+    Returns the new report version, or None if the request was a duplicate.
+    """
+    with transaction.atomic():
+        version = claim_report_version(session_id, force=force, requested_by=requested_by)
+        if version is None:
+            return None
+        transaction.on_commit(lambda: _enqueue(session_id, version))
+
+    logger.info(f"Queued report version {version} for session {session_id}")
+    return version
+
+
+def claim_report_version(session_id, force=False, requested_by=None):
+    """
+    Claim the next report version for a session and create its ReportJob,
+    without queueing it. For callers that run the version themselves through
+    reports.tasks.run_report_version. Returns the version, or None if the
+    request was a duplicate.
+    """
+    with transaction.atomic():
+        sessions = Session.objects.filter(pk=session_id)
+        if not force:
+            sessions = sessions.filter(end_time__isnull=False, report_generated=False)
+
+        claimed = sessions.update(report_generated=True, report_version=F('report_version') + 1)
+        if not claimed:
+            return None
+
+        version = Session.objects.values_list('report_version', flat=True).get(pk=session_id)
+        ReportJob.objects.create(session_id=session_id, report_version=version, requested_by=requested_by)
+    return version
+
+
+def request_report_regeneration(session_id, requested_by=None):
+    """
+    Queue a fresh report version for a session, coalescing with a job that
+    is still waiting in the queue. Returns (job, coalesced).
+    """
+    with transaction.atomic():
+        # Serializes concurrent regenerate calls for the same session
+        Session.objects.select_for_update().get(pk=session_id)
+        
+        queued = ReportJob.objects.filter(
+            session_id=session_id, status=ReportJob.QUEUED
+        ).order_by('-report_version').first()
+        if queued:
+            return queued, True
+        
+        version = request_session_report(session_id, force=True, requested_by=requested_by)
+        return ReportJob.objects.get(session_id=session_id, report_version=version), False
+
+
+def get_report_job(session_id, version):
+    """The job tracking a report version, if it was queued through dispatch"""
+    if version is None:
+        return None
+    return ReportJob.objects.filter(session_id=session_id, report_version=version).first()
+
+
+def _enqueue(session_id, version):
+    from .tasks import generate_session_report_task
+    generate_session_report_task.delay(session_id, version)
+
+
+def is_current_version(session_id, version):
+    """False once a newer report version has been requested for the session"""
+    if version is None:
+        return True
+    current = Session.objects.filter(pk=session_id).values_list('report_version', flat=True).first()
+    return current == version
@@ -0,0 +1,11 @@
+from django_filters import rest_framework as filters
+from .models import Report
+
+class ReportFilter(filters.FilterSet):
+    """Exact session/type filters plus an inclusive generated_at range"""
+    generated_after = filters.IsoDateTimeFilter(field_name='generated_at', lookup_expr='gte')
+    generated_before = filters.IsoDateTimeFilter(field_name='generated_at', lookup_expr='lte')
+    
+    class Meta:
+        model = Report
+        fields = ['session', 'report_type', 'generated_after', 'generated_before']
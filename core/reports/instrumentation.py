@@ -0,0 +1,144 @@
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.core.cache import cache
+from django.db import connection
+
+# Report pipeline stages, in the order they run; analytics runs as its own
+# task once the report is saved
+STAGES = (
+    'load', 'duration', 'attendance', 'focus', 'time_series',
+    'instructor_report', 'student_reports', 'chart_render', 'chart_save', 'analytics',
+)
+# Counters kept per stage across all processes, in the shared cache
+METRIC_FIELDS = ('calls', 'microseconds', 'queries', 'rows')
+METRIC_KEY = 'reports:metrics:{stage}:{field}'
+
+logger = logging.getLogger(__name__)
+
+_current_run = ContextVar('report_run', default=None)
+
+
+class QueryCounter:
+    """Database execute wrapper counting the queries run through it"""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class ReportRun:
+    """Wall time, query count and rows processed per stage for one report generation"""
+
+    def __init__(self):
+        self.stages = {}
+
+    def add(self, stage, seconds, queries, rows):
+        entry = self.stages.setdefault(stage, {'calls': 0, 'seconds': 0.0, 'queries': 0, 'rows': 0})
+        entry['calls'] += 1
+        entry['seconds'] += seconds
+        entry['queries'] += queries
+        entry['rows'] += rows
+
+    def timings(self):
+        """Seconds per stage, as kept on ReportJob.stage_timings"""
+        return {stage: round(entry['seconds'], 4) for stage, entry in self.stages.items()}
+
+    def as_dict(self):
+        return {
+            stage: {**entry, 'seconds': round(entry['seconds'], 4)}
+            for stage, entry in self.stages.items()
+        }
+
+
+@contextmanager
+def report_run():
+    """Collect the stages timed inside the block into a new ReportRun"""
+    run = ReportRun()
+    token = _current_run.set(run)
+    try:
+        yield run
+    finally:
+        _current_run.reset(token)
+
+
+def current_report_run():
+    return _current_run.get()
+
+
+@contextmanager
+def stage(name):
+    """
+    Time a pipeline stage and count the queries it runs. Yields a dict
+    whose 'rows' the block sets to the rows it processed. Recorded into
+    the enclosing report_run, if any, and the shared stage counters.
+    """
+    counter = QueryCounter()
+    counts = {'rows': 0}
+    started = time.perf_counter()
+    try:
+        with connection.execute_wrapper(counter):
+            yield counts
+    finally:
+        seconds = time.perf_counter() - started
+        run = _current_run.get()
+        if run is not None:
+            run.add(name, seconds, counter.count, counts['rows'])
+        record_stage_metrics(name, seconds, counter.count, counts['rows'])
+
+
+def record_stage_metrics(name, seconds, queries, rows):
+    """
+    Add one stage execution to the counters in the shared cache, which
+    every web and Celery process reads and writes. Best effort: an
+    unreachable cache loses the sample rather than failing the report.
+    """
+    deltas = {'calls': 1, 'microseconds': int(seconds * 1e6), 'queries': queries, 'rows': rows}
+    try:
+        for field, delta in deltas.items():
+            key = METRIC_KEY.format(stage=name, field=field)
+            cache.add(key, 0, None)
+            if delta:
+                try:
+                    cache.incr(key, delta)
+                except ValueError:
+                    # Evicted between add and incr; start over from this sample
+                    cache.set(key, delta, None)
+    except Exception as e:
+        logger.warning(f"Could not record metrics for report stage {name}: {str(e)}")
+
+
+def get_stage_metrics():
+    """{stage: {field: total}} for every stage, zeros included"""
+    keys = {
+        METRIC_KEY.format(stage=name, field=field): (name, field)
+        for name in STAGES for field in METRIC_FIELDS
+    }
+    values = cache.get_many(list(keys))
+    metrics = {name: dict.fromkeys(METRIC_FIELDS, 0) for name in STAGES}
+    for key, value in values.items():
+        name, field = keys[key]
+        metrics[name][field] = value
+    return metrics
+
+
+def render_prometheus(metrics):
+    """Stage counters in the Prometheus text exposition format"""
+    series = (
+        ('edufocus_report_stage_calls_total', 'Report pipeline stage executions', 'calls', 1),
+        ('edufocus_report_stage_seconds_total', 'Wall time spent in report pipeline stages', 'microseconds', 1e6),
+        ('edufocus_report_stage_queries_total', 'SQL queries run by report pipeline stages', 'queries', 1),
+        ('edufocus_report_stage_rows_total', 'Rows processed by report pipeline stages', 'rows', 1),
+    )
+    lines = []
+    for metric, help_text, field, divisor in series:
+        lines.append(f'# HELP {metric} {help_text}')
+        lines.append(f'# TYPE {metric} counter')
+        for name, fields in metrics.items():
+            value = fields[field] / divisor if divisor != 1 else fields[field]
+            lines.append(f'{metric}{{stage="{name}"}} {value}')
+    return '\n'.join(lines) + '\n'
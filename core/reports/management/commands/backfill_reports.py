@@ -0,0 +1,246 @@
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime, timedelta, time as dt_time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils import timezone
+from reports.backfill import DONE, SUPERSEDED, backfill_session, init_worker
+from reports.charts import get_chart_workers
+from reports.dispatch import request_session_report
+from reports.models import ReportJob
+from session.models import Session
+
+class Checkpoint:
+    """
+    Session ids already handled, kept in a JSON file so an interrupted
+    backfill can resume. Sessions handed to Celery, or superseded by a newer
+    report request, wait in `queued` with their report version until a later
+    run finds how that version's job, or a newer one, finished.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.done = set()
+        self.failed = set()
+        self.queued = {}
+        if path and os.path.exists(path):
+            with open(path) as handle:
+                data = json.load(handle)
+            self.done, self.failed = set(data['done']), set(data['failed'])
+            self.queued = {int(session_id): version for session_id, version in data.get('queued', {}).items()}
+
+    def record(self, session_id, ok):
+        self.queued.pop(session_id, None)
+        if ok:
+            self.done.add(session_id)
+            self.failed.discard(session_id)
+        else:
+            self.failed.add(session_id)
+
+    def queue(self, session_id, version):
+        self.queued[session_id] = version
+        self.failed.discard(session_id)
+
+    def resolve(self):
+        """Record the queued sessions whose latest report job has finished"""
+        latest = {}
+        jobs = ReportJob.objects.filter(session_id__in=list(self.queued)).order_by('report_version')
+        for session_id, version, status in jobs.values_list('session_id', 'report_version', 'status'):
+            if version >= self.queued[session_id]:
+                latest[session_id] = status
+        for session_id, status in latest.items():
+            if status in (ReportJob.DONE, ReportJob.FAILED):
+                self.record(session_id, status == ReportJob.DONE)
+
+    def save(self):
+        if not self.path:
+            return
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as handle:
+            json.dump({
+                'done': sorted(self.done),
+                'failed': sorted(self.failed),
+                'queued': {str(session_id): version for session_id, version in sorted(self.queued.items())},
+            }, handle)
+        os.replace(tmp_path, self.path)
+
+
+class Throttle:
+    """Spaces calls so no more than `rate` happen per second"""
+
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate else 0
+        self.next_at = time.monotonic()
+
+    def wait(self):
+        if not self.interval:
+            return
+        now = time.monotonic()
+        if self.next_at > now:
+            time.sleep(self.next_at - now)
+        self.next_at = max(now, self.next_at) + self.interval
+
+
+class Command(BaseCommand):
+    help = (
+        'Regenerate reports for many historical sessions, selected by classroom and start date, '
+        'on a process pool or as Celery batches, with throttling and a resumable checkpoint'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--classroom', type=int, action='append', dest='classrooms',
+                            help='Classroom id; repeat for several. Defaults to all classrooms')
+        parser.add_argument('--since', type=self.parse_date, help='First session start date, YYYY-MM-DD')
+        parser.add_argument('--until', type=self.parse_date, help='Last session start date, YYYY-MM-DD')
+        parser.add_argument('--include-archived', action='store_true',
+                            help='Also regenerate archived sessions, restoring their data to the hot tables')
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Pool size; defaults to one per CPU. 1 runs in this process')
+        parser.add_argument('--celery', action='store_true',
+                            help='Queue report jobs for the Celery workers instead of running them here')
+        parser.add_argument('--batch-size', type=int, default=100,
+                            help='Sessions per checkpoint write, and per Celery batch')
+        parser.add_argument('--rate', type=float, default=None, help='At most this many sessions per second')
+        parser.add_argument('--checkpoint', help='JSON file recording finished sessions; reruns skip them')
+        parser.add_argument('--retry-failed', action='store_true', help='Rerun sessions the checkpoint marks failed')
+        parser.add_argument('--limit', type=int, default=None, help='Stop after this many sessions')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the selected sessions')
+
+    @staticmethod
+    def parse_date(value):
+        try:
+            return datetime.strptime(value, '%Y-%m-%d').date()
+        except ValueError:
+            raise CommandError(f"Invalid date '{value}', expected YYYY-MM-DD")
+
+    def handle(self, *args, **options):
+        checkpoint = Checkpoint(options['checkpoint'])
+        checkpoint.resolve()
+        session_ids = self.select_sessions(options, checkpoint)
+        queued = f", {len(checkpoint.queued)} still queued" if checkpoint.queued else ''
+        self.stdout.write(
+            f"{len(session_ids)} sessions to regenerate"
+            f" ({len(checkpoint.done)} already done{queued} per checkpoint)"
+        )
+        if options['dry_run'] or not session_ids:
+            return
+
+        started = time.perf_counter()
+        if options['celery']:
+            summary = self.enqueue(session_ids, checkpoint, options)
+        else:
+            summary = self.run_pool(session_ids, checkpoint, options)
+        checkpoint.save()
+        self.report(summary, time.perf_counter() - started, 'queued' if options['celery'] else 'regenerated')
+
+    def select_sessions(self, options, checkpoint):
+        sessions = Session.objects.filter(end_time__isnull=False)
+        if options['classrooms']:
+            sessions = sessions.filter(classroom_id__in=options['classrooms'])
+        if options['since']:
+            sessions = sessions.filter(start_time__gte=self.day_start(options['since']))
+        if options['until']:
+            sessions = sessions.filter(start_time__lt=self.day_start(options['until'], next_day=True))
+        if not options['include_archived']:
+            sessions = sessions.filter(archived_at__isnull=True)
+
+        skip = checkpoint.done | set(checkpoint.queued)
+        if not options['retry_failed']:
+            skip |= checkpoint.failed
+        session_ids = [
+            session_id for session_id in sessions.order_by('id').values_list('id', flat=True)
+            if session_id not in skip
+        ]
+        return session_ids[:options['limit']] if options['limit'] else session_ids
+
+    @staticmethod
+    def day_start(day, next_day=False):
+        start = timezone.make_aware(datetime.combine(day, dt_time.min))
+        return start + timedelta(days=1) if next_day else start
+
+    def run_pool(self, session_ids, checkpoint, options):
+        workers = min(options['workers'] or get_chart_workers(), len(session_ids))
+        throttle = Throttle(options['rate'])
+        summary = {'ok': 0, 'failed': 0, 'superseded': 0, 'stage_seconds': Counter()}
+
+        def finish(session_id, outcome, version, seconds, timings):
+            if outcome == SUPERSEDED:
+                # A newer request from the app owns the report now; its job decides
+                checkpoint.queue(session_id, version)
+                summary['superseded'] += 1
+            else:
+                checkpoint.record(session_id, outcome == DONE)
+                summary['ok' if outcome == DONE else 'failed'] += 1
+            summary['stage_seconds'].update(timings)
+            handled = summary['ok'] + summary['failed'] + summary['superseded']
+            if handled % options['batch_size'] == 0 or handled == len(session_ids):
+                checkpoint.save()
+                self.stdout.write(f"{handled}/{len(session_ids)} sessions, {summary['failed']} failed")
+
+        if workers <= 1:
+            for session_id in session_ids:
+                throttle.wait()
+                finish(*backfill_session(session_id))
+            return summary
+
+        # Forked children must not inherit this process's open connections
+        connections.close_all()
+        # Without fork, workers are spawned and set Django up in init_worker
+        context = multiprocessing.get_context('fork' if hasattr(os, 'fork') else 'spawn')
+        pending = set()
+        queue = iter(session_ids)
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=init_worker) as executor:
+            # A bounded number in flight keeps the throttle meaningful and memory flat
+            while True:
+                while len(pending) < workers * 2:
+                    session_id = next(queue, None)
+                    if session_id is None:
+                        break
+                    throttle.wait()
+                    # The backfill pool already uses every CPU, so charts render in-process
+                    pending.add(executor.submit(backfill_session, session_id, 1))
+                if not pending:
+                    break
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    finish(*future.result())
+        return summary
+
+    def enqueue(self, session_ids, checkpoint, options):
+        """
+        Queue a report version per session through dispatch, one batch at a
+        time. Queued sessions are checkpointed as such; a later run records
+        them done or failed from their report jobs.
+        """
+        throttle = Throttle(options['rate'])
+        summary = {'ok': 0, 'failed': 0, 'superseded': 0, 'stage_seconds': Counter()}
+        for offset in range(0, len(session_ids), options['batch_size']):
+            batch = session_ids[offset:offset + options['batch_size']]
+            for session_id in batch:
+                throttle.wait()
+                version = request_session_report(session_id, force=True)
+                if version is None:
+                    checkpoint.record(session_id, False)
+                    summary['failed'] += 1
+                else:
+                    checkpoint.queue(session_id, version)
+                    summary['ok'] += 1
+            checkpoint.save()
+            self.stdout.write(f"Queued {offset + len(batch)}/{len(session_ids)} sessions")
+        return summary
+
+    def report(self, summary, elapsed, outcome):
+        handled = summary['ok'] + summary['failed'] + summary['superseded']
+        superseded = f", {summary['superseded']} superseded by newer requests" if summary['superseded'] else ''
+        self.stdout.write(
+            f"{handled} sessions in {elapsed:.1f}s ({handled / elapsed if elapsed else 0:.2f}/s): "
+            f"{summary['ok']} {outcome}, {summary['failed']} failed{superseded}"
+        )
+        for stage, seconds in summary['stage_seconds'].most_common():
+            self.stdout.write(f"  {stage:<18} {seconds:>9.2f}s")
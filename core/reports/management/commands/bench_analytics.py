@@ -0,0 +1,103 @@
+import time
+from itertools import islice
+from datetime import timedelta
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from classrooms.models import Classroom
+from performance.models import FocusSample
+from reports.analytics import compute_focus_analytics, load_session_samples
+from session.models import Session
+from users.models import User
+
+# Samples built and inserted at a time when storing a synthetic session
+STORE_CHUNK = 100000
+
+class Command(BaseCommand):
+    help = 'Measure focus analytics over a synthetic session (default: 500 students, 2 hours at 1 Hz)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=500)
+        parser.add_argument('--minutes', type=int, default=120)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--stored', action='store_true',
+                            help='Write the samples to the database and time loading them too')
+        parser.add_argument('--session', type=int, default=None,
+                            help='Time loading and analysing an existing session instead')
+
+    def handle(self, *args, **options):
+        if options['session']:
+            return self.measure(Session.objects.get(id=options['session']), options['repeat'])
+
+        students, seconds = options['students'], options['minutes'] * 60
+        rng = np.random.default_rng(0)
+
+        # Rows arrive ordered by timestamp, like the bulk fetch returns them,
+        # with students in no particular order within each second
+        student_ids = rng.permuted(
+            np.tile(np.arange(1, students + 1, dtype=np.int64), (seconds, 1)), axis=1
+        ).ravel()
+        timestamps = np.repeat(np.arange(seconds, dtype=np.float64), students) + time.time()
+        scores = np.clip(rng.normal(0.6, 0.2, len(student_ids)), 0, 1)
+        resolutions = np.ones(len(student_ids))
+
+        if options['stored']:
+            return self.measure_stored(student_ids, timestamps, scores, options['repeat'])
+
+        runs = []
+        for _ in range(options['repeat']):
+            started = time.perf_counter()
+            analytics = compute_focus_analytics(student_ids, timestamps, scores, resolutions)
+            runs.append(time.perf_counter() - started)
+
+        self.stdout.write(f"samples={len(student_ids)} students={len(analytics['students'])}")
+        self.stdout.write(f"best={min(runs):.3f}s median={float(np.median(runs)):.3f}s")
+
+    def measure(self, session, repeat):
+        """Time the path the analytics task runs: the bulk load, then the computation"""
+        loads, computes = [], []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            samples = load_session_samples(session)
+            loaded = time.perf_counter()
+            if samples is None:
+                self.stdout.write(f"session={session.id} has no samples")
+                return
+            analytics = compute_focus_analytics(*samples)
+            loads.append(loaded - started)
+            computes.append(time.perf_counter() - loaded)
+
+        self.stdout.write(f"session={session.id} samples={len(samples[0])} students={len(analytics['students'])}")
+        for label, runs in (('load', loads), ('compute', computes)):
+            self.stdout.write(f"{label:>8} best={min(runs):.3f}s median={float(np.median(runs)):.3f}s")
+
+    def measure_stored(self, student_ids, timestamps, scores, repeat):
+        instructor = User.objects.create(
+            email='bench_analytics_instructor@example.com', full_name='Bench Instructor', role='instructor', password='!')
+        students = User.objects.bulk_create([
+            User(email=f'bench_analytics_student{i}@example.com', full_name=f'Bench Student {i}',
+                 role='student', password='!')
+            for i in range(int(student_ids.max()))
+        ])
+        try:
+            classroom = Classroom.objects.create(
+                name='Bench Analytics', instructor=instructor, join_code='bench_analytics')
+            start = timezone.now() - timedelta(seconds=float(timestamps.max() - timestamps.min()) + 1)
+            # bulk_create skips the signal that would queue a report for the ended session
+            session = Session.objects.bulk_create([Session(
+                classroom=classroom, start_time=start, end_time=timezone.now(), is_active=False)])[0]
+            user_ids = np.array([student.id for student in students])
+            offsets = timestamps - timestamps.min()
+            started = time.perf_counter()
+            rows = zip(user_ids[student_ids - 1].tolist(), offsets.tolist(), scores.tolist())
+            for _ in range(0, len(student_ids), STORE_CHUNK):
+                FocusSample.objects.bulk_create([
+                    FocusSample(session=session, student_id=user_id, timestamp=start + timedelta(seconds=offset),
+                                focus_score=score)
+                    for user_id, offset, score in islice(rows, STORE_CHUNK)
+                ], batch_size=5000)
+            self.stdout.write(f"stored {len(student_ids)} samples in {time.perf_counter() - started:.1f}s")
+            self.measure(session, repeat)
+        finally:
+            Classroom.objects.filter(instructor=instructor).delete()
+            User.objects.filter(id__in=[instructor.id] + [student.id for student in students]).delete()
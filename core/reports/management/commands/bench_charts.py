@@ -0,0 +1,40 @@
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from reports.charts import get_chart_workers, render_student_charts_parallel
+from reports.utils import generate_student_focus_chart
+
+class Command(BaseCommand):
+    help = 'Measure student chart rendering for 50/200/500 students, serial and on the process pool'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, nargs='+', default=[50, 200, 500])
+        parser.add_argument('--minutes', type=int, default=60)
+        parser.add_argument('--workers', type=int, default=None)
+
+    def handle(self, *args, **options):
+        workers = options['workers'] or get_chart_workers()
+        start = timezone.now()
+        series = [
+            {'timestamp': (start + timedelta(minutes=m)).isoformat(), 'avg_focus': round((m % 10) / 10, 2)}
+            for m in range(options['minutes'])
+        ]
+
+        self.stdout.write(f"workers={workers}")
+        self.stdout.write(f"{'students':>9} {'serial_s':>9} {'pool_s':>9} {'charts/s':>9}")
+        for count in options['students']:
+            jobs = [(student_id, f'Student {student_id}', series) for student_id in range(count)]
+
+            started = time.perf_counter()
+            for student_id, name, data in jobs:
+                generate_student_focus_chart(data, 1, student_id, name)
+            serial = time.perf_counter() - started
+
+            started = time.perf_counter()
+            charts = render_student_charts_parallel(jobs, 1, workers=workers)
+            pooled = time.perf_counter() - started if charts is not None else None
+
+            best = min(serial, pooled) if pooled is not None else serial
+            pool_label = f'{pooled:>9.2f}' if pooled is not None else f"{'n/a':>9}"
+            self.stdout.write(f"{count:>9} {serial:>9.2f} {pool_label} {count / best:>9.1f}")
@@ -0,0 +1,86 @@
+import time
+from datetime import timedelta
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from classrooms.models import Classroom
+from reports.models import Report
+from reports.pagination import ReportKeysetPagination
+from reports.serializers import ReportSummarySerializer
+from reports.views import summary_queryset
+from session.models import Session
+from users.models import User
+
+class Command(BaseCommand):
+    help = 'Measure the report list endpoint and summary serialization for a user with thousands of reports'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reports', type=int, default=5000)
+        parser.add_argument('--points', type=int, default=60, help='Focus series points stored per report')
+        parser.add_argument('--requests', type=int, default=50)
+
+    def handle(self, *args, **options):
+        count = options['reports']
+        instructor = User.objects.create(
+            email='bench_list_instructor@example.com', full_name='Bench Instructor', role='instructor', password='!')
+        student = User.objects.create(
+            email='bench_list_student@example.com', full_name='Bench Student', role='student', password='!')
+        try:
+            self.populate(instructor, student, count, options['points'])
+
+            self.stdout.write(f"{'run':>22} {'seconds':>9} {'queries':>8}")
+            full_rows = Report.objects.filter(user=student)
+            for label, queryset in (('serialize full rows', full_rows), ('serialize slim rows', summary_queryset(full_rows))):
+                with CaptureQueriesContext(connection) as ctx:
+                    started = time.perf_counter()
+                    ReportSummarySerializer(queryset, many=True).data
+                    elapsed = time.perf_counter() - started
+                self.stdout.write(f"{label:>22} {elapsed:>9.3f} {len(ctx):>8}")
+
+            client = APIClient()
+            client.force_authenticate(user=student)
+            last_page = (count + 9) // 10
+            deep_row = summary_queryset(full_rows)[max(count - 11, 0)]
+            deep_cursor = ReportKeysetPagination.encode_cursor('n', deep_row)
+            for label, url in (('GET list page 1', '/api/reports/'),
+                               (f'GET list page {last_page}', f'/api/reports/?page={last_page}'),
+                               ('GET cursor first', '/api/reports/?pagination=cursor'),
+                               ('GET cursor last', f'/api/reports/?pagination=cursor&cursor={deep_cursor}'),
+                               ('GET recent page 1', '/api/reports/recent/')):
+                started = time.perf_counter()
+                with CaptureQueriesContext(connection) as ctx:
+                    for _ in range(options['requests']):
+                        # Measure the database path, not the response cache
+                        cache.clear()
+                        response = client.get(url, HTTP_HOST='localhost')
+                        assert response.status_code == 200, response.status_code
+                elapsed = (time.perf_counter() - started) / options['requests']
+                self.stdout.write(f"{label:>22} {elapsed:>9.4f} {len(ctx) // options['requests']:>8}")
+        finally:
+            Classroom.objects.filter(instructor=instructor).delete()
+            User.objects.filter(id__in=[instructor.id, student.id]).delete()
+
+    def populate(self, instructor, student, count, points):
+        classrooms = Classroom.objects.bulk_create([
+            Classroom(name=f'Bench Class {i}', instructor=instructor, join_code=f'bl{i:06d}')
+            for i in range(max(1, count // 100))
+        ])
+        now = timezone.now()
+        sessions = Session.objects.bulk_create([
+            Session(classroom=classrooms[i % len(classrooms)], start_time=now - timedelta(hours=i),
+                    end_time=now - timedelta(hours=i) + timedelta(minutes=50), is_active=False)
+            for i in range(count)
+        ])
+        series = [
+            {'timestamp': (now + timedelta(minutes=m)).isoformat(), 'avg_focus': 0.5}
+            for m in range(points)
+        ]
+        Report.objects.bulk_create([
+            Report(session=session, user=student, report_type='student', attendance_status=100,
+                   avg_focus_score=0.5, focus_data_json=series, duration_seconds=3000,
+                   metadata={'duration': {'duration_seconds': 3000}, 'attended': True, 'class_avg_focus': 0.5})
+            for session in sessions
+        ], batch_size=500)
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 06:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='report',
+            name='chart_accessed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
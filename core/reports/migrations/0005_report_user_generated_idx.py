@@ -0,0 +1,20 @@
+# Generated by Django 5.2.5 on 2026-10-18 07:24
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0004_reportjob'),
+        ('session', '0003_session_archived_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='report',
+            index=models.Index(fields=['user', '-generated_at', '-id'], name='report_user_generated_idx'),
+        ),
+    ]
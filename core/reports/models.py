@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from django.core.validators import MinValueValidator, MaxValueValidator
 from users.models import User
 from session.models import Session
@@ -20,12 +21,20 @@ class Report(models.Model):
     )
     focus_data_json = models.JSONField()  # Stores time-series data
     duration_seconds = models.IntegerField()  # Session duration in seconds
-    chart_image = models.ImageField(upload_to='report_charts/', null=True, blank=True)
+    chart_image = models.ImageField(upload_to='report_charts/', null=True, blank=True)  # Rendered lazily from focus_data_json
+    chart_accessed_at = models.DateTimeField(null=True, blank=True)  # Last chart request, drives eviction
+    chart_artifact = models.ForeignKey(
+        'ChartArtifact', on_delete=models.SET_NULL, null=True, blank=True, related_name='reports'
+    )  # Shared file behind chart_image; these references are the artifact's reference count
     metadata = models.JSONField(default=dict)  # Additional report data
     generated_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         unique_together = ['session', 'user', 'report_type']
+        indexes = [
+            # A user's reports newest first, for list/recent paging and date ranges
+            models.Index(fields=['user', '-generated_at', '-id'], name='report_user_generated_idx'),
+        ]
 
     def __str__(self):
         return f"Report for {self.user} - {self.session}"
@@ -50,3 +59,57 @@ class Report(models.Model):
     def get_focus_score_display(self):
         """Return formatted focus score"""
         return f"{round(self.avg_focus_score * 100, 1)}%"
+
+
+class ReportJob(models.Model):
+    """
+    One queued unit of report generation for a session, created by
+    reports.dispatch for every accepted report version.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    SUPERSEDED = 'superseded'  # A newer version was requested before this one ran
+    STATUS_CHOICES = (
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+        (SUPERSEDED, 'Superseded'),
+    )
+
+    session = models.ForeignKey(Session, on_delete=models.CASCADE, related_name='report_jobs')
+    report_version = models.PositiveIntegerField()
+    requested_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='report_jobs')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    stage_timings = models.JSONField(default=dict)  # Stage name -> seconds
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        unique_together = ['session', 'report_version']
+
+    def __str__(self):
+        return f"Report job v{self.report_version} for {self.session} ({self.status})"
+
+
+class ChartArtifact(models.Model):
+    """
+    A rendered chart PNG, stored once under the hash of its bytes and
+    looked up by the hash of its render inputs, so identical charts share
+    one file and are never rendered twice. Reports reference it through
+    Report.chart_artifact; reports.artifacts collects the ones left
+    unreferenced.
+    """
+    input_hash = models.CharField(max_length=64, unique=True)  # sha256 of the render inputs
+    content_hash = models.CharField(max_length=64, db_index=True)  # sha256 of the PNG, also its file name
+    image = models.ImageField(upload_to='report_charts/')
+    size = models.PositiveIntegerField(default=0)  # Bytes
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(default=timezone.now)  # Last render or reuse, protects fresh artifacts from collection
+
+    def __str__(self):
+        return f"Chart {self.content_hash[:12]}"
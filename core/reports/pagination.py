@@ -0,0 +1,94 @@
+import base64
+from datetime import datetime
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+class ReportKeysetPagination(BasePagination):
+    """
+    Keyset pagination on (generated_at, id), newest first.
+
+    Each page seeks past the last row of the previous one through the
+    (user, generated_at, id) index, so every page costs the same no matter
+    how deep it is, and no COUNT(*) is issued. The opaque cursor holds the
+    boundary row's key and the direction to read in.
+    """
+    cursor_query_param = 'cursor'
+    page_size = api_settings.PAGE_SIZE
+    invalid_cursor_message = 'Invalid cursor'
+    
+    def paginate_queryset(self, queryset, request, view=None):
+        self.base_url = request.build_absolute_uri()
+        cursor = self.decode_cursor(request)
+        
+        if cursor is None:
+            backwards = False
+            queryset = queryset.order_by('-generated_at', '-id')
+        else:
+            direction, generated_at, pk = cursor
+            backwards = direction == 'p'
+            # The redundant bound on generated_at alone gives the planner an index range
+            if backwards:
+                queryset = queryset.filter(
+                    Q(generated_at__gt=generated_at) | Q(generated_at=generated_at, id__gt=pk),
+                    generated_at__gte=generated_at
+                ).order_by('generated_at', 'id')
+            else:
+                queryset = queryset.filter(
+                    Q(generated_at__lt=generated_at) | Q(generated_at=generated_at, id__lt=pk),
+                    generated_at__lte=generated_at
+                ).order_by('-generated_at', '-id')
+        
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if backwards:
+            rows.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, cursor is not None
+        
+        self.next_cursor = ('n', rows[-1]) if rows and has_next else None
+        self.previous_cursor = ('p', rows[0]) if rows and has_previous else None
+        return rows
+    
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_link(self.next_cursor),
+            'previous': self.get_link(self.previous_cursor),
+            'results': data,
+        })
+    
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+    
+    def get_link(self, cursor):
+        if cursor is None:
+            return None
+        return replace_query_param(self.base_url, self.cursor_query_param, self.encode_cursor(*cursor))
+    
+    @staticmethod
+    def encode_cursor(direction, row):
+        return base64.urlsafe_b64encode(f'{direction}|{row.generated_at.isoformat()}|{row.pk}'.encode()).decode()
+    
+    def decode_cursor(self, request):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None
+        try:
+            direction, generated_at, pk = base64.urlsafe_b64decode(token.encode()).decode().split('|')
+            if direction not in ('n', 'p'):
+                raise ValueError(direction)
+            return direction, datetime.fromisoformat(generated_at), int(pk)
+        except (TypeError, ValueError, UnicodeDecodeError):
+            raise NotFound(self.invalid_cursor_message)
@@ -1,8 +1,30 @@
 from rest_framework import serializers
-from .models import Report
+from rest_framework.reverse import reverse
+from .models import Report, ReportJob
+from .series import SERIES_SHAPES, format_series
 from users.models import User
 from session.models import Session
 
+def get_series_options(request):
+    """
+    (shape, points) for focus_data_json from ?series=legacy|compact and
+    ?points=<n>, which downsamples the series to about n points
+    """
+    if request is None:
+        return 'legacy', None
+    shape = request.query_params.get('series', 'legacy')
+    if shape not in SERIES_SHAPES:
+        raise serializers.ValidationError({'series': f"Must be one of: {', '.join(SERIES_SHAPES)}"})
+    points = request.query_params.get('points')
+    if points is not None:
+        try:
+            points = int(points)
+        except ValueError:
+            points = 0
+        if points < 3:
+            raise serializers.ValidationError({'points': 'Must be an integer of at least 3'})
+    return shape, points
+
 class ReportSerializer(serializers.ModelSerializer):
     session_name = serializers.CharField(source='session.classroom.name', read_only=True)
     user_name = serializers.CharField(source='user.full_name', read_only=True)
@@ -25,6 +47,20 @@ class ReportSerializer(serializers.ModelSerializer):
             'duration_seconds', 'chart_image', 'metadata', 'generated_at'
         ]
     
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        # Blobs of archived sessions are read back from the archive file
+        if instance.session.archived_at and not instance.focus_data_json:
+            from .archive import read_archived_report_blobs
+            blobs = read_archived_report_blobs(instance)
+            if blobs:
+                data['focus_data_json'], data['metadata'] = blobs
+                data['chart_image_url'] = self.get_chart_image_url(instance, blobs[0])
+        # Stored compact; served in the shape the client asked for
+        shape, points = get_series_options(self.context.get('request'))
+        data['focus_data_json'] = format_series(data['focus_data_json'], shape, points)
+        return data
+    
     def get_duration_formatted(self, obj):
         return obj.get_duration_formatted()
     
@@ -34,9 +70,10 @@ class ReportSerializer(serializers.ModelSerializer):
     def get_focus_score_display(self, obj):
         return obj.get_focus_score_display()
     
-    def get_chart_image_url(self, obj):
-        if obj.chart_image:
-            return obj.chart_image.url
+    def get_chart_image_url(self, obj, focus_data=None):
+        # The chart endpoint renders on first access and records the access for eviction
+        if focus_data or obj.focus_data_json:
+            return reverse('report-chart', kwargs={'pk': obj.pk}, request=self.context.get('request'))
         return None
 
 class ReportSummarySerializer(serializers.ModelSerializer):
@@ -60,4 +97,12 @@ class ReportSummarySerializer(serializers.ModelSerializer):
         return obj.get_attendance_status_display()
     
     def get_focus_score_display(self, obj):
-        return obj.get_focus_score_display()
\ No newline at end of file
+        return obj.get_focus_score_display()
+
+class ReportJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ReportJob
+        fields = [
+            'id', 'session', 'report_version', 'status', 'stage_timings',
+            'error', 'created_at', 'started_at', 'finished_at'
+        ]
@@ -0,0 +1,124 @@
+from datetime import datetime, timedelta
+
+# Per-minute series are stored columnar: one start time, a fixed step and
+# an array per field. Focus scores are kept as integer hundredths, the
+# precision the report series are rounded to.
+SERIES_ENCODING = 'columnar-v1'
+SERIES_STEP_SECONDS = 60
+SERIES_SCALE = 100
+QUANTIZED_FIELDS = ('avg_focus',)
+
+SERIES_SHAPES = ('legacy', 'compact')
+
+
+def is_compact(data):
+    return isinstance(data, dict) and data.get('encoding') == SERIES_ENCODING
+
+
+def encode_series(points, step=SERIES_STEP_SECONDS):
+    """
+    Encode a list of {'timestamp', <field>...} points as
+    {'encoding', 'start', 'step', 'scale', 'columns'}. Points that don't
+    sit on consecutive steps add an 'offsets' array of step counts from
+    the start. Already-encoded or empty data is returned as is.
+    """
+    if not points or is_compact(points):
+        return points
+
+    timestamps = [datetime.fromisoformat(point['timestamp']) for point in points]
+    start = timestamps[0]
+    offsets = [round((timestamp - start).total_seconds() / step) for timestamp in timestamps]
+
+    fields = [key for key in points[0] if key != 'timestamp']
+    columns = {}
+    for field in fields:
+        values = [point.get(field) for point in points]
+        if field in QUANTIZED_FIELDS:
+            values = [None if value is None else round(value * SERIES_SCALE) for value in values]
+        columns[field] = values
+
+    encoded = {
+        'encoding': SERIES_ENCODING,
+        'start': start.isoformat(),
+        'step': step,
+        'scale': SERIES_SCALE,
+        'columns': columns,
+    }
+    if offsets != list(range(len(points))):
+        encoded['offsets'] = offsets
+    return encoded
+
+
+def decode_series(data):
+    """The legacy list of point dicts for either encoding"""
+    if not is_compact(data):
+        return data
+
+    columns = data['columns']
+    length = len(next(iter(columns.values()), []))
+    offsets = data.get('offsets') or range(length)
+    start, step, scale = datetime.fromisoformat(data['start']), data['step'], data['scale']
+
+    points = []
+    for index, offset in enumerate(offsets):
+        point = {'timestamp': (start + timedelta(seconds=offset * step)).isoformat()}
+        for field, values in columns.items():
+            value = values[index]
+            if field in QUANTIZED_FIELDS and value is not None:
+                value = round(value / scale, 2)
+            point[field] = value
+        points.append(point)
+    return points
+
+
+def lttb_indices(x, y, threshold):
+    """
+    Indices of the points kept by Largest-Triangle-Three-Buckets
+    downsampling: the first and last point, plus, from each of
+    threshold - 2 buckets, the point forming the largest triangle with
+    the previously kept point and the average of the next bucket.
+    """
+    import numpy as np
+
+    length = len(x)
+    if threshold >= length or threshold < 3:
+        return np.arange(length)
+
+    x, y = np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64)
+    edges = np.linspace(1, length - 1, threshold - 1).astype(np.int64)
+    kept = np.empty(threshold, dtype=np.int64)
+    kept[0], kept[-1] = 0, length - 1
+
+    previous = 0
+    for bucket in range(threshold - 2):
+        low, high = edges[bucket], edges[bucket + 1]
+        next_high = edges[bucket + 2] if bucket + 2 < len(edges) else length
+        next_x = x[high:next_high].mean()
+        next_y = y[high:next_high].mean()
+
+        areas = np.abs(
+            (x[previous] - next_x) * (y[low:high] - y[previous])
+            - (x[previous] - x[low:high]) * (next_y - y[previous])
+        )
+        previous = low + int(np.argmax(areas))
+        kept[bucket + 1] = previous
+    return kept
+
+
+def downsample_series(points, threshold):
+    """Reduce a list of point dicts to about `threshold` points, keeping the shape of avg_focus"""
+    if not points or threshold >= len(points):
+        return points
+    x = [datetime.fromisoformat(point['timestamp']).timestamp() for point in points]
+    y = [point.get('avg_focus') or 0 for point in points]
+    return [points[index] for index in lttb_indices(x, y, threshold)]
+
+
+def format_series(data, shape='legacy', points=None):
+    """Render stored focus data in the requested shape, optionally downsampled"""
+    series = decode_series(data)
+    if points:
+        series = downsample_series(series, points)
+    if shape == 'compact':
+        return encode_series(series)
+    return series
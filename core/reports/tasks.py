@@ -1,6 +1,8 @@
 from celery import shared_task
 from celery.utils.log import get_task_logger
 from .utils import generate_session_report
+from .dispatch import is_current_version, get_report_job
+from .cache import invalidate_user_reports
 from session.models import Session
 from real_time.utils import send_to_session_group
 import json
@@ -9,66 +11,247 @@ import asyncio
 logger = get_task_logger(__name__)
 
 @shared_task(bind=True, max_retries=3)
-def generate_session_report_task(self, session_id):
+def generate_session_report_task(self, session_id, version=None):
     """
-    Celery task to generate session reports asynchronously
+    Celery task to generate session reports asynchronously.
+    Queued through reports.dispatch; a version superseded by a newer
+    request is skipped. Progress is recorded on the version's ReportJob.
+    Pipeline errors are retried, and the last one is kept on the job.
     """
+    from django.utils import timezone
+    from .models import ReportJob
+    
+    job = get_report_job(session_id, version)
+    timings = {}
     try:
-        logger.info(f"Starting report generation for session {session_id}")
-        
-        # Generate the report
-        result = generate_session_report(session_id)
-        
-        if result:
-            # Notify users that reports are available
-            session = Session.objects.get(id=session_id)
-            
-            # Notify instructor
-            asyncio.run(send_to_session_group(
-                session_id,
-                {
-                    'type': 'report_available',
-                    'message': 'Session report is now available',
-                    'report_type': 'instructor',
-                    'session_id': session_id
-                }
-            ))
-            
-            # Notify students who attended
-            for report in result['student_reports']:
-                if report.metadata.get('attended', False):
-                    # For WebSocket notifications to specific users, we'd need
-                    # a different approach, but this is a simplified version
-                    pass
-            
-            logger.info(f"Successfully generated report for session {session_id}")
-            return True
-        else:
-            logger.error(f"Failed to generate report for session {session_id}")
-            return False
-            
+        result = run_report_version(session_id, version, job, timings)
     except Session.DoesNotExist:
         logger.error(f"Session {session_id} does not exist")
+        update_job(job, status=ReportJob.FAILED, error='Session does not exist', finished_at=timezone.now())
         return False
     except Exception as e:
         logger.error(f"Error in report generation task for session {session_id}: {str(e)}")
+        error = f'{type(e).__name__}: {e}'
+        if self.request.retries >= self.max_retries:
+            update_job(job, status=ReportJob.FAILED, stage_timings=timings, error=error,
+                       finished_at=timezone.now())
+            raise
+        update_job(job, status=ReportJob.QUEUED, stage_timings=timings, error=error)
         # Retry the task after 5 minutes
         self.retry(countdown=300, exc=e)
+    
+    if not result:
+        return False
+    
+    # The job is DONE by now, so a failing notification or analytics dispatch
+    # is only logged; retrying would regenerate reports that are already saved
+    try:
+        # Notify instructor
+        asyncio.run(send_to_session_group(
+            session_id,
+            {
+                'type': 'report_available',
+                'message': 'Session report is now available',
+                'report_type': 'instructor',
+                'session_id': session_id
+            },
+            role='instructor'
+        ))
+    except Exception as e:
+        logger.error(f"Could not notify session {session_id} of its report: {str(e)}")
+    
+    # Notify students who attended
+    for report in result['student_reports']:
+        if report.metadata.get('attended', False):
+            # For WebSocket notifications to specific users, we'd need
+            # a different approach, but this is a simplified version
+            pass
+    
+    try:
+        # The sample-level statistics are added to the saved reports separately
+        compute_session_analytics_task.delay(session_id)
+    except Exception as e:
+        logger.error(f"Could not queue analytics for session {session_id}: {str(e)}")
+    return True
 
 @shared_task
-def cleanup_old_reports(days=30):
+def compute_session_analytics_task(session_id):
     """
-    Celery task to cleanup reports older than specified days
+    Celery task adding focus analytics from the raw samples to a session's
+    reports once they are generated. Returns the number of reports updated.
+    """
+    from .utils import update_session_analytics
+    
+    try:
+        updated = update_session_analytics(session_id)
+    except Session.DoesNotExist:
+        logger.error(f"Session {session_id} does not exist")
+        return 0
+    logger.info(f"Added focus analytics to {updated} reports for session {session_id}")
+    return updated
+
+def run_report_version(session_id, version, job, timings):
+    """
+    Generate one report version and record its progress on `job`.
+    Returns the generate_session_report result, None without performance
+    data, or False if a newer version superseded this one. Pipeline errors
+    propagate; the caller decides whether the job is retried or failed.
     """
     from django.utils import timezone
+    from .models import ReportJob
+    
+    if not is_current_version(session_id, version):
+        logger.info(f"Skipping report version {version} for session {session_id}, superseded")
+        update_job(job, status=ReportJob.SUPERSEDED, finished_at=timezone.now())
+        return False
+    
+    logger.info(f"Starting report generation for session {session_id}")
+    update_job(job, status=ReportJob.RUNNING, started_at=timezone.now())
+    
+    # Generate the report
+    result = generate_session_report(session_id, timings=timings)
+    
+    if result:
+        update_job(job, status=ReportJob.DONE, stage_timings=timings, finished_at=timezone.now())
+        logger.info(f"Successfully generated report for session {session_id}")
+    else:
+        update_job(job, status=ReportJob.FAILED, stage_timings=timings,
+                   error='No performance data for session', finished_at=timezone.now())
+        logger.error(f"Failed to generate report for session {session_id}")
+    return result
+
+def update_job(job, **fields):
+    """Write job progress without touching the other columns"""
+    if job is None:
+        return
+    for name, value in fields.items():
+        setattr(job, name, value)
+    type(job).objects.filter(pk=job.pk).update(**fields)
+
+@shared_task(bind=True)
+def cleanup_old_reports(self, days=30, batch_size=None, pause=None):
+    """
+    Celery task to cleanup reports older than specified days.
+    Deletes in batches of REPORT_CLEANUP_BATCH_SIZE rows, each in its own
+    short transaction followed by a REPORT_CLEANUP_BATCH_PAUSE sleep so
+    live sessions are not starved, and removes chart files no report
+    references any more. Returns the run's metrics.
+    """
+    import time
+    from django.conf import settings
+    from django.db import transaction
+    from django.utils import timezone
+    from datetime import timedelta
+    from .models import Report
+    from .artifacts import delete_chart_files, collect_chart_artifacts
+    
+    batch_size = batch_size or settings.REPORT_CLEANUP_BATCH_SIZE
+    pause = settings.REPORT_CLEANUP_BATCH_PAUSE if pause is None else pause
+    cutoff_date = timezone.now() - timedelta(days=days)
+    
+    metrics = {'batches': 0, 'reports_deleted': 0, 'charts_deleted': 0, 'seconds': 0.0}
+    started = time.monotonic()
+    last_id = 0
+    while True:
+        # Walk the primary key so every batch is an index range scan
+        batch = list(Report.objects.filter(
+            generated_at__lt=cutoff_date, id__gt=last_id
+        ).order_by('id').values_list('id', 'chart_image', 'user_id', 'chart_artifact_id')[:batch_size])
+        if not batch:
+            break
+        last_id = batch[-1][0]
+        
+        with transaction.atomic():
+            deleted, _ = Report.objects.filter(id__in=[row[0] for row in batch]).delete()
+        
+        # Files go only after the rows are gone, so no report points at a missing chart.
+        # Shared artifact files are collected below once nothing references them
+        metrics['charts_deleted'] += delete_chart_files(row[1] for row in batch if row[3] is None)
+        invalidate_user_reports(row[2] for row in batch)
+        metrics['batches'] += 1
+        metrics['reports_deleted'] += deleted
+        metrics['seconds'] = round(time.monotonic() - started, 3)
+        
+        logger.info(f"Cleanup batch {metrics['batches']}: {metrics['reports_deleted']} reports deleted so far")
+        if self.request.id:
+            self.update_state(state='PROGRESS', meta=metrics)
+        
+        if len(batch) < batch_size:
+            break
+        if pause:
+            time.sleep(pause)
+    
+    metrics['charts_deleted'] += collect_chart_artifacts()
+    metrics['seconds'] = round(time.monotonic() - started, 3)
+    logger.info(
+        f"Cleaned up {metrics['reports_deleted']} reports and {metrics['charts_deleted']} charts "
+        f"older than {days} days in {metrics['batches']} batches"
+    )
+    return metrics
+
+@shared_task
+def evict_idle_report_charts(days=None):
+    """
+    Celery task to drop rendered charts nobody has requested for
+    REPORT_CHART_CACHE_DAYS; they are re-rendered on their next request.
+    Also collects chart artifacts no report references any more.
+    """
+    from django.conf import settings
+    from django.db.models import Q
+    from django.utils import timezone
     from datetime import timedelta
     from .models import Report
+    from .artifacts import delete_chart_files, collect_chart_artifacts
+    
+    if days is None:
+        days = settings.REPORT_CHART_CACHE_DAYS
+    
+    cutoff_date = timezone.now() - timedelta(days=days)
+    idle_reports = Report.objects.exclude(chart_image='').exclude(chart_image__isnull=True).filter(
+        Q(chart_accessed_at__lt=cutoff_date) |
+        Q(chart_accessed_at__isnull=True, generated_at__lt=cutoff_date)
+    )
+    
+    evicted = {report_id: (name, user_id, artifact_id) for report_id, name, user_id, artifact_id in idle_reports.values_list(
+        'id', 'chart_image', 'user_id', 'chart_artifact_id'
+    )}
+    Report.objects.filter(id__in=list(evicted)).update(chart_image='', chart_artifact=None, chart_accessed_at=None)
+    # Charts from before artifacts are owned by their report; shared files wait for collection
+    delete_chart_files(name for name, _, artifact_id in evicted.values() if artifact_id is None)
+    invalidate_user_reports(user_id for _, user_id, _ in evicted.values())
+    collect_chart_artifacts()
+    
+    logger.info(f"Evicted {len(evicted)} report charts idle for {days} days")
+    return len(evicted)
+
+@shared_task
+def archive_cold_sessions(days=None):
+    """
+    Celery task to move finished sessions older than FOCUS_ARCHIVE_AFTER_DAYS
+    into the cold archive, one file per classroom per month
+    """
+    from collections import defaultdict
+    from django.conf import settings
+    from django.utils import timezone
+    from datetime import timedelta
+    from .archive import archive_sessions
+    
+    if days is None:
+        days = settings.FOCUS_ARCHIVE_AFTER_DAYS
     
     cutoff_date = timezone.now() - timedelta(days=days)
-    old_reports = Report.objects.filter(generated_at__lt=cutoff_date)
+    groups = defaultdict(list)
+    for session in Session.objects.filter(
+        end_time__lt=cutoff_date, is_active=False, archived_at__isnull=True
+    ).order_by('classroom_id', 'start_time'):
+        groups[(session.classroom_id, session.start_time.year, session.start_time.month)].append(session)
     
-    count = old_reports.count()
-    old_reports.delete()
+    count = 0
+    for sessions in groups.values():
+        try:
+            count += archive_sessions(sessions)
+        except Exception as e:
+            logger.error(f"Error archiving sessions {[session.id for session in sessions]}: {str(e)}")
     
-    logger.info(f"Cleaned up {count} reports older than {days} days")
-    return count
\ No newline at end of file
+    logger.info(f"Archived {count} sessions older than {days} days into {len(groups)} files")
+    return count
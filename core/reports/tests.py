@@ -1,18 +1,109 @@
-from django.test import TestCase
+import json
+import multiprocessing
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import numpy as np
+from django.conf import settings
+from django.test import TestCase, override_settings
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth import get_user_model
 from rest_framework.test import APITestCase, APIClient
 from rest_framework import status
-from .models import Report
+from .models import Report, ReportJob, ChartArtifact
 from session.models import Session
 from classrooms.models import Classroom, Enrollment
-from performance.models import Performance
+from performance.models import Performance, FocusSample, FocusAccumulator
+from performance.utils import write_focus_batch
 from django.utils import timezone
-from unittest.mock import patch, MagicMock
-from .utils import generate_session_report
-from .tasks import generate_session_report_task
+from django.core.files.base import ContentFile
+from io import StringIO
+from unittest.mock import patch, MagicMock, ANY
+from django.core.management import call_command
+from .utils import (
+    generate_session_report, generate_student_focus_chart, get_enrolled_students, calculate_attendance_metrics,
+    calculate_focus_metrics, generate_student_time_series, render_report_chart, update_session_analytics
+)
+from .tasks import generate_session_report_task, evict_idle_report_charts, cleanup_old_reports, archive_cold_sessions
+from .analytics import compute_focus_analytics, load_session_samples
+from .archive import archive_sessions, archived_session_ids, read_session_archive, session_archive_path
+from .artifacts import chart_input_hash, collect_chart_artifacts
+from .checks import check_shared_cache
+from .series import encode_series, decode_series, lttb_indices
+from .dispatch import request_session_report
+from .backfill import init_worker
+from .charts import render_class_chart, render_student_chart, render_student_charts_parallel
 
 User = get_user_model()
 
+OTHER_PROCESS_PRELUDE = """
+import sys
+import django
+from django.conf import settings
+settings.CACHES = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': sys.argv[1]}}
+django.setup()
+"""
+
+
+def shared_file_cache(cache_dir):
+    """Settings override for a cache that, like Redis, other processes can see"""
+    return override_settings(CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': cache_dir}
+    })
+
+
+def run_in_other_process(code, cache_dir, *args):
+    """Run `code` in a fresh interpreter sharing the file cache in cache_dir, as a Celery worker would"""
+    # manage.py has put DJANGO_SETTINGS_MODULE in the environment already
+    env = {
+        **os.environ,
+        'PYTHONPATH': os.pathsep.join(path for path in sys.path if path),
+    }
+    subprocess.run(
+        [sys.executable, '-c', OTHER_PROCESS_PRELUDE + code, cache_dir, *map(str, args)],
+        cwd=settings.BASE_DIR, env=env, check=True, capture_output=True, timeout=60,
+    )
+
+class ReportFixturesMixin:
+    """Users, classrooms and sessions for the report tests, and temporary storage settings"""
+
+    def create_instructor(self, email='instructor@example.com', **fields):
+        return User.objects.create_user(
+            email=email, password='password123', full_name='Instructor', role='instructor', **fields)
+
+    def create_student(self, email='student@example.com', full_name='Student'):
+        return User.objects.create_user(email=email, password='password123', full_name=full_name, role='student')
+
+    def create_classroom(self, instructor, students=(), **fields):
+        classroom = Classroom.objects.create(name=fields.pop('name', 'Test Class'), instructor=instructor, **fields)
+        for student in students:
+            Enrollment.objects.create(student=student, classroom=classroom)
+        return classroom
+
+    def create_session(self, classroom, **fields):
+        """A session; ending it doesn't queue a report task"""
+        fields.setdefault('start_time', timezone.now())
+        with patch('reports.tasks.generate_session_report_task.delay'):
+            return Session.objects.create(classroom=classroom, **fields)
+
+    def use_temp_dir(self, setting):
+        """Point a directory setting at a fresh temporary directory for the rest of the test"""
+        path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, path, ignore_errors=True)
+        override = override_settings(**{setting: path})
+        override.enable()
+        self.addCleanup(override.disable)
+        return path
+
+def apps_ready():
+    from django.apps import apps
+    return apps.ready
+
 class ReportModelTest(TestCase):
     @patch('reports.tasks.generate_session_report_task.delay')
     def setUp(self, mock_delay):
@@ -36,6 +127,7 @@ class ReportModelTest(TestCase):
 class ReportViewSetTest(APITestCase):
     @patch('reports.tasks.generate_session_report_task.delay')
     def setUp(self, mock_delay):
+        cache.clear()
         self.instructor = User.objects.create_user(
             email='instructor@example.com', password='password123', full_name='Instructor', role='instructor')
         self.student = User.objects.create_user(
@@ -52,6 +144,29 @@ class ReportViewSetTest(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data['id'], self.report.id)
 
+    def test_list_fetches_summary_columns_in_one_query(self):
+        for i in range(5):
+            session = Session.objects.create(classroom=self.classroom, start_time=timezone.now())
+            Report.objects.create(
+                session=session, user=self.student, report_type='student', attendance_status=100,
+                avg_focus_score=0.5, focus_data_json=[{'timestamp': 't', 'avg_focus': 0.5}], duration_seconds=60)
+        self.client.force_authenticate(user=self.student)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/reports/')
+        self.assertEqual(response.data['count'], 6)
+        self.assertEqual(response.data['results'][0]['session_name'], 'Test Class')
+        report_queries = [q['sql'] for q in ctx.captured_queries if 'reports_report' in q['sql']]
+        self.assertEqual(len(report_queries), 2)  # count + page
+        self.assertFalse(any('focus_data_json' in sql or 'metadata' in sql for sql in report_queries))
+
+    def test_by_session_returns_summaries(self):
+        self.client.force_authenticate(user=self.student)
+        Enrollment.objects.create(student=self.student, classroom=self.classroom)
+        response = self.client.get(f'/api/reports/by_session/?session_id={self.session.id}')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([r['id'] for r in response.data], [self.report.id])
+        self.assertNotIn('focus_data_json', response.data[0])
+
     def test_student_cannot_view_other_student_report(self):
         other_student = User.objects.create_user(
             email='other@example.com', password='password123', full_name='Other', role='student')
@@ -68,6 +183,561 @@ class ReportViewSetTest(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
 
 
+class ReportPaginationTest(ReportFixturesMixin, APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.student = self.create_student()
+        classroom = self.create_classroom(self.create_instructor())
+        self.now = timezone.now()
+        sessions = [self.create_session(classroom, start_time=self.now) for _ in range(25)]
+        for i, session in enumerate(sessions):
+            report = Report.objects.create(
+                session=session, user=self.student, report_type='student', attendance_status=100,
+                avg_focus_score=0.5, focus_data_json=[], duration_seconds=60)
+            # Pairs of reports share a timestamp so the id tiebreaker is exercised
+            Report.objects.filter(pk=report.pk).update(generated_at=self.now - timezone.timedelta(days=i // 2))
+        self.expected = list(Report.objects.filter(user=self.student).order_by('-generated_at', '-id')
+                             .values_list('id', flat=True))
+        self.client.force_authenticate(user=self.student)
+
+    def test_cursor_pages_cover_every_report_once(self):
+        seen, url = [], '/api/reports/?pagination=cursor'
+        while url:
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn('count', response.data)
+            self.assertFalse(any('COUNT(' in q['sql'].upper() for q in ctx.captured_queries))
+            seen.extend(r['id'] for r in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(seen, self.expected)
+
+    def test_cursor_previous_link_returns_prior_page(self):
+        first = self.client.get('/api/reports/?pagination=cursor').data
+        second = self.client.get(first['next']).data
+        back = self.client.get(second['previous']).data
+        self.assertEqual([r['id'] for r in back['results']], [r['id'] for r in first['results']])
+        self.assertIsNone(first['previous'])
+
+    def test_invalid_cursor_is_not_found(self):
+        response = self.client.get('/api/reports/?pagination=cursor&cursor=bogus')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_generated_at_range_filter(self):
+        after = (self.now - timezone.timedelta(days=2, hours=1)).isoformat()
+        response = self.client.get('/api/reports/', {'generated_after': after, 'pagination': 'cursor'})
+        self.assertEqual([r['id'] for r in response.data['results']], self.expected[:6])
+
+        before = (self.now - timezone.timedelta(days=11, hours=1)).isoformat()
+        response = self.client.get('/api/reports/', {'generated_before': before})
+        self.assertEqual(response.data['count'], 1)
+
+class ReportSeriesTest(ReportFixturesMixin, APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.student = self.create_student()
+        session = self.create_session(self.create_classroom(self.create_instructor()))
+        start = timezone.now().replace(second=0, microsecond=0)
+        self.points = [
+            {'timestamp': (start + timezone.timedelta(minutes=m)).isoformat(), 'avg_focus': round((m % 7) / 10, 2)}
+            for m in range(120)
+        ]
+        self.report = Report.objects.create(
+            session=session, user=self.student, report_type='student', attendance_status=100,
+            avg_focus_score=0.3, focus_data_json=encode_series(self.points), duration_seconds=7200)
+        self.client.force_authenticate(user=self.student)
+
+    def test_encoding_round_trips_with_gaps(self):
+        points = self.points[:3] + self.points[10:12]
+        encoded = encode_series(points)
+        self.assertEqual(encoded['offsets'], [0, 1, 2, 10, 11])
+        self.assertEqual(encoded['columns']['avg_focus'], [0, 10, 20, 30, 40])
+        self.assertEqual(decode_series(encoded), points)
+        self.assertNotIn('offsets', encode_series(self.points))
+        self.assertLess(len(json.dumps(encode_series(self.points))), len(json.dumps(self.points)) / 4)
+
+    def test_lttb_keeps_endpoints_and_spikes(self):
+        y = [0.5] * 100
+        y[37] = 1.0
+        kept = lttb_indices(list(range(100)), y, 10)
+        self.assertEqual(len(kept), 10)
+        self.assertEqual((kept[0], kept[-1]), (0, 99))
+        self.assertIn(37, kept)
+        self.assertEqual(list(lttb_indices(list(range(5)), [0] * 5, 10)), [0, 1, 2, 3, 4])
+
+    def test_detail_serves_legacy_shape_by_default(self):
+        response = self.client.get(f'/api/reports/{self.report.id}/')
+        self.assertEqual(response.data['focus_data_json'], self.points)
+
+    def test_detail_serves_compact_and_downsampled_series(self):
+        response = self.client.get(f'/api/reports/{self.report.id}/?series=compact')
+        self.assertEqual(response.data['focus_data_json'], self.report.focus_data_json)
+
+        response = self.client.get(f'/api/reports/{self.report.id}/?points=20')
+        series = response.data['focus_data_json']
+        self.assertEqual(len(series), 20)
+        self.assertEqual((series[0], series[-1]), (self.points[0], self.points[-1]))
+
+        response = self.client.get(f'/api/reports/{self.report.id}/?series=compact&points=20')
+        self.assertEqual(len(response.data['focus_data_json']['offsets']), 20)
+
+    def test_invalid_series_options_are_rejected(self):
+        for query in ('series=xml', 'points=1', 'points=many'):
+            response = self.client.get(f'/api/reports/{self.report.id}/?{query}')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, query)
+
+class ReportResponseCacheTest(ReportFixturesMixin, APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.instructor = self.create_instructor()
+        self.student = self.create_student()
+        self.classroom = self.create_classroom(self.instructor, [self.student])
+        self.session = self.create_session(self.classroom)
+        Performance.objects.create(session=self.session, student=self.student, focus_score=0.9, attended=True)
+        with self.captureOnCommitCallbacks(execute=True):
+            generate_session_report(self.session.id)
+        self.report = Report.objects.get(user=self.student)
+        self.client.force_authenticate(user=self.student)
+
+    def test_conditional_get_returns_304(self):
+        url = f'/api/reports/{self.report.id}/'
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertIn('ETag', first)
+        self.assertIn('Last-Modified', first)
+
+        with self.assertNumQueries(0):
+            second = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(second.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(second['ETag'], first['ETag'])
+
+    def test_payload_served_from_cache(self):
+        self.client.get('/api/reports/')
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/reports/')
+        self.assertEqual(response.data['count'], 1)
+
+    def test_regeneration_invalidates_cache(self):
+        url = f'/api/reports/{self.report.id}/'
+        first = self.client.get(url)
+        Performance.objects.filter(student=self.student).update(focus_score=0.4)
+        with self.captureOnCommitCallbacks(execute=True):
+            generate_session_report(self.session.id)
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], first['ETag'])
+        self.assertEqual(response.data['avg_focus_score'], 0.4)
+
+    def test_process_local_cache_is_flagged(self):
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            self.assertEqual([warning.id for warning in check_shared_cache(None)], ['reports.W001'])
+        with shared_file_cache(tempfile.gettempdir()):
+            self.assertEqual(check_shared_cache(None), [])
+
+    def test_invalidation_from_another_process(self):
+        # Reports change on Celery workers; web processes must see the new version
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir, ignore_errors=True)
+        url = f'/api/reports/{self.report.id}/'
+        with shared_file_cache(cache_dir):
+            first = self.client.get(url)
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag']).status_code,
+                             status.HTTP_304_NOT_MODIFIED)
+
+            run_in_other_process(
+                'from reports.cache import invalidate_user_reports\n'
+                'invalidate_user_reports([int(sys.argv[2])])',
+                cache_dir, self.student.id
+            )
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], first['ETag'])
+
+class ReportChartTest(ReportFixturesMixin, APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.media_root = self.use_temp_dir('MEDIA_ROOT')
+        self.instructor = self.create_instructor()
+        self.student = self.create_student()
+        self.classroom = self.create_classroom(self.instructor, [self.student])
+        self.session = self.create_session(self.classroom)
+        Performance.objects.create(session=self.session, student=self.student, focus_score=0.9, attended=True)
+
+    @patch('reports.utils.generate_student_focus_chart')
+    def test_generation_defers_chart_rendering(self, mock_student_chart):
+        generate_session_report(self.session.id)
+        mock_student_chart.assert_not_called()
+        report = Report.objects.get(user=self.student)
+        self.assertFalse(report.chart_image)
+        self.assertIsNone(report.chart_accessed_at)
+
+    def test_concurrent_lazy_renders_store_their_own_chart(self):
+        # Chart requests render in their own threads; each PNG must belong to its input hash
+        start = timezone.now().replace(second=0, microsecond=0)
+        reports = []
+        for i in range(16):
+            series = [{'timestamp': (start + timezone.timedelta(minutes=m)).isoformat(), 'avg_focus': (i + m) % 10 / 10}
+                      for m in range(2 + i % 5)]
+            student = User(id=100 + i, full_name=f'Student {i}')
+            reports.append(Report(session=self.session, user=student, report_type='student',
+                                  focus_data_json=encode_series(series)))
+        rendered = {}
+
+        def capture(input_hash, render):
+            rendered[input_hash] = render()
+
+        with patch('reports.utils.get_or_render_artifact', side_effect=capture):
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                list(executor.map(render_report_chart, reports))
+        expected = {
+            chart_input_hash('student', self.session.id, report.focus_data_json, report.user.full_name):
+                render_student_chart(decode_series(report.focus_data_json), self.session.id, report.user.full_name)
+            for report in reports
+        }
+        self.assertEqual(rendered, expected)
+
+    def test_chart_rendered_on_first_request_then_served_from_storage(self):
+        generate_session_report(self.session.id)
+        report = Report.objects.get(user=self.student)
+        self.client.force_authenticate(user=self.student)
+
+        detail = self.client.get(f'/api/reports/{report.id}/')
+        self.assertTrue(detail.data['chart_image_url'].endswith(f'/api/reports/{report.id}/chart/'))
+
+        with patch('reports.utils.generate_student_focus_chart', wraps=generate_student_focus_chart) as render:
+            first = self.client.get(f'/api/reports/{report.id}/chart/')
+            second = self.client.get(f'/api/reports/{report.id}/chart/')
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertEqual(first['Content-Type'], 'image/png')
+        self.assertEqual(b''.join(second.streaming_content), b''.join(first.streaming_content))
+        self.assertEqual(render.call_count, 1)
+        report.refresh_from_db()
+        self.assertTrue(report.chart_image)
+        self.assertIsNotNone(report.chart_accessed_at)
+
+    def test_idle_charts_are_evicted_and_rerendered(self):
+        generate_session_report(self.session.id)
+        report = Report.objects.get(user=self.student)
+        self.client.force_authenticate(user=self.student)
+        self.client.get(f'/api/reports/{report.id}/chart/')
+        report.refresh_from_db()
+        path = report.chart_image.path
+
+        Report.objects.filter(pk=report.pk).update(chart_accessed_at=timezone.now() - timezone.timedelta(days=30))
+        with override_settings(REPORT_CHART_ARTIFACT_GRACE_SECONDS=0):
+            self.assertEqual(evict_idle_report_charts(days=14), 1)
+        report.refresh_from_db()
+        self.assertFalse(report.chart_image)
+        self.assertFalse(os.path.exists(path))
+
+        response = self.client.get(f'/api/reports/{report.id}/chart/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_regeneration_discards_stale_chart(self):
+        generate_session_report(self.session.id)
+        report = Report.objects.get(user=self.student)
+        self.client.force_authenticate(user=self.student)
+        self.client.get(f'/api/reports/{report.id}/chart/')
+        report.refresh_from_db()
+        path = report.chart_image.path
+
+        with self.captureOnCommitCallbacks(execute=True):
+            generate_session_report(self.session.id)
+        report.refresh_from_db()
+        self.assertFalse(report.chart_image)
+        self.assertIsNone(report.chart_artifact)
+
+        # Unchanged data reuses the stored chart instead of rendering it again
+        with patch('reports.utils.generate_student_focus_chart') as render:
+            response = self.client.get(f'/api/reports/{report.id}/chart/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        render.assert_not_called()
+        report.refresh_from_db()
+        self.assertEqual(report.chart_image.path, path)
+
+        # Changed data gets a new chart; the old file goes once it is unreferenced
+        Performance.objects.filter(session=self.session).update(focus_score=0.3)
+        generate_session_report(self.session.id)
+        self.client.get(f'/api/reports/{report.id}/chart/')
+        report.refresh_from_db()
+        self.assertNotEqual(report.chart_image.path, path)
+        self.assertEqual(collect_chart_artifacts(grace_seconds=0), 1)
+        self.assertFalse(os.path.exists(path))
+        self.assertTrue(os.path.exists(report.chart_image.path))
+
+    def test_identical_charts_share_one_file(self):
+        with patch('reports.utils.generate_student_focus_chart', return_value=b'same png'), \
+                patch('reports.utils.generate_focus_chart', return_value=b'same png'):
+            generate_session_report(self.session.id)
+            self.client.force_authenticate(user=self.student)
+            self.client.get(f'/api/reports/{Report.objects.get(user=self.student).id}/chart/')
+            self.client.force_authenticate(user=self.instructor)
+            self.client.get(f'/api/reports/{Report.objects.get(user=self.instructor).id}/chart/')
+
+        self.assertEqual(ChartArtifact.objects.count(), 2)
+        self.assertEqual(len(set(ChartArtifact.objects.values_list('image', flat=True))), 1)
+        self.assertEqual(len(os.listdir(os.path.join(self.media_root, 'report_charts'))), 1)
+
+        # The file stays while either artifact is referenced
+        Report.objects.filter(user=self.student).delete()
+        self.assertEqual(collect_chart_artifacts(grace_seconds=0), 0)
+        self.assertEqual(ChartArtifact.objects.count(), 1)
+        Report.objects.all().delete()
+        self.assertEqual(collect_chart_artifacts(grace_seconds=0), 1)
+        self.assertFalse(ChartArtifact.objects.exists())
+
+    @override_settings(REPORT_CHART_EAGER=True)
+    def test_eager_regeneration_skips_unchanged_charts(self):
+        generate_session_report(self.session.id)
+        self.assertTrue(Report.objects.get(user=self.student).chart_image)
+        with patch('reports.utils.generate_student_focus_chart') as student_render, \
+                patch('reports.utils.generate_focus_chart') as class_render:
+            generate_session_report(self.session.id)
+        student_render.assert_not_called()
+        class_render.assert_not_called()
+        self.assertTrue(all(report.chart_artifact_id for report in Report.objects.all()))
+
+    def test_recent_unreferenced_artifacts_survive_collection(self):
+        generate_session_report(self.session.id)
+        report = Report.objects.get(user=self.student)
+        self.client.force_authenticate(user=self.student)
+        self.client.get(f'/api/reports/{report.id}/chart/')
+        Report.objects.update(chart_artifact=None, chart_image='')
+        self.assertEqual(collect_chart_artifacts(), 0)
+        self.assertEqual(ChartArtifact.objects.count(), 1)
+
+class ReportJobTest(ReportFixturesMixin, APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.instructor = self.create_instructor()
+        self.student = self.create_student()
+        self.classroom = self.create_classroom(self.instructor, [self.student])
+        self.session = self.create_session(self.classroom)
+        Performance.objects.create(session=self.session, student=self.student, focus_score=0.9, attended=True)
+        self.report = Report.objects.create(
+            session=self.session, user=self.instructor, report_type='instructor', attendance_status=100,
+            avg_focus_score=0.9, focus_data_json=[], duration_seconds=60)
+
+    @patch('reports.tasks.generate_session_report_task.delay')
+    def test_regenerate_queues_job_and_coalesces(self, mock_delay):
+        self.client.force_authenticate(user=self.instructor)
+        url = f'/api/reports/{self.report.id}/regenerate/'
+        with self.captureOnCommitCallbacks(execute=True):
+            first = self.client.post(url)
+            second = self.client.post(url)
+        self.assertEqual(first.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(first.data['status'], ReportJob.QUEUED)
+        self.assertFalse(first.data['coalesced'])
+        self.assertTrue(second.data['coalesced'])
+        self.assertEqual(first.data['job_id'], second.data['job_id'])
+        mock_delay.assert_called_once_with(self.session.id, 1)
+
+    @patch('reports.tasks.compute_session_analytics_task.delay')
+    @patch('reports.tasks.generate_session_report_task.delay')
+    def test_job_status_reports_stage_timings(self, mock_delay, mock_analytics_delay):
+        self.client.force_authenticate(user=self.instructor)
+        job_id = self.client.post(f'/api/reports/{self.report.id}/regenerate/').data['job_id']
+
+        generate_session_report_task(self.session.id, 1)
+
+        response = self.client.get(f'/api/report-jobs/{job_id}/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['status'], ReportJob.DONE)
+        self.assertEqual(set(response.data['stage_timings']), {
+            'load', 'duration', 'attendance', 'focus', 'time_series',
+            'instructor_report', 'student_reports',
+        })
+        self.assertIsNotNone(response.data['finished_at'])
+        # Analytics follow as their own task once the report is saved
+        mock_analytics_delay.assert_called_once_with(self.session.id)
+
+        # A new regenerate after the job finished gets its own job
+        response = self.client.post(f'/api/reports/{self.report.id}/regenerate/')
+        self.assertNotEqual(response.data['job_id'], job_id)
+
+    def test_students_cannot_see_jobs(self):
+        self.client.force_authenticate(user=self.instructor)
+        job_id = self.client.post(f'/api/reports/{self.report.id}/regenerate/').data['job_id']
+        self.client.force_authenticate(user=self.student)
+        response = self.client.get(f'/api/report-jobs/{job_id}/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+class ReportInstrumentationTest(ReportFixturesMixin, APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.use_temp_dir('MEDIA_ROOT')
+        self.instructor = self.create_instructor()
+        self.students = [self.create_student(f'student{i}@example.com', f'Student {i}') for i in range(3)]
+        self.session = self.create_session(self.create_classroom(self.instructor, self.students))
+        start = timezone.now()
+        samples = []
+        for student in self.students:
+            samples += [(self.session.id, student.id, start + timezone.timedelta(seconds=i), 0.5) for i in range(4)]
+        write_focus_batch({(self.session.id, student.id): 0.5 for student in self.students}, samples)
+
+    def test_stages_are_recorded_in_instructor_metadata(self):
+        result = generate_session_report(self.session.id)
+        stages = Report.objects.get(pk=result['instructor_report'].pk).metadata['instrumentation']
+        self.assertEqual(list(stages), [
+            'load', 'duration', 'attendance', 'focus', 'time_series',
+            'instructor_report', 'student_reports',
+        ])
+        self.assertEqual(stages['load']['rows'], 3)
+        self.assertEqual(stages['focus']['rows'], 12)
+        self.assertEqual(stages['student_reports']['rows'], 3)
+        self.assertEqual(stages['duration']['queries'], 0)
+        self.assertTrue(all(stage['seconds'] >= 0 and stage['calls'] == 1 for stage in stages.values()))
+
+    @override_settings(REPORT_CHART_EAGER=True)
+    def test_chart_stages_are_counted(self):
+        result = generate_session_report(self.session.id)
+        stages = result['instructor_report'].metadata['instrumentation']
+        self.assertEqual(stages['chart_render']['rows'], 1 + 3)
+        self.assertEqual(stages['chart_save']['calls'], 1 + 3)
+
+    def test_metrics_endpoint_exposes_stage_counters(self):
+        generate_session_report(self.session.id)
+        generate_session_report(self.session.id)
+
+        self.client.force_authenticate(user=self.instructor)
+        self.assertEqual(self.client.get('/api/reports/metrics/').status_code, status.HTTP_403_FORBIDDEN)
+
+        admin = self.create_instructor('admin@example.com', is_staff=True)
+        self.client.force_authenticate(user=admin)
+        response = self.client.get('/api/reports/metrics/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        body = response.content.decode()
+        self.assertIn('# TYPE edufocus_report_stage_seconds_total counter', body)
+        self.assertIn('edufocus_report_stage_calls_total{stage="student_reports"} 2', body)
+        self.assertIn('edufocus_report_stage_rows_total{stage="student_reports"} 6', body)
+        self.assertIn('edufocus_report_stage_calls_total{stage="chart_render"} 0', body)
+
+    def test_metrics_from_other_processes_are_exposed(self):
+        # Stages mostly run on Celery workers; the web process serving the endpoint must see them
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir, ignore_errors=True)
+        admin = self.create_instructor('admin@example.com', is_staff=True)
+        self.client.force_authenticate(user=admin)
+        with shared_file_cache(cache_dir):
+            run_in_other_process(
+                'from reports.instrumentation import record_stage_metrics\n'
+                'record_stage_metrics("chart_render", 0.5, 2, 3)',
+                cache_dir
+            )
+            body = self.client.get('/api/reports/metrics/').content.decode()
+        self.assertIn('edufocus_report_stage_calls_total{stage="chart_render"} 1', body)
+        self.assertIn('edufocus_report_stage_rows_total{stage="chart_render"} 3', body)
+        self.assertIn('edufocus_report_stage_seconds_total{stage="chart_render"} 0.5', body)
+
+    def test_unreachable_metrics_cache_does_not_fail_reports(self):
+        with patch('reports.instrumentation.cache.add', side_effect=ConnectionError('cache down')):
+            result = generate_session_report(self.session.id)
+        self.assertEqual(len(result['student_reports']), 3)
+
+class SessionArchiveTest(ReportFixturesMixin, APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.use_temp_dir('FOCUS_ARCHIVE_ROOT')
+        self.instructor = self.create_instructor()
+        self.student = self.create_student()
+        self.classroom = self.create_classroom(self.instructor, [self.student])
+        start = timezone.now().replace(second=0, microsecond=0) - timezone.timedelta(days=40)
+        self.session = self.create_session(
+            self.classroom, start_time=start, end_time=start + timezone.timedelta(minutes=5), is_active=False)
+        samples = [(self.session.id, self.student.id, start + timezone.timedelta(seconds=30 * i), 0.2 * i) for i in range(4)]
+        write_focus_batch({(self.session.id, self.student.id): 0.6}, samples)
+        generate_session_report(self.session.id)
+        update_session_analytics(self.session.id)
+        self.report = Report.objects.get(user=self.student)
+
+    def test_archive_moves_data_out_of_hot_tables(self):
+        original = self.report.focus_data_json
+        self.assertEqual(archive_cold_sessions(days=30), 1)
+
+        self.assertFalse(Performance.objects.filter(session=self.session).exists())
+        self.assertFalse(FocusSample.objects.filter(session=self.session).exists())
+        self.assertFalse(FocusAccumulator.objects.filter(session=self.session).exists())
+        self.report.refresh_from_db()
+        self.assertEqual(self.report.focus_data_json, [])
+        self.session.refresh_from_db()
+        self.assertIsNotNone(self.session.archived_at)
+        self.assertTrue(session_archive_path(self.session).endswith(f"{self.session.start_time:%Y-%m}.npz"))
+
+        # Detail reads are served from the archive
+        self.client.force_authenticate(user=self.student)
+        response = self.client.get(f'/api/reports/{self.report.id}/?series=compact')
+        self.assertEqual(response.data['focus_data_json'], original)
+
+    def test_archive_invalidates_cached_reports(self):
+        self.client.force_authenticate(user=self.student)
+        url = f'/api/reports/{self.report.id}/'
+        first = self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            archive_cold_sessions(days=30)
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], first['ETag'])
+
+    def test_regeneration_rehydrates_archived_session(self):
+        original = Report.objects.get(pk=self.report.pk)
+        archive_cold_sessions(days=30)
+
+        result = generate_session_report(self.session.id)
+        self.assertIsNotNone(result)
+        self.session.refresh_from_db()
+        self.assertIsNone(self.session.archived_at)
+        self.assertEqual(FocusSample.objects.filter(session=self.session).count(), 4)
+        regenerated = Report.objects.get(pk=self.report.pk)
+        self.assertEqual(regenerated.focus_data_json, original.focus_data_json)
+        self.assertEqual(regenerated.avg_focus_score, original.avg_focus_score)
+
+        # Archiving again replaces the session's rows instead of duplicating them
+        archive_cold_sessions(days=30)
+        arrays = read_session_archive(self.session)
+        self.assertEqual(len(arrays['samples_session']), 4)
+        self.assertEqual(len(arrays['reports_session']), 2)
+
+    def test_analytics_load_archived_samples(self):
+        before = load_session_samples(self.session)
+        archive_cold_sessions(days=30)
+        self.session.refresh_from_db()
+        after = load_session_samples(self.session)
+        for hot, archived in zip(before, after):
+            np.testing.assert_allclose(archived, hot, atol=1e-3)
+
+    def test_archive_merges_report_metadata(self):
+        original = self.report.metadata
+        self.assertIn('analytics', original)
+        archive_cold_sessions(days=30)
+        self.report.refresh_from_db()
+        self.assertEqual(self.report.metadata, {**original, 'archived': True})
+
+    def test_sessions_of_one_month_share_a_file(self):
+        start = self.session.start_time + timezone.timedelta(hours=1)
+        other = self.create_session(
+            self.classroom, start_time=start, end_time=start + timezone.timedelta(minutes=5), is_active=False)
+        write_focus_batch({(other.id, self.student.id): 0.9}, [(other.id, self.student.id, start, 0.9)])
+
+        # Separate runs add to the file rather than replacing each other's sessions
+        self.assertEqual(archive_sessions([self.session]), 1)
+        self.assertEqual(archive_sessions([other]), 1)
+        path = session_archive_path(self.session)
+        self.assertEqual(archived_session_ids(path), {self.session.id, other.id})
+        self.assertEqual(len(read_session_archive(self.session)['samples_session']), 4)
+        self.assertEqual(read_session_archive(other)['samples_focus_score'].tolist(), [0.9])
+
+        # Sessions archived by another run since they were selected are skipped
+        self.assertEqual(archive_sessions([self.session]), 0)
+
+    def test_running_report_job_defers_archiving(self):
+        ReportJob.objects.filter(session=self.session).update(
+            status=ReportJob.RUNNING, started_at=timezone.now())
+        self.assertEqual(archive_cold_sessions(days=30), 0)
+        self.assertTrue(FocusSample.objects.filter(session=self.session).exists())
+
 class ReportUtilsTest(TestCase):
     @patch('reports.tasks.generate_session_report_task.delay')
     def setUp(self, mock_delay):
@@ -96,6 +766,213 @@ class ReportUtilsTest(TestCase):
         self.assertEqual(len(result['student_reports']), 2)
         self.assertEqual(Report.objects.count(), 3) # 1 instructor, 2 students
 
+    @patch('reports.utils.generate_focus_chart')
+    @patch('reports.utils.generate_student_focus_chart')
+    def test_regenerating_session_report_upserts(self, mock_student_chart, mock_instructor_chart):
+        mock_instructor_chart.return_value = b''
+        mock_student_chart.return_value = b''
+        first = generate_session_report(self.session.id)
+        Performance.objects.filter(student=self.student1).update(focus_score=0.5)
+        second = generate_session_report(self.session.id)
+        self.assertIsNotNone(second)
+        self.assertEqual(Report.objects.count(), 3)
+        self.assertEqual(
+            sorted(r.pk for r in first['student_reports']),
+            sorted(r.pk for r in second['student_reports'])
+        )
+        report = Report.objects.get(user=self.student1, report_type='student')
+        self.assertEqual(report.avg_focus_score, 0.5)
+
+    @patch('reports.utils.generate_focus_chart')
+    @patch('reports.utils.generate_student_focus_chart')
+    def test_report_generation_queries_do_not_grow_with_class_size(self, mock_student_chart, mock_instructor_chart):
+        mock_instructor_chart.return_value = b''
+        mock_student_chart.return_value = b''
+        with CaptureQueriesContext(connection) as small:
+            generate_session_report(self.session.id)
+        for i in range(3, 7):
+            student = User.objects.create_user(
+                email=f'student{i}@example.com', password='password123', full_name=f'Student {i}', role='student')
+            Enrollment.objects.create(student=student, classroom=self.classroom)
+            Performance.objects.create(session=self.session, student=student, focus_score=0.5, attended=True)
+        with CaptureQueriesContext(connection) as large:
+            result = generate_session_report(self.session.id)
+        self.assertEqual(len(result['student_reports']), 6)
+        self.assertEqual(len(small), len(large))
+
+    def _count_metric_queries(self):
+        performances = Performance.objects.filter(session=self.session)
+        with CaptureQueriesContext(connection) as ctx:
+            enrolled = get_enrolled_students(self.session)
+            attendance = calculate_attendance_metrics(self.session, performances, enrolled)
+            focus = calculate_focus_metrics(performances)
+            generate_student_time_series(performances)
+        return len(ctx), attendance, focus
+
+    def test_metric_queries_do_not_grow_with_class_size(self):
+        small_count, _, _ = self._count_metric_queries()
+        for i in range(3, 7):
+            student = User.objects.create_user(
+                email=f'student{i}@example.com', password='password123', full_name=f'Student {i}', role='student')
+            Enrollment.objects.create(student=student, classroom=self.classroom)
+            Performance.objects.create(session=self.session, student=student, focus_score=0.5, attended=True)
+        large_count, attendance, focus = self._count_metric_queries()
+        self.assertEqual(small_count, large_count)
+        self.assertEqual(attendance['total_students'], 6)
+        self.assertEqual(len(focus['student_focus']), 6)
+        self.assertEqual(focus['student_focus'][0]['student_name'], 'Student 1')
+        self.assertAlmostEqual(focus['overall_avg_focus'], round((0.9 + 0.7 + 0.5 * 4) / 6, 2))
+
+class ChartRenderingTest(TestCase):
+    def setUp(self):
+        start = timezone.now()
+        self.series = [
+            {'timestamp': (start + timezone.timedelta(minutes=m)).isoformat(), 'avg_focus': 0.5, 'student_count': 3}
+            for m in range(5)
+        ]
+
+    def test_charts_render_png(self):
+        self.assertTrue(render_class_chart(self.series, 1).startswith(b'\x89PNG'))
+        first = render_student_chart(self.series, 1, 'Student 1')
+        self.assertTrue(first.startswith(b'\x89PNG'))
+        # The reused template must not carry state from earlier renders
+        render_student_chart(self.series[:2], 1, 'Student 2')
+        self.assertEqual(render_student_chart(self.series, 1, 'Student 1'), first)
+
+    def test_concurrent_renders_match_serial_renders(self):
+        # Lazy rendering runs in request threads, which must not draw on each other's figure
+        jobs = [(self.series[:2 + i % 4], f'Student {i}') for i in range(40)]
+        expected = [render_student_chart(series, 1, name) for series, name in jobs]
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            charts = list(executor.map(lambda job: render_student_chart(job[0], 1, job[1]), jobs))
+        self.assertEqual(charts, expected)
+
+    def test_empty_series_has_no_chart(self):
+        self.assertIsNone(render_student_chart([], 1, 'Student 1'))
+
+    def test_single_worker_falls_back_to_serial(self):
+        jobs = [(1, 'Student 1', self.series), (2, 'Student 2', self.series)]
+        self.assertIsNone(render_student_charts_parallel(jobs, 1, workers=1))
+
+    def test_pool_renders_every_student(self):
+        jobs = [(1, 'Student 1', self.series), (2, 'Student 2', [])]
+        charts = render_student_charts_parallel(jobs, 1, workers=2)
+        self.assertTrue(charts[1].startswith(b'\x89PNG'))
+        self.assertIsNone(charts[2])
+
+class AccumulatorReportTest(ReportFixturesMixin, APITestCase):
+    def setUp(self):
+        self.instructor = self.create_instructor()
+        self.student1 = self.create_student('student1@example.com', 'Student 1')
+        self.student2 = self.create_student('student2@example.com', 'Student 2')
+        self.classroom = self.create_classroom(self.instructor, [self.student1, self.student2])
+        self.session = self.create_session(self.classroom)
+        start = timezone.now().replace(second=0, microsecond=0)
+        samples = [
+            (self.session.id, self.student1.id, start, 0.9),
+            (self.session.id, self.student1.id, start + timezone.timedelta(seconds=65), 0.5),
+            (self.session.id, self.student2.id, start + timezone.timedelta(seconds=10), 0.4),
+        ]
+        write_focus_batch({(s, st): score for s, st, _, score in samples}, samples)
+
+    def test_report_from_accumulators_matches_samples(self):
+        from_accumulators = generate_session_report(self.session.id)
+        instructor_data = from_accumulators['instructor_report'].focus_data_json
+        student_data = {r.user_id: (r.avg_focus_score, r.focus_data_json) for r in from_accumulators['student_reports']}
+
+        FocusAccumulator.objects.all().delete()
+        from_samples = generate_session_report(self.session.id)
+        self.assertEqual(from_samples['instructor_report'].focus_data_json, instructor_data)
+        self.assertEqual(
+            {r.user_id: (r.avg_focus_score, r.focus_data_json) for r in from_samples['student_reports']},
+            student_data
+        )
+
+    def test_report_reads_accumulators_not_samples(self):
+        with CaptureQueriesContext(connection) as ctx:
+            generate_session_report(self.session.id)
+        self.assertFalse(any('performance_focussample' in query['sql'] for query in ctx.captured_queries))
+
+    def test_live_report_for_instructor_and_student(self):
+        self.client.force_authenticate(user=self.instructor)
+        response = self.client.get(f'/api/reports/live/?session={self.session.id}')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.data['provisional'])
+        self.assertEqual(response.data['sample_count'], 3)
+        self.assertEqual(response.data['overall_avg_focus'], 0.6)
+        self.assertEqual(len(response.data['students']), 2)
+
+        self.client.force_authenticate(user=self.student2)
+        response = self.client.get(f'/api/reports/live/?session={self.session.id}')
+        self.assertEqual(response.data['student']['avg_focus'], 0.4)
+        self.assertNotIn('students', response.data)
+
+    def test_live_report_requires_session_access(self):
+        outsider = self.create_student('outsider@example.com', 'Outsider')
+        self.client.force_authenticate(user=outsider)
+        response = self.client.get(f'/api/reports/live/?session={self.session.id}')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+class FocusAnalyticsTest(ReportFixturesMixin, TestCase):
+    def analytics(self, rows, **kwargs):
+        student_ids, seconds, scores, resolutions = (np.array(column, dtype=float) for column in zip(*rows))
+        return compute_focus_analytics(student_ids.astype(np.int64), seconds, scores, resolutions, **kwargs)
+
+    def test_distribution_and_threshold_metrics(self):
+        # Student 1 is focused for 3 seconds, drops, recovers after a disconnect
+        rows = [(1, t, score, 1) for t, score in [(0, 0.9), (1, 0.8), (2, 0.7), (3, 0.2), (4, 0.9), (10, 0.9), (11, 0.9)]]
+        rows.append((2, 0, 0.4, 1))
+        result = self.analytics(rows, threshold=0.6, window_minutes=5)
+
+        student = result['students']['1']
+        self.assertEqual(student['samples'], 7)
+        self.assertEqual(student['p50'], 0.9)
+        self.assertEqual(student['p10'], 0.5)
+        self.assertEqual(student['time_above_threshold_s'], 6.0)
+        self.assertEqual(student['time_above_threshold_pct'], 85.7)
+        self.assertEqual(student['longest_streak_s'], 3.0)
+        self.assertEqual(student['focus_drops'], 1)
+        self.assertEqual(result['students']['2']['std'], 0.0)
+        self.assertEqual(result['students']['2']['longest_streak_s'], 0.0)
+        self.assertEqual(result['class']['samples'], 8)
+        self.assertEqual(result['class']['mean'], 0.713)
+
+    def test_rolling_windows_and_dips(self):
+        # One sample per minute: a steady class with a two-minute slump
+        levels = [0.8, 0.8, 0.8, 0.2, 0.2, 0.8, 0.8, 0.8]
+        rows = [(student, minute * 60, level, 60) for minute, level in enumerate(levels) for student in (1, 2)]
+        result = self.analytics(rows, threshold=0.6, window_minutes=2)
+
+        self.assertEqual([point['avg_focus'] for point in result['class']['rolling']],
+                         [0.8, 0.8, 0.8, 0.5, 0.2, 0.5, 0.8, 0.8])
+        self.assertEqual(len(result['class']['dips']), 1)
+        self.assertEqual(result['class']['dips'][0]['minutes'], 2)
+        self.assertEqual(result['students']['1']['best_window_avg'], 0.8)
+        self.assertEqual(result['students']['1']['worst_window_avg'], 0.2)
+
+    def test_report_metadata_includes_analytics(self):
+        instructor = self.create_instructor()
+        student = self.create_student()
+        session = self.create_session(self.create_classroom(instructor, [student]))
+        start = timezone.now()
+        samples = [(session.id, student.id, start + timezone.timedelta(seconds=i), 0.7) for i in range(3)]
+        write_focus_batch({(session.id, student.id): 0.7}, samples)
+
+        generate_session_report(session.id)
+        self.assertNotIn('analytics', Report.objects.get(user=instructor).metadata)
+
+        # One bulk fetch of the samples; the reports are written back in bulk
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(update_session_analytics(session.id), 2)
+        self.assertEqual(sum('performance_focussample' in query['sql'] for query in ctx.captured_queries), 1)
+        instructor_analytics = Report.objects.get(user=instructor).metadata['analytics']
+        self.assertEqual(instructor_analytics['students'][str(student.id)]['samples'], 3)
+        self.assertIn('rolling', instructor_analytics['class'])
+        student_metadata = Report.objects.get(user=student).metadata
+        self.assertTrue(student_metadata['attended'])
+        self.assertEqual(student_metadata['analytics']['student']['time_above_threshold_pct'], 100.0)
+        self.assertNotIn('rolling', student_metadata['analytics']['class'])
+
 class ReportTasksTest(TestCase):
     @patch('reports.tasks.generate_session_report_task.delay')
     def setUp(self, mock_delay):
@@ -104,8 +981,197 @@ class ReportTasksTest(TestCase):
         self.classroom = Classroom.objects.create(name='Test Class', instructor=self.instructor)
         self.session = Session.objects.create(classroom=self.classroom, start_time=timezone.now())
 
+    @patch('reports.tasks.compute_session_analytics_task.delay')
     @patch('reports.tasks.generate_session_report')
-    def test_generate_session_report_task(self, mock_generate_report):
+    def test_generate_session_report_task(self, mock_generate_report, mock_analytics_delay):
         mock_generate_report.return_value = {'instructor_report': MagicMock(), 'student_reports': []}
         generate_session_report_task(self.session.id)
-        mock_generate_report.assert_called_once_with(self.session.id)
+        mock_generate_report.assert_called_once_with(self.session.id, timings={})
+        mock_analytics_delay.assert_called_once_with(self.session.id)
+
+    @patch('reports.tasks.compute_session_analytics_task.delay', side_effect=ConnectionError('broker down'))
+    @patch('reports.tasks.send_to_session_group', side_effect=ConnectionError('layer down'))
+    @patch('reports.tasks.generate_session_report')
+    def test_follow_up_errors_leave_finished_job_done(self, mock_generate_report, mock_send, mock_analytics_delay):
+        mock_generate_report.return_value = {'instructor_report': MagicMock(), 'student_reports': []}
+        self.session.end_time = timezone.now()
+        with patch('reports.tasks.generate_session_report_task.delay'), \
+                self.captureOnCommitCallbacks(execute=True):
+            self.session.save()
+
+        result = generate_session_report_task.apply(args=(self.session.id, 1))
+        self.assertIs(result.result, True)
+        mock_generate_report.assert_called_once()
+        mock_analytics_delay.assert_called_once_with(self.session.id)
+        job = ReportJob.objects.get(session=self.session, report_version=1)
+        self.assertEqual(job.status, ReportJob.DONE)
+        self.assertEqual(job.error, '')
+
+    @patch('reports.tasks.compute_session_analytics_task.delay')
+    @patch('reports.tasks.generate_session_report')
+    @patch('reports.tasks.generate_session_report_task.delay')
+    def test_superseded_report_version_is_skipped(self, mock_delay, mock_generate_report, mock_analytics_delay):
+        self.session.end_time = timezone.now()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.session.save()
+            request_session_report(self.session.id, force=True)
+        self.assertEqual([c.args for c in mock_delay.call_args_list], [(self.session.id, 1), (self.session.id, 2)])
+
+        self.assertFalse(generate_session_report_task(self.session.id, 1))
+        mock_generate_report.assert_not_called()
+        generate_session_report_task(self.session.id, 2)
+        mock_generate_report.assert_called_once_with(self.session.id, timings={})
+        self.assertEqual(
+            dict(ReportJob.objects.filter(session=self.session).values_list('report_version', 'status')),
+            {1: ReportJob.SUPERSEDED, 2: ReportJob.DONE}
+        )
+
+    @patch('reports.tasks.generate_session_report', side_effect=RuntimeError('chart backend down'))
+    @patch('reports.tasks.generate_session_report_task.delay')
+    def test_pipeline_errors_are_retried_and_recorded(self, mock_delay, mock_generate_report):
+        self.session.end_time = timezone.now()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.session.save()
+
+        # Eager retries run immediately, so every attempt happens here
+        result = generate_session_report_task.apply(args=(self.session.id, 1))
+        self.assertIsInstance(result.result, RuntimeError)
+        self.assertEqual(mock_generate_report.call_count, generate_session_report_task.max_retries + 1)
+        job = ReportJob.objects.get(session=self.session, report_version=1)
+        self.assertEqual(job.status, ReportJob.FAILED)
+        self.assertEqual(job.error, 'RuntimeError: chart backend down')
+
+    def test_pipeline_errors_propagate(self):
+        timings = {}
+        with patch.object(Performance.objects, 'filter', side_effect=RuntimeError('boom')):
+            with self.assertRaises(RuntimeError):
+                generate_session_report(self.session.id, timings=timings)
+        # Stages that ran before the failure are still reported
+        self.assertIn('load', timings)
+
+    @patch('reports.tasks.generate_session_report_task.delay')
+    def test_cleanup_deletes_in_batches_with_chart_files(self, mock_delay):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        student = User.objects.create_user(
+            email='student@example.com', password='password123', full_name='Student', role='student')
+        with override_settings(MEDIA_ROOT=media_root):
+            paths = []
+            for i in range(5):
+                session = Session.objects.create(classroom=self.classroom, start_time=timezone.now())
+                report = Report(
+                    session=session, user=student, report_type='student', attendance_status=100,
+                    avg_focus_score=0.5, focus_data_json=[], duration_seconds=60)
+                report.chart_image.save(f'chart_{i}.png', ContentFile(b'png'), save=False)
+                report.save()
+                paths.append(report.chart_image.path)
+            Report.objects.update(generated_at=timezone.now() - timezone.timedelta(days=40))
+            kept = Report.objects.create(
+                session=self.session, user=student, report_type='student', attendance_status=100,
+                avg_focus_score=0.5, focus_data_json=[], duration_seconds=60)
+
+            metrics = cleanup_old_reports(days=30, batch_size=2, pause=0)
+
+        self.assertEqual(metrics['batches'], 3)
+        self.assertEqual(metrics['reports_deleted'], 5)
+        self.assertEqual(metrics['charts_deleted'], 5)
+        self.assertFalse(any(os.path.exists(path) for path in paths))
+        self.assertEqual(list(Report.objects.values_list('id', flat=True)), [kept.id])
+
+class BackfillReportsCommandTest(ReportFixturesMixin, TestCase):
+    def setUp(self):
+        instructor = self.create_instructor()
+        self.student = self.create_student()
+        self.classroom = self.create_classroom(instructor, [self.student], join_code='backfill1')
+        other_classroom = self.create_classroom(instructor, name='Other Class', join_code='backfill2')
+        start = timezone.make_aware(timezone.datetime(2026, 3, 10, 9))
+        self.sessions = []
+        for classroom, days in ((self.classroom, 0), (self.classroom, 1), (self.classroom, 5), (other_classroom, 0)):
+            session_start = start + timezone.timedelta(days=days)
+            session = self.create_session(
+                classroom, start_time=session_start, end_time=session_start + timezone.timedelta(hours=1),
+                is_active=False)
+            Performance.objects.create(session=session, student=self.student, focus_score=0.7, attended=True)
+            self.sessions.append(session)
+        self.checkpoint = os.path.join(tempfile.mkdtemp(), 'backfill.json')
+        self.addCleanup(shutil.rmtree, os.path.dirname(self.checkpoint), ignore_errors=True)
+
+    def backfill(self, *args):
+        out = StringIO()
+        call_command('backfill_reports', '--workers', '1', '--checkpoint', self.checkpoint, *args, stdout=out)
+        return out.getvalue()
+
+    def test_regenerates_selected_sessions_and_resumes(self):
+        output = self.backfill('--classroom', str(self.classroom.id), '--since', '2026-03-10', '--until', '2026-03-11')
+        self.assertIn('2 sessions to regenerate', output)
+        self.assertIn('2 regenerated, 0 failed', output)
+        self.assertEqual(
+            set(Report.objects.filter(user=self.student).values_list('session_id', flat=True)),
+            {self.sessions[0].id, self.sessions[1].id}
+        )
+        with open(self.checkpoint) as handle:
+            self.assertEqual(json.load(handle)['done'], [self.sessions[0].id, self.sessions[1].id])
+        # Each run is a report version of its own, after the one queued when the session ended
+        self.assertEqual(
+            list(ReportJob.objects.filter(session__in=self.sessions[:2], report_version=2).values_list('status', flat=True)),
+            [ReportJob.DONE, ReportJob.DONE]
+        )
+
+        # A rerun over a wider range skips what the checkpoint already has
+        with patch('reports.tasks.generate_session_report', wraps=generate_session_report) as generate:
+            output = self.backfill('--classroom', str(self.classroom.id))
+        self.assertIn('1 sessions to regenerate (2 already done per checkpoint)', output)
+        generate.assert_called_once_with(self.sessions[2].id, timings=ANY)
+
+    def test_failed_sessions_are_recorded_and_retried_on_request(self):
+        Performance.objects.filter(session=self.sessions[3]).delete()
+        output = self.backfill('--classroom', str(self.sessions[3].classroom_id))
+        self.assertIn('0 regenerated, 1 failed', output)
+        self.assertIn('0 sessions to regenerate', self.backfill('--classroom', str(self.sessions[3].classroom_id)))
+        self.assertIn('1 sessions to regenerate',
+                      self.backfill('--classroom', str(self.sessions[3].classroom_id), '--retry-failed'))
+
+    def test_dry_run_and_celery_batches(self):
+        self.assertIn('4 sessions to regenerate', self.backfill('--dry-run'))
+        self.assertFalse(Report.objects.exists())
+
+        jobs = ReportJob.objects.count()
+        with patch('reports.tasks.generate_session_report_task.delay') as delay, \
+                self.captureOnCommitCallbacks(execute=True):
+            output = self.backfill('--celery', '--batch-size', '3')
+        self.assertIn('Queued 3/4 sessions', output)
+        self.assertIn('4 queued, 0 failed', output)
+        self.assertEqual(delay.call_count, 4)
+        self.assertEqual(ReportJob.objects.count(), jobs + 4)
+
+        # Queued sessions are neither done nor requeued until their jobs finish
+        with open(self.checkpoint) as handle:
+            data = json.load(handle)
+        self.assertEqual((data['done'], len(data['queued'])), ([], 4))
+        self.assertIn('0 sessions to regenerate (0 already done, 4 still queued per checkpoint)',
+                      self.backfill('--dry-run'))
+        for session, status_ in ((self.sessions[0], ReportJob.DONE), (self.sessions[1], ReportJob.FAILED)):
+            ReportJob.objects.filter(
+                session=session, report_version=data['queued'][str(session.id)]).update(status=status_)
+        self.assertIn('0 sessions to regenerate (1 already done, 2 still queued per checkpoint)',
+                      self.backfill('--dry-run'))
+        self.assertIn('1 sessions to regenerate (1 already done, 2 still queued per checkpoint)',
+                      self.backfill('--dry-run', '--retry-failed'))
+
+    @patch('reports.tasks.is_current_version', return_value=False)
+    def test_superseded_sessions_wait_for_the_newer_job(self, mock_current):
+        output = self.backfill('--classroom', str(self.sessions[3].classroom_id))
+        self.assertIn('0 regenerated, 0 failed, 1 superseded by newer requests', output)
+        job = ReportJob.objects.get(session=self.sessions[3], status=ReportJob.SUPERSEDED)
+        self.assertFalse(Report.objects.filter(session=self.sessions[3]).exists())
+
+        # The newer request's job decides the checkpoint outcome
+        ReportJob.objects.create(session=self.sessions[3], report_version=job.report_version + 1, status=ReportJob.DONE)
+        self.assertIn('0 sessions to regenerate (1 already done per checkpoint)',
+                      self.backfill('--classroom', str(self.sessions[3].classroom_id)))
+
+    def test_spawned_workers_set_up_django(self):
+        # Platforms without fork start backfill workers from a fresh interpreter
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=1, mp_context=context, initializer=init_worker) as executor:
+            self.assertTrue(executor.submit(apps_ready).result(timeout=60))
@@ -1,10 +1,13 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
-from .views import ReportViewSet
+from .views import ReportViewSet, ReportJobViewSet, ReportMetricsView
 
 router = DefaultRouter()
 router.register(r'reports', ReportViewSet, basename='report')
+router.register(r'report-jobs', ReportJobViewSet, basename='report-job')
 
 urlpatterns = [
+    # Ahead of the router, whose detail route would otherwise match it
+    path('reports/metrics/', ReportMetricsView.as_view(), name='report-metrics'),
     path('', include(router.urls)),
 ]
\ No newline at end of file
@@ -2,401 +2,265 @@ import json
 import logging
 from datetime import timedelta
 from django.utils import timezone
+from django.db import transaction
 from django.db.models import Avg, Count, F, Window
 from django.db.models.functions import TruncMinute
 from .models import Report
 from session.models import Session
-from performance.models import Performance
+from performance.models import Performance, FocusSample, FocusAccumulator, FocusMinuteBucket
+from performance.utils import summarize_focus_accumulators
 from users.models import User
 from classrooms.models import Enrollment
-import pandas as pd
-from io import BytesIO
-import matplotlib.pyplot as plt
-import seaborn as sns
-from django.core.files.base import ContentFile
+from django.conf import settings
+from .cache import invalidate_on_commit
+from .instrumentation import report_run, current_report_run, stage
+from .series import encode_series, decode_series
+from .artifacts import chart_input_hash, find_artifacts, store_artifact, get_or_render_artifact, attach_artifact
+from .charts import render_class_chart, render_student_chart, render_student_charts_parallel
 
 logger = logging.getLogger(__name__)
 
-import json
-import logging
-from datetime import timedelta
-from django.utils import timezone
-from django.db.models import Avg, Count, F, Window
-from django.db.models.functions import TruncMinute
-from .models import Report
-from session.models import Session
-from performance.models import Performance
-from users.models import User
-from classrooms.models import Enrollment
-import pandas as pd
-from io import BytesIO
-import matplotlib.pyplot as plt
-import seaborn as sns
-from django.core.files.base import ContentFile
+# Columns refreshed when a report for the same (session, user, report_type) already exists
+REPORT_UPSERT_FIELDS = [
+    'attendance_status', 'avg_focus_score', 'focus_data_json', 'duration_seconds',
+    'chart_image', 'chart_artifact', 'chart_accessed_at', 'metadata', 'generated_at',
+]
+REPORT_BULK_BATCH_SIZE = 500
 
-logger = logging.getLogger(__name__)
+def generate_session_report(session_id, timings=None):
+    """
+    Generate a comprehensive report for a session.
+    Each stage's wall time, query count and rows processed are kept in the
+    instructor report's metadata; pass a dict as `timings` to also collect
+    per-stage seconds, including those of a run that fails.
+    Returns None if the session has no performance data. Errors, including
+    Session.DoesNotExist, propagate so callers can retry and record them.
+    """
+    with report_run() as run:
+        try:
+            return _generate_session_report(session_id)
+        except Exception as e:
+            logger.error(f"Error generating report for session {session_id}: {str(e)}")
+            raise
+        finally:
+            if timings is not None:
+                timings.update(run.timings())
 
-def generate_session_report(session_id):
-    """
-    Generate a comprehensive report for a session
-    """
-    try:
-        session = Session.objects.get(id=session_id)
+def _generate_session_report(session_id):
+    with stage('load') as counts:
+        session = Session.objects.select_related('classroom__instructor').get(id=session_id)
+        if session.archived_at:
+            from .archive import rehydrate_session
+            rehydrate_session(session)
         performances = Performance.objects.filter(session=session)
         
         if not performances.exists():
             logger.warning(f"No performance data found for session {session_id}")
             return None
         
-        # Calculate session duration
+        # Every enrolled student with their name, in one query
+        enrolled_students = get_enrolled_students(session)
+        counts['rows'] = len(enrolled_students)
+    
+    with stage('duration'):
         duration = calculate_session_duration(session)
-        
-        # Calculate attendance metrics
-        attendance_metrics = calculate_attendance_metrics(session, performances)
-        
-        # Calculate focus metrics
-        focus_metrics = calculate_focus_metrics(performances)
-        
-        # Generate time-series focus data
-        time_series_data = generate_time_series_data(performances)
-        
-        # Create reports for instructor and each student
-        instructor_report = create_instructor_report(
-            session, duration, attendance_metrics, focus_metrics, time_series_data
-        )
-        
-        student_reports = create_student_reports(
-            session, duration, attendance_metrics, focus_metrics, time_series_data
-        )
-        
-        logger.info(f"Generated report for session {session_id}")
-        return {
-            'instructor_report': instructor_report,
-            'student_reports': student_reports
-        }
-        
-    except Session.DoesNotExist:
-        logger.error(f"Session {session_id} does not exist")
-        return None
-    except Exception as e:
-        logger.error(f"Error generating report for session {session_id}: {str(e)}")
-        return None
-
-def calculate_session_duration(session):
-    """
-    Calculate the duration of a session
-    """
-    if session.end_time:
-        duration = session.end_time - session.start_time
-        return {
-            'start_time': session.start_time,
-            'end_time': session.end_time,
-            'duration_seconds': duration.total_seconds(),
-            'duration_formatted': str(duration)
-        }
-    else:
-        # If session hasn't ended, use current time
-        now = timezone.now()
-        duration = now - session.start_time
-        return {
-            'start_time': session.start_time,
-            'end_time': now,
-            'duration_seconds': duration.total_seconds(),
-            'duration_formatted': str(duration)
-        }
-
-def calculate_attendance_metrics(session, performances):
-    """
-    Calculate attendance metrics for a session
-    """
-    # Get all enrolled students
-    enrolled_students = Enrollment.objects.filter(
-        classroom=session.classroom
-    ).values_list('student_id', flat=True)
     
-    # Get students who attended
-    attended_students = performances.filter(
-        attended=True
-    ).values_list('student_id', flat=True).distinct()
+    with stage('attendance') as counts:
+        attendance_metrics = calculate_attendance_metrics(session, performances, enrolled_students)
+        counts['rows'] = len(attendance_metrics['student_attendance'])
     
-    # Calculate attendance percentage
-    total_students = len(enrolled_students)
-    present_students = len(attended_students)
-    attendance_percentage = (present_students / total_students * 100) if total_students > 0 else 0
+    focus_source, focus_metrics, time_series_data, student_series = aggregate_session_focus(
+        session, performances
+    )
     
-    # Create attendance status per student
-    student_attendance = []
-    for student_id in enrolled_students:
-        student = User.objects.get(id=student_id)
-        attended = student_id in attended_students
-        student_attendance.append({
-            'student_id': student_id,
-            'student_name': student.full_name,
-            'attended': attended
-        })
+    # Create reports for instructor and each student; the whole session is
+    # written in one transaction so a regeneration replaces it atomically
+    with transaction.atomic():
+        with stage('instructor_report') as counts:
+            instructor_report = create_instructor_report(
+                session, duration, attendance_metrics, focus_metrics, time_series_data
+            )
+            counts['rows'] = 1
+        
+        with stage('student_reports') as counts:
+            student_reports = create_student_reports(
+                session, duration, attendance_metrics, focus_metrics, time_series_data, focus_source,
+                enrolled_students, student_series
+            )
+            counts['rows'] = len(student_reports)
+        
+        # Every stage has run now, including the writes themselves
+        run = current_report_run()
+        if run is not None:
+            instructor_report.metadata['instrumentation'] = run.as_dict()
+            Report.objects.filter(pk=instructor_report.pk).update(metadata=instructor_report.metadata)
     
+    logger.info(f"Generated report for session {session_id}")
     return {
-        'total_students': total_students,
-        'present_students': present_students,
-        'attendance_percentage': round(attendance_percentage, 2),
-        'student_attendance': student_attendance
+        'instructor_report': instructor_report,
+        'student_reports': student_reports
     }
 
-def calculate_focus_metrics(performances):
-    """
-    Calculate focus metrics for a session
-    """
-    # Calculate average focus score per student
-    student_focus = performances.values('student').annotate(
-        avg_focus=Avg('focus_score'),
-        focus_count=Count('focus_score')
-    ).order_by('student')
-    
-    # Add student names
-    for entry in student_focus:
-        student = User.objects.get(id=entry['student'])
-        entry['student_name'] = student.full_name
-    
-    # Calculate overall average focus
-    overall_avg_focus = performances.aggregate(
-        avg_focus=Avg('focus_score')
-    )['avg_focus'] or 0
-    
-    return {
-        'overall_avg_focus': round(overall_avg_focus, 2),
-        'student_focus': list(student_focus)
-    }
+def update_session_analytics(session_id):
+    """
+    Add distribution, streak and rolling-window statistics from the raw
+    samples to a session's existing reports. Runs as its own task after
+    the report, so the one full scan of the samples stays off the
+    end-of-session path. Returns the number of reports updated.
+    """
+    session = Session.objects.get(id=session_id)
+    with stage('analytics') as counts:
+        # numpy is only loaded by processes that actually compute analytics
+        from .analytics import session_focus_analytics
+        analytics = session_focus_analytics(session)
+        counts['rows'] = analytics['class']['samples'] if analytics else 0
+    if analytics is None:
+        return 0
 
-def generate_time_series_data(performances):
-    """
-    Generate time-series data for focus scores
-    """
-    # Group by minute to create time-series data
-    time_series = performances.annotate(
-        time_bucket=TruncMinute('timestamp')
-    ).values('time_bucket').annotate(
-        avg_focus=Avg('focus_score'),
-        student_count=Count('student', distinct=True)
-    ).order_by('time_bucket')
-    
-    # Convert to list of dictionaries for JSON serialization
-    time_series_data = []
-    for entry in time_series:
-        time_series_data.append({
-            'timestamp': entry['time_bucket'].isoformat(),
-            'avg_focus': round(entry['avg_focus'], 2) if entry['avg_focus'] else 0,
-            'student_count': entry['student_count']
-        })
-    
-    return time_series_data
+    # Students get their own statistics next to the class summary, without
+    # the class-wide rolling series and dips
+    class_analytics = {
+        key: value for key, value in analytics['class'].items() if key not in ('rolling', 'dips')
+    }
+    with transaction.atomic():
+        # Locked and re-read so a regeneration committing meanwhile keeps its metadata
+        reports = list(Report.objects.select_for_update().filter(session_id=session_id).only(
+            'id', 'user_id', 'report_type', 'metadata'
+        ))
+        for report in reports:
+            if report.report_type == 'instructor':
+                report.metadata['analytics'] = analytics
+            elif str(report.user_id) in analytics['students']:
+                report.metadata['analytics'] = {
+                    'threshold': analytics['threshold'],
+                    'window_minutes': analytics['window_minutes'],
+                    'student': analytics['students'][str(report.user_id)],
+                    'class': class_analytics,
+                }
+        Report.objects.bulk_update(reports, ['metadata'], batch_size=REPORT_BULK_BATCH_SIZE)
+        invalidate_on_commit(report.user_id for report in reports)
+    return len(reports)
 
-def create_instructor_report(session, duration, attendance_metrics, focus_metrics, time_series_data):
-    """
-    Create a comprehensive report for the instructor
-    """
-    # Generate visualization
-    chart_image = generate_focus_chart(time_series_data, session.id)
+def aggregate_session_focus(session, performances):
+    """
+    Return (focus_source, focus_metrics, time_series_data, student_series) for a session
+    """
+    with stage('focus') as counts:
+        # Sessions streamed over WebSocket keep running accumulators, so the
+        # report only reads their finished totals
+        focus_summary = get_focus_summary(session)
+        if focus_summary:
+            focus_source = None
+            focus_metrics = focus_metrics_from_summary(focus_summary)
+            counts['rows'] = focus_summary['sample_count']
+        else:
+            # Prefer the append-only sample series; sessions recorded before it
+            # existed only have the single Performance row per student
+            focus_source = get_focus_source(session, performances)
+            
+            # Calculate focus metrics
+            focus_metrics = calculate_focus_metrics(focus_source)
+            counts['rows'] = sum(entry['focus_count'] for entry in focus_metrics['student_focus'])
     
-    # Create the report
-    report = Report.objects.create(
-        session=session,
-        user=session.classroom.instructor,
-        report_type='instructor',
-        attendance_status=attendance_metrics['attendance_percentage'],
-        avg_focus_score=focus_metrics['overall_avg_focus'],
-        focus_data_json=time_series_data,
-        duration_seconds=duration['duration_seconds'],
-        metadata={
-            'duration': duration,
-            'attendance_metrics': attendance_metrics,
-            'focus_metrics': focus_metrics,
-            'generated_at': timezone.now().isoformat()
-        }
-    )
-    
-    # Attach the chart image if generated
-    if chart_image:
-        report.chart_image.save(
-            f"focus_chart_session_{session.id}.png",
-            ContentFile(chart_image),
-            save=True
-        )
-    
-    return report
+    with stage('time_series') as counts:
+        if focus_summary:
+            time_series_data = focus_summary['time_series']
+            student_series = {
+                student_id: student['time_series']
+                for student_id, student in focus_summary['students'].items()
+            }
+        else:
+            # Generate time-series focus data
+            time_series_data = generate_time_series_data(focus_source)
+            student_series = None
+        counts['rows'] = len(time_series_data)
+    return focus_source, focus_metrics, time_series_data, student_series
 
-def create_student_reports(session, duration, attendance_metrics, focus_metrics, time_series_data):
+def get_focus_source(session, performances):
     """
-    Create individual reports for each student
+    Return the queryset focus statistics should be computed from
     """
-    student_reports = []
-    
-    # Get all students who were enrolled in the class
-    enrolled_students = Enrollment.objects.filter(classroom=session.classroom)
-    
-    for enrollment in enrolled_students:
-        student = enrollment.student
-        
-        # Check if student attended
-        attended = any(
-            sa['student_id'] == student.id and sa['attended'] 
-            for sa in attendance_metrics['student_attendance']
-        )
-        
-        if not attended:
-            # Create a minimal report for absent students
-            report = Report.objects.create(
-                session=session,
-                user=student,
-                report_type='student',
-                attendance_status=0,  # 0% attendance
-                avg_focus_score=0,
-                focus_data_json=[],
-                duration_seconds=duration['duration_seconds'],
-                metadata={
-                    'duration': duration,
-                    'attended': False,
-                    'generated_at': timezone.now().isoformat()
-                }
-            )
-            student_reports.append(report)
-            continue
-        
-        # Get student's focus data
-        student_performances = Performance.objects.filter(
-            session=session, 
-            student=student
-        )
-        
-        student_avg_focus = student_performances.aggregate(
-            avg_focus=Avg('focus_score')
-        )['avg_focus'] or 0
-        
-        # Generate student-specific time series data
-        student_time_series = student_performances.annotate(
-            time_bucket=TruncMinute('timestamp')
-        ).values('time_bucket').annotate(
-            avg_focus=Avg('focus_score')
-        ).order_by('time_bucket')
-        
-        student_time_series_data = []
-        for entry in student_time_series:
-            student_time_series_data.append({
-                'timestamp': entry['time_bucket'].isoformat(),
-                'avg_focus': round(entry['avg_focus'], 2) if entry['avg_focus'] else 0
-            })
-        
-        # Generate student-specific chart
-        student_chart_image = generate_student_focus_chart(
-            student_time_series_data, session.id, student.id
-        )
-        
-        # Create the report
-        report = Report.objects.create(
-            session=session,
-            user=student,
-            report_type='student',
-            attendance_status=100,  # 100% since they attended
-            avg_focus_score=round(student_avg_focus, 2),
-            focus_data_json=student_time_series_data,
-            duration_seconds=duration['duration_seconds'],
-            metadata={
-                'duration': duration,
-                'attended': True,
-                'class_avg_focus': focus_metrics['overall_avg_focus'],
-                'generated_at': timezone.now().isoformat()
-            }
-        )
-        
-        # Attach the chart image if generated
-        if student_chart_image:
-            report.chart_image.save(
-                f"focus_chart_session_{session.id}_student_{student.id}.png",
-                ContentFile(student_chart_image),
-                save=True
-            )
-        
-        student_reports.append(report)
-    
-    return student_reports
+    samples = FocusSample.objects.filter(session=session)
+    if samples.exists():
+        return samples
+    return performances
 
-def generate_focus_chart(time_series_data, session_id):
+def get_focus_summary(session):
     """
-    Generate a focus chart for the class
+    Merge the session's focus accumulators, or None if it has none
     """
-    try:
-        # Convert to DataFrame for easier plotting
-        df = pd.DataFrame(time_series_data)
-        df['timestamp'] = pd.to_datetime(df['timestamp'])
-        
-        # Create the plot
-        plt.figure(figsize=(10, 6))
-        sns.set_style("whitegrid")
-        
-        # Plot average focus over time
-        plt.plot(df['timestamp'], df['avg_focus'], marker='o', linewidth=2, markersize=4)
-        
-        # Add student count as secondary y-axis
-        ax2 = plt.gca().twinx()
-        ax2.plot(df['timestamp'], df['student_count'], 'r--', alpha=0.5, linewidth=1)
-        ax2.set_ylabel('Number of Students', color='r')
-        ax2.tick_params(axis='y', labelcolor='r')
-        
-        # Format the plot
-        plt.title(f'Class Focus Over Time - Session {session_id}')
-        plt.xlabel('Time')
-        plt.ylabel('Average Focus Score')
-        plt.xticks(rotation=45)
-        plt.tight_layout()
-        
-        # Save to bytes buffer
-        buffer = BytesIO()
-        plt.savefig(buffer, format='png', dpi=100)
-        buffer.seek(0)
-        image_data = buffer.getvalue()
-        buffer.close()
-        plt.close()
-        
-        return image_data
-    except Exception as e:
-        logger.error(f"Error generating focus chart: {str(e)}")
+    accumulators = list(FocusAccumulator.objects.filter(session=session).annotate(
+        student_name=F('student__full_name')
+    ))
+    if not accumulators:
+        return None
+    buckets = FocusMinuteBucket.objects.filter(session=session).values_list(
+        'student_id', 'minute', 'sample_count', 'score_sum'
+    )
+    summary = summarize_focus_accumulators(accumulators, buckets)
+    if not summary['sample_count']:
         return None
+    for accumulator in accumulators:
+        if accumulator.student_id in summary['students']:
+            summary['students'][accumulator.student_id]['student_name'] = accumulator.student_name
+    return summary
 
-def generate_student_focus_chart(time_series_data, session_id, student_id):
+def focus_metrics_from_summary(summary):
     """
-    Generate a focus chart for an individual student
+    Shape an accumulator summary like calculate_focus_metrics output
     """
-    try:
-        # Convert to DataFrame for easier plotting
-        df = pd.DataFrame(time_series_data)
-        df['timestamp'] = pd.to_datetime(df['timestamp'])
-        
-        # Create the plot
-        plt.figure(figsize=(10, 6))
-        sns.set_style("whitegrid")
-        
-        # Plot student's focus over time
-        plt.plot(df['timestamp'], df['avg_focus'], marker='o', linewidth=2, markersize=4, color='green')
-        
-        # Format the plot
-        student = User.objects.get(id=student_id)
-        plt.title(f'Focus Over Time - {student.full_name} - Session {session_id}')
-        plt.xlabel('Time')
-        plt.ylabel('Focus Score')
-        plt.xticks(rotation=45)
-        plt.tight_layout()
-        
-        # Save to bytes buffer
-        buffer = BytesIO()
-        plt.savefig(buffer, format='png', dpi=100)
-        buffer.seek(0)
-        image_data = buffer.getvalue()
-        buffer.close()
-        plt.close()
-        
-        return image_data
-    except Exception as e:
-        logger.error(f"Error generating student focus chart: {str(e)}")
-        return None
+    return {
+        'overall_avg_focus': round(summary['avg_focus'], 2),
+        'std_focus': round(summary['std_focus'], 2),
+        'min_focus': summary['min_focus'],
+        'max_focus': summary['max_focus'],
+        'student_focus': [
+            {
+                'student': student_id,
+                'student_name': student['student_name'],
+                'avg_focus': student['avg_focus'],
+                'focus_count': student['focus_count']
+            }
+            for student_id, student in sorted(summary['students'].items())
+        ]
+    }
+
+def build_live_report(session, user):
+    """
+    Provisional report for a session that is still running, read from the
+    focus accumulators. Instructors see the whole class; students see the
+    class averages and their own figures.
+    """
+    summary = get_focus_summary(session) or summarize_focus_accumulators([], [])
+    students = summary['students']
+    data = {
+        'session': session.id,
+        'provisional': session.is_active,
+        'generated_at': timezone.now().isoformat(),
+        'duration': calculate_session_duration(session),
+        'overall_avg_focus': round(summary['avg_focus'], 2),
+        'std_focus': round(summary['std_focus'], 2),
+        'min_focus': summary['min_focus'],
+        'max_focus': summary['max_focus'],
+        'sample_count': summary['sample_count'],
+        'student_count': len(students),
+        'time_series': summary['time_series'],
+    }
+    
+    def student_entry(student_id, student):
+        entry = {key: value for key, value in student.items() if key != 'time_series'}
+        entry['avg_focus'] = round(entry['avg_focus'], 2)
+        entry['std_focus'] = round(entry['std_focus'], 2)
+        return {'student': student_id, **entry, 'time_series': student['time_series']}
+    
+    if session.classroom.instructor_id == user.id:
+        data['students'] = [
+            student_entry(student_id, student) for student_id, student in sorted(students.items())
+        ]
+    else:
+        student = students.get(user.id)
+        data['student'] = student_entry(user.id, student) if student else None
+    return data
 
 def calculate_session_duration(session):
     """
@@ -421,19 +285,28 @@ def calculate_session_duration(session):
             'duration_formatted': str(duration)
         }
 
-def calculate_attendance_metrics(session, performances):
+def get_enrolled_students(session):
+    """
+    Return (student_id, full_name) pairs for everyone enrolled in the session's classroom
+    """
+    return list(
+        Enrollment.objects.filter(
+            classroom_id=session.classroom_id
+        ).values_list('student_id', 'student__full_name').order_by('student_id')
+    )
+
+def calculate_attendance_metrics(session, performances, enrolled_students=None):
     """
     Calculate attendance metrics for a session
     """
     # Get all enrolled students
-    enrolled_students = Enrollment.objects.filter(
-        classroom=session.classroom
-    ).values_list('student_id', flat=True)
+    if enrolled_students is None:
+        enrolled_students = get_enrolled_students(session)
     
     # Get students who attended
-    attended_students = performances.filter(
+    attended_students = set(performances.filter(
         attended=True
-    ).values_list('student_id', flat=True).distinct()
+    ).values_list('student_id', flat=True).distinct())
     
     # Calculate attendance percentage
     total_students = len(enrolled_students)
@@ -442,13 +315,11 @@ def calculate_attendance_metrics(session, performances):
     
     # Create attendance status per student
     student_attendance = []
-    for student_id in enrolled_students:
-        student = User.objects.get(id=student_id)
-        attended = student_id in attended_students
+    for student_id, student_name in enrolled_students:
         student_attendance.append({
             'student_id': student_id,
-            'student_name': student.full_name,
-            'attended': attended
+            'student_name': student_name,
+            'attended': student_id in attended_students
         })
     
     return {
@@ -462,25 +333,22 @@ def calculate_focus_metrics(performances):
     """
     Calculate focus metrics for a session
     """
-    # Calculate average focus score per student
-    student_focus = performances.values('student').annotate(
+    # Calculate average focus score per student, names joined in the same query
+    student_focus = list(performances.values(
+        'student', student_name=F('student__full_name')
+    ).annotate(
         avg_focus=Avg('focus_score'),
         focus_count=Count('focus_score')
-    ).order_by('student')
-    
-    # Add student names
-    for entry in student_focus:
-        student = User.objects.get(id=entry['student'])
-        entry['student_name'] = student.full_name
+    ).order_by('student'))
     
-    # Calculate overall average focus
-    overall_avg_focus = performances.aggregate(
-        avg_focus=Avg('focus_score')
-    )['avg_focus'] or 0
+    # Overall average weighted by sample count, same as averaging every row
+    total_count = sum(entry['focus_count'] for entry in student_focus)
+    total_focus = sum(entry['avg_focus'] * entry['focus_count'] for entry in student_focus)
+    overall_avg_focus = total_focus / total_count if total_count else 0
     
     return {
         'overall_avg_focus': round(overall_avg_focus, 2),
-        'student_focus': list(student_focus)
+        'student_focus': student_focus
     }
 
 def generate_time_series_data(performances):
@@ -506,63 +374,158 @@ def generate_time_series_data(performances):
     
     return time_series_data
 
+def render_report_chart(report):
+    """
+    Render a report's chart from its stored focus data and save it.
+    Runs in request threads; reports.charts keeps a figure per thread.
+    """
+    time_series_data = decode_series(report.focus_data_json)
+    if report.report_type == 'instructor':
+        input_hash = chart_input_hash('class', report.session_id, report.focus_data_json)
+        render = lambda: generate_focus_chart(time_series_data, report.session_id)
+    else:
+        student_name = report.user.full_name
+        input_hash = chart_input_hash('student', report.session_id, report.focus_data_json, student_name)
+        render = lambda: generate_student_focus_chart(
+            time_series_data, report.session_id, report.user_id, student_name
+        )
+    # Identical inputs, e.g. a regeneration with unchanged data, reuse the stored chart
+    artifact = get_or_render_artifact(input_hash, render)
+    if not artifact:
+        return None
+    attach_artifact(report, artifact)
+    report.chart_accessed_at = timezone.now()
+    report.save(update_fields=['chart_image', 'chart_artifact', 'chart_accessed_at'])
+    invalidate_on_commit([report.user_id])
+    return report.chart_image
+
+def get_report_chart(report):
+    """
+    Return the report's chart file, rendering it on first access
+    """
+    if not report.focus_data_json and report.session.archived_at:
+        # Rendered from the archived series; the row itself stays slim
+        from .archive import read_archived_report_blobs
+        blobs = read_archived_report_blobs(report)
+        if blobs:
+            report.focus_data_json = blobs[0]
+    if not report.focus_data_json:
+        return None
+    if report.chart_image and report.chart_image.storage.exists(report.chart_image.name):
+        report.chart_accessed_at = timezone.now()
+        Report.objects.filter(pk=report.pk).update(chart_accessed_at=report.chart_accessed_at)
+        return report.chart_image
+    return render_report_chart(report)
+
+def save_reports(reports):
+    """
+    Upsert reports on (session, user, report_type) in a single transaction
+    """
+    with transaction.atomic():
+        invalidate_on_commit(report.user_id for report in reports)
+        return Report.objects.bulk_create(
+            reports,
+            batch_size=REPORT_BULK_BATCH_SIZE,
+            update_conflicts=True,
+            unique_fields=['session', 'user', 'report_type'],
+            update_fields=REPORT_UPSERT_FIELDS,
+        )
+
 def create_instructor_report(session, duration, attendance_metrics, focus_metrics, time_series_data):
     """
     Create a comprehensive report for the instructor
     """
-    # Generate visualization
-    chart_image = generate_focus_chart(time_series_data, session.id)
+    focus_data = encode_series(time_series_data)
+    
+    # Generate visualization now only in eager mode; otherwise on first request
+    chart_artifact = None
+    if settings.REPORT_CHART_EAGER:
+        chart_artifact = get_or_render_artifact(
+            chart_input_hash('class', session.id, focus_data),
+            lambda: generate_focus_chart(decode_series(focus_data), session.id)
+        )
     
     # Create the report
-    report = Report.objects.create(
+    report = Report(
         session=session,
         user=session.classroom.instructor,
         report_type='instructor',
         attendance_status=attendance_metrics['attendance_percentage'],
         avg_focus_score=focus_metrics['overall_avg_focus'],
-        focus_data_json=time_series_data,
+        focus_data_json=focus_data,
         duration_seconds=duration['duration_seconds'],
         metadata={
             'duration': duration,
             'attendance_metrics': attendance_metrics,
             'focus_metrics': focus_metrics,
+            'report_version': session.report_version,
             'generated_at': timezone.now().isoformat()
         }
     )
-    
     # Attach the chart image if generated
-    if chart_image:
-        report.chart_image.save(
-            f"focus_chart_session_{session.id}.png",
-            ContentFile(chart_image),
-            save=True
-        )
+    attach_artifact(report, chart_artifact)
     
-    return report
+    return save_reports([report])[0]
+
+def generate_student_time_series(focus_source):
+    """
+    Generate per-minute focus series for every student with a single grouped query
+    """
+    time_series = focus_source.annotate(
+        time_bucket=TruncMinute('timestamp')
+    ).values('student_id', 'time_bucket').annotate(
+        avg_focus=Avg('focus_score')
+    ).order_by('student_id', 'time_bucket')
+    
+    student_series = {}
+    for entry in time_series:
+        student_series.setdefault(entry['student_id'], []).append({
+            'timestamp': entry['time_bucket'].isoformat(),
+            'avg_focus': round(entry['avg_focus'], 2) if entry['avg_focus'] else 0
+        })
+    return student_series
 
-def create_student_reports(session, duration, attendance_metrics, focus_metrics, time_series_data):
+def create_student_reports(session, duration, attendance_metrics, focus_metrics, time_series_data, focus_source=None,
+                           enrolled_students=None, student_series=None):
     """
     Create individual reports for each student
     """
     student_reports = []
     
     # Get all students who were enrolled in the class
-    enrolled_students = Enrollment.objects.filter(classroom=session.classroom)
+    if enrolled_students is None:
+        enrolled_students = get_enrolled_students(session)
     
-    for enrollment in enrolled_students:
-        student = enrollment.student
-        
+    # Everything below is computed in memory from these lookups
+    attended_ids = {
+        sa['student_id'] for sa in attendance_metrics['student_attendance'] if sa['attended']
+    }
+    student_avg_focus = {
+        entry['student']: entry['avg_focus'] for entry in focus_metrics['student_focus']
+    }
+    if student_series is None:
+        if focus_source is None:
+            focus_source = Performance.objects.filter(session=session)
+        student_series = generate_student_time_series(focus_source)
+    
+    # In eager mode render every attendee's chart up front so large classes can use the pool
+    student_charts = {}
+    if settings.REPORT_CHART_EAGER:
+        student_charts = generate_student_chart_artifacts([
+            (student_id, student_name, student_series.get(student_id, []))
+            for student_id, student_name in enrolled_students
+            if student_id in attended_ids
+        ], session.id)
+    
+    for student_id, student_name in enrolled_students:
         # Check if student attended
-        attended = any(
-            sa['student_id'] == student.id and sa['attended'] 
-            for sa in attendance_metrics['student_attendance']
-        )
+        attended = student_id in attended_ids
         
         if not attended:
             # Create a minimal report for absent students
-            report = Report.objects.create(
+            report = Report(
                 session=session,
-                user=student,
+                user_id=student_id,
                 report_type='student',
                 attendance_status=0,  # 0% attendance
                 avg_focus_score=0,
@@ -571,6 +534,7 @@ def create_student_reports(session, duration, attendance_metrics, focus_metrics,
                 metadata={
                     'duration': duration,
                     'attended': False,
+                    'report_version': session.report_version,
                     'generated_at': timezone.now().isoformat()
                 }
             )
@@ -578,138 +542,88 @@ def create_student_reports(session, duration, attendance_metrics, focus_metrics,
             continue
         
         # Get student's focus data
-        student_performances = Performance.objects.filter(
-            session=session, 
-            student=student
-        )
-        
-        student_avg_focus = student_performances.aggregate(
-            avg_focus=Avg('focus_score')
-        )['avg_focus'] or 0
-        
-        # Generate student-specific time series data
-        student_time_series = student_performances.annotate(
-            time_bucket=TruncMinute('timestamp')
-        ).values('time_bucket').annotate(
-            avg_focus=Avg('focus_score')
-        ).order_by('time_bucket')
-        
-        student_time_series_data = []
-        for entry in student_time_series:
-            student_time_series_data.append({
-                'timestamp': entry['time_bucket'].isoformat(),
-                'avg_focus': round(entry['avg_focus'], 2) if entry['avg_focus'] else 0
-            })
-        
-        # Generate student-specific chart
-        student_chart_image = generate_student_focus_chart(
-            student_time_series_data, session.id, student.id
-        )
+        student_time_series_data = student_series.get(student_id, [])
         
         # Create the report
-        report = Report.objects.create(
+        report = Report(
             session=session,
-            user=student,
+            user_id=student_id,
             report_type='student',
             attendance_status=100,  # 100% since they attended
-            avg_focus_score=round(student_avg_focus, 2),
-            focus_data_json=student_time_series_data,
+            avg_focus_score=round(student_avg_focus.get(student_id) or 0, 2),
+            focus_data_json=encode_series(student_time_series_data),
             duration_seconds=duration['duration_seconds'],
             metadata={
                 'duration': duration,
                 'attended': True,
                 'class_avg_focus': focus_metrics['overall_avg_focus'],
+                'report_version': session.report_version,
                 'generated_at': timezone.now().isoformat()
             }
         )
-        
         # Attach the chart image if generated
-        if student_chart_image:
-            report.chart_image.save(
-                f"focus_chart_session_{session.id}_student_{student.id}.png",
-                ContentFile(student_chart_image),
-                save=True
-            )
+        attach_artifact(report, student_charts.get(student_id))
         
         student_reports.append(report)
     
-    return student_reports
+    # One upsert for the whole class instead of a round trip per student
+    return save_reports(student_reports)
 
 def generate_focus_chart(time_series_data, session_id):
     """
     Generate a focus chart for the class
     """
     try:
-        # Convert to DataFrame for easier plotting
-        df = pd.DataFrame(time_series_data)
-        df['timestamp'] = pd.to_datetime(df['timestamp'])
-        
-        # Create the plot
-        plt.figure(figsize=(10, 6))
-        sns.set_style("whitegrid")
-        
-        # Plot average focus over time
-        plt.plot(df['timestamp'], df['avg_focus'], marker='o', linewidth=2, markersize=4)
-        
-        # Add student count as secondary y-axis
-        ax2 = plt.gca().twinx()
-        ax2.plot(df['timestamp'], df['student_count'], 'r--', alpha=0.5, linewidth=1)
-        ax2.set_ylabel('Number of Students', color='r')
-        ax2.tick_params(axis='y', labelcolor='r')
-        
-        # Format the plot
-        plt.title(f'Class Focus Over Time - Session {session_id}')
-        plt.xlabel('Time')
-        plt.ylabel('Average Focus Score')
-        plt.xticks(rotation=45)
-        plt.tight_layout()
-        
-        # Save to bytes buffer
-        buffer = BytesIO()
-        plt.savefig(buffer, format='png', dpi=100)
-        buffer.seek(0)
-        image_data = buffer.getvalue()
-        buffer.close()
-        plt.close()
-        
-        return image_data
+        return render_class_chart(time_series_data, session_id)
     except Exception as e:
         logger.error(f"Error generating focus chart: {str(e)}")
         return None
 
-def generate_student_focus_chart(time_series_data, session_id, student_id):
+def generate_student_focus_chart(time_series_data, session_id, student_id, student_name=None):
     """
     Generate a focus chart for an individual student
     """
     try:
-        # Convert to DataFrame for easier plotting
-        df = pd.DataFrame(time_series_data)
-        df['timestamp'] = pd.to_datetime(df['timestamp'])
-        
-        # Create the plot
-        plt.figure(figsize=(10, 6))
-        sns.set_style("whitegrid")
-        
-        # Plot student's focus over time
-        plt.plot(df['timestamp'], df['avg_focus'], marker='o', linewidth=2, markersize=4, color='green')
-        
-        # Format the plot
-        student = User.objects.get(id=student_id)
-        plt.title(f'Focus Over Time - {student.full_name} - Session {session_id}')
-        plt.xlabel('Time')
-        plt.ylabel('Focus Score')
-        plt.xticks(rotation=45)
-        plt.tight_layout()
-        
-        # Save to bytes buffer
-        buffer = BytesIO()
-        plt.savefig(buffer, format='png', dpi=100)
-        buffer.seek(0)
-        image_data = buffer.getvalue()
-        buffer.close()
-        plt.close()
-        
-        return image_data
+        if student_name is None:
+            student_name = User.objects.get(id=student_id).full_name
+        return render_student_chart(time_series_data, session_id, student_name)
     except Exception as e:
         logger.error(f"Error generating student focus chart: {str(e)}")
-        return None
\ No newline at end of file
+        return None
+
+def generate_student_focus_charts(chart_jobs, session_id):
+    """
+    Generate charts for many students, given (student_id, student_name, time_series_data) tuples.
+    Classes at or above REPORT_CHART_PARALLEL_THRESHOLD are rendered on a process pool.
+    """
+    if chart_jobs and len(chart_jobs) >= settings.REPORT_CHART_PARALLEL_THRESHOLD:
+        charts = render_student_charts_parallel(chart_jobs, session_id)
+        if charts is not None:
+            return charts
+    return {
+        student_id: generate_student_focus_chart(series, session_id, student_id, student_name)
+        for student_id, student_name, series in chart_jobs
+    }
+
+def generate_student_chart_artifacts(chart_jobs, session_id):
+    """
+    Chart artifacts for (student_id, student_name, time_series_data) tuples,
+    rendering only the charts whose inputs have no artifact yet
+    """
+    input_hashes = {
+        student_id: chart_input_hash('student', session_id, series, student_name)
+        for student_id, student_name, series in chart_jobs
+    }
+    artifacts = find_artifacts(input_hashes.values())
+    missing = [
+        (student_id, student_name, decode_series(encode_series(series)))
+        for student_id, student_name, series in chart_jobs
+        if input_hashes[student_id] not in artifacts
+    ]
+    with stage('chart_render') as counts:
+        charts = generate_student_focus_charts(missing, session_id)
+        counts['rows'] = len(missing)
+    for student_id, chart_image in charts.items():
+        if chart_image:
+            artifacts[input_hashes[student_id]] = store_artifact(input_hashes[student_id], chart_image)
+    return {student_id: artifacts.get(input_hash) for student_id, input_hash in input_hashes.items()}
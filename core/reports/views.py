@@ -1,47 +1,92 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
+from rest_framework.views import APIView
 from django_filters.rest_framework import DjangoFilterBackend
+from django.http import FileResponse, HttpResponse
 from django.utils import timezone
 from datetime import timedelta
-from .models import Report
-from .serializers import ReportSerializer, ReportSummarySerializer
-from .utils import generate_session_report
+from rest_framework.reverse import reverse
+from .models import Report, ReportJob
+from .serializers import ReportSerializer, ReportSummarySerializer, ReportJobSerializer
+from .utils import get_report_chart, build_live_report
+from .dispatch import request_report_regeneration
+from .cache import cached_report_response
+from .instrumentation import get_stage_metrics, render_prometheus
+from .filters import ReportFilter
+from .pagination import ReportKeysetPagination
 from session.models import Session
 
+# Actions that return many reports use the summary serializer and slim rows
+SUMMARY_ACTIONS = ('list', 'recent', 'by_session')
+SUMMARY_FIELDS = (
+    'id', 'session', 'report_type', 'attendance_status', 'avg_focus_score',
+    'duration_seconds', 'generated_at', 'session__classroom__name',
+)
+
+def summary_queryset(queryset):
+    """
+    Only the columns ReportSummarySerializer reads, with the classroom name
+    joined in; the JSON blobs stay in the database until the detail view
+    """
+    return queryset.select_related('session__classroom').only(*SUMMARY_FIELDS).order_by('-generated_at', '-id')
+
 class ReportViewSet(viewsets.ReadOnlyModelViewSet):
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend]
-    filterset_fields = ['session', 'report_type']
+    filterset_class = ReportFilter
+    
+    @property
+    def paginator(self):
+        # ?pagination=cursor pages by keyset instead of page number, skipping COUNT(*) and OFFSET
+        if not hasattr(self, '_paginator') and self.request is not None \
+                and self.request.query_params.get('pagination') == 'cursor':
+            self._paginator = ReportKeysetPagination()
+        return super().paginator
     
     def get_queryset(self):
         user = self.request.user
         # Users can only see their own reports
-        return Report.objects.filter(user=user)
+        queryset = Report.objects.filter(user=user)
+        if self.action in SUMMARY_ACTIONS:
+            return summary_queryset(queryset)
+        return queryset.select_related('session__classroom__instructor', 'user')
     
     def get_serializer_class(self):
-        if self.action == 'list':
+        if self.action in SUMMARY_ACTIONS:
             return ReportSummarySerializer
         return ReportSerializer
     
+    # Reports only change when regenerated, so reads go through the versioned cache
+    def list(self, request, *args, **kwargs):
+        return cached_report_response(request, lambda: super(ReportViewSet, self).list(request, *args, **kwargs).data)
+    
+    def retrieve(self, request, *args, **kwargs):
+        return cached_report_response(request, lambda: super(ReportViewSet, self).retrieve(request, *args, **kwargs).data)
+    
     @action(detail=False, methods=['get'])
     def recent(self, request):
         """Get recent reports (last 30 days)"""
+        return cached_report_response(request, self._recent_payload)
+    
+    def _recent_payload(self):
         cutoff_date = timezone.now() - timedelta(days=30)
-        recent_reports = self.get_queryset().filter(generated_at__gte=cutoff_date)
+        recent_reports = self.filter_queryset(self.get_queryset()).filter(generated_at__gte=cutoff_date)
         
         page = self.paginate_queryset(recent_reports)
         if page is not None:
             serializer = self.get_serializer(page, many=True)
-            return self.get_paginated_response(serializer.data)
+            return self.get_paginated_response(serializer.data).data
         
         serializer = self.get_serializer(recent_reports, many=True)
-        return Response(serializer.data)
+        return serializer.data
     
     @action(detail=False, methods=['get'])
     def by_session(self, request, session_id=None):
         """Get reports for a specific session"""
+        # The route has no path parameter, so the id comes from ?session_id=
+        session_id = session_id or request.query_params.get('session_id')
         if not session_id:
             return Response(
                 {'error': 'Session ID is required'},
@@ -49,10 +94,10 @@ class ReportViewSet(viewsets.ReadOnlyModelViewSet):
             )
         
         try:
-            session = Session.objects.get(id=session_id)
+            session = Session.objects.select_related('classroom').get(id=session_id)
             
             # Check if user has access to this session's reports
-            if session.classroom.instructor != request.user and not session.classroom.enrollments.filter(student=request.user).exists():
+            if session.classroom.instructor_id != request.user.id and not session.classroom.enrollments.filter(student=request.user).exists():
                 return Response(
                     {'error': 'You do not have access to this session'},
                     status=status.HTTP_403_FORBIDDEN
@@ -62,15 +107,56 @@ class ReportViewSet(viewsets.ReadOnlyModelViewSet):
             serializer = self.get_serializer(reports, many=True)
             return Response(serializer.data)
             
-        except Session.DoesNotExist:
+        except (Session.DoesNotExist, ValueError):
+            return Response(
+                {'error': 'Session not found'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+    
+    @action(detail=False, methods=['get'])
+    def live(self, request):
+        """Provisional report for a running session, from its focus accumulators"""
+        session_id = request.query_params.get('session')
+        if not session_id:
+            return Response(
+                {'error': 'Session ID is required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            session = Session.objects.select_related('classroom').get(id=session_id)
+        except (Session.DoesNotExist, ValueError):
             return Response(
                 {'error': 'Session not found'},
                 status=status.HTTP_404_NOT_FOUND
             )
+        
+        # Check if user has access to this session's reports
+        if session.classroom.instructor_id != request.user.id and not session.classroom.enrollments.filter(student=request.user).exists():
+            return Response(
+                {'error': 'You do not have access to this session'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        return Response(build_live_report(session, request.user))
+    
+    @action(detail=True, methods=['get'])
+    def chart(self, request, pk=None):
+        """Serve the report's focus chart, rendering it on first access"""
+        report = self.get_object()
+        chart_image = get_report_chart(report)
+        
+        if not chart_image:
+            return Response(
+                {'error': 'No focus data to chart for this report'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        
+        return FileResponse(chart_image.open('rb'), content_type='image/png')
     
     @action(detail=True, methods=['post'])
     def regenerate(self, request, pk=None):
-        """Regenerate a report"""
+        """Queue a regeneration of the report's session and return its job"""
         report = self.get_object()
         
         # Only allow instructors to regenerate reports
@@ -80,13 +166,32 @@ class ReportViewSet(viewsets.ReadOnlyModelViewSet):
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        # Generate the report
-        result = generate_session_report(report.session.id)
+        # Concurrent calls for the same session share the job still waiting in the queue
+        job, coalesced = request_report_regeneration(report.session_id, requested_by=request.user)
         
-        if result:
-            return Response({'message': 'Report regenerated successfully'})
-        else:
-            return Response(
-                {'error': 'Failed to regenerate report'},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
\ No newline at end of file
+        return Response({
+            'job_id': job.id,
+            'status': job.status,
+            'coalesced': coalesced,
+            'status_url': reverse('report-job-detail', kwargs={'pk': job.id}, request=request)
+        }, status=status.HTTP_202_ACCEPTED)
+
+class ReportJobViewSet(viewsets.ReadOnlyModelViewSet):
+    """Status of queued report generation, for the session's instructor"""
+    permission_classes = [IsAuthenticated]
+    serializer_class = ReportJobSerializer
+    
+    def get_queryset(self):
+        return ReportJob.objects.filter(
+            session__classroom__instructor=self.request.user
+        ).order_by('-created_at')
+
+class ReportMetricsView(APIView):
+    """Report pipeline stage counters in Prometheus text format, for staff scrapers"""
+    permission_classes = [IsAdminUser]
+    
+    def get(self, request):
+        return HttpResponse(
+            render_prometheus(get_stage_metrics()),
+            content_type='text/plain; version=0.0.4; charset=utf-8'
+        )
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 06:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('session', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='session',
+            name='report_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
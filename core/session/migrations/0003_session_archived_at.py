@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 07:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('session', '0002_session_report_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='session',
+            name='archived_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
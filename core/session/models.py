@@ -2,6 +2,7 @@ from django.db import models
 from classrooms.models import Classroom
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
+from real_time.utils import session_group_name
 import json
 
 class Session(models.Model):
@@ -9,7 +10,14 @@ class Session(models.Model):
     start_time = models.DateTimeField()
     end_time = models.DateTimeField(null=True, blank=True)
     is_active = models.BooleanField(default=True)
+    # Owned by reports.dispatch and never written by save()
     report_generated = models.BooleanField(default=False)
+    report_version = models.PositiveIntegerField(default=0)
+    # Set while the session's focus data and report blobs live in the cold
+    # archive; owned by reports.archive and never written by save()
+    archived_at = models.DateTimeField(null=True, blank=True)
+    
+    MANAGED_FIELDS = ('report_generated', 'report_version', 'archived_at')
     
     def __str__(self):
         return f"{self.classroom.name} - {self.start_time}"
@@ -19,7 +27,7 @@ class Session(models.Model):
     
     def broadcast_to_session(self, message_type, data):
         channel_layer = get_channel_layer()
-        group_name = f'session_{self.id}'
+        group_name = session_group_name(self.id)
         
         message = {
             'type': message_type,
@@ -34,26 +42,42 @@ class Session(models.Model):
             }
         )
     
+    def notify_context_changed(self):
+        """Tell connected consumers to reload their pinned session context"""
+        channel_layer = get_channel_layer()
+        async_to_sync(channel_layer.group_send)(
+            session_group_name(self.id),
+            {'type': 'session_context_changed'}
+        )
+    
     def end_session(self):
         from django.utils import timezone
-        from reports.tasks import generate_session_report_task
 
         self.end_time = timezone.now()
         self.is_active = False
+        # save() requests the report once the session has an end time
         self.save()
         
         self.broadcast_to_session('session_ended', {
             'message': 'Session has ended',
             'end_time': self.end_time.isoformat()
         })
-        
-        generate_session_report_task.delay(self.id)
+        self.notify_context_changed()
         return True
     
     def save(self, *args, **kwargs):
-        if self.end_time and not self.report_generated:
-            from reports.tasks import generate_session_report_task
-            generate_session_report_task.delay(self.id)
-            self.report_generated = True
+        # A stale instance must not reset flags another request or task set
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.MANAGED_FIELDS
+            ]
         
         super().save(*args, **kwargs)
+        
+        if self.end_time and not self.report_generated:
+            from reports.dispatch import request_session_report
+            version = request_session_report(self.id)
+            self.report_generated = True
+            if version:
+                self.report_version = version
@@ -1,4 +1,5 @@
 
+from django.db import transaction
 from django.test import TestCase
 from django.contrib.auth import get_user_model
 from rest_framework.test import APIClient
@@ -78,11 +79,36 @@ class SessionViewSetTest(TestCase):
 
     def test_instructor_can_end_session(self, mock_delay):
         url = f'/api/sessions/{self.session.id}/end/'
-        response = self.client.post(url, format='json')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(url, format='json')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.session.refresh_from_db()
         self.assertFalse(self.session.is_active)
-        mock_delay.assert_called_once_with(self.session.id)
+        mock_delay.assert_called_once_with(self.session.id, 1)
+
+    def test_session_end_enqueues_one_report_task(self, mock_delay):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.session.end_session()
+            # Later saves and a stale copy of the session must not enqueue again
+            self.session.save()
+            stale = Session.objects.get(pk=self.session.pk)
+            stale.report_generated = False
+            stale.save()
+            self.client.post(f'/api/sessions/{self.session.id}/end/', format='json')
+        self.assertEqual(mock_delay.call_count, 1)
+        self.session.refresh_from_db()
+        self.assertTrue(self.session.report_generated)
+        self.assertEqual(self.session.report_version, 1)
+
+    def test_rolled_back_session_end_enqueues_nothing(self, mock_delay):
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    self.session.end_session()
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        mock_delay.assert_not_called()
 
     def test_student_can_join_session(self, mock_delay):
         self.client.force_authenticate(user=self.student)
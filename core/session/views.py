@@ -33,6 +33,10 @@ class SessionViewSet(viewsets.ModelViewSet):
             raise serializers.ValidationError("Only the instructor can start a session")
         serializer.save(start_time=timezone.now())
     
+    def perform_update(self, serializer):
+        session = serializer.save()
+        session.notify_context_changed()
+    
     @action(detail=True, methods=['post'])
     def join(self, request, pk=None):
         session = self.get_object()